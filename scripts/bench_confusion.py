@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import random
+import time
+
+from pypinyin import Style, pinyin
+
+from confusion import ConfusionIndex
+
+# --- 干扰项生成压测 ---
+# 对比旧脚本 (每个字都重新扫一遍全字库找同级字) 和 confusion.py 的索引版本。
+# 字库用真实的 characters.json (2.7k)，再用 CJK 基本区的其他字补到 --big 个 (拼音用 pypinyin，
+# 等级/笔画随机)。形近字分别测 "没有 IDS" 和 "合成 IDS" (随机左右结构，只用来测速度)。
+#
+# 用法: cd scripts && python bench_confusion.py --big 8000
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(HERE, "../src/data/characters.json")
+
+
+def legacy_build(chars_list):
+    """build_final_confusion.py 原来的做法 (保留用来对比)"""
+    pinyin_map = {}
+    for c in chars_list:
+        pinyin_map.setdefault(c.get('pinyin', ''), []).append(c['char'])
+    final_map = {}
+    for c in chars_list:
+        target = c['char']
+        candidates = []
+        manual = c.get('confusingChars', {})
+        if manual:
+            candidates.extend(manual.get('hard', []))
+            candidates.extend(manual.get('medium', []))
+            candidates.extend(manual.get('easy', []))
+        if len(candidates) < 5:
+            same_py = [x for x in pinyin_map.get(c.get('pinyin', ''), []) if x != target]
+            same_py = [x for x in same_py if x not in candidates]
+            candidates.extend(same_py[:3])
+        if len(candidates) < 5:
+            level = c.get('level', 1)
+            mates = [x['char'] for x in chars_list if x.get('level') == level and x['char'] != target]
+            mates = [x for x in mates if x not in candidates]
+            if mates:
+                candidates.extend(random.sample(mates, min(5 - len(candidates), len(mates))))
+        final_map[target] = candidates[:5]
+    return final_map
+
+
+def grow(chars, size, rng):
+    """补到 size 个字：CJK 基本区里还没有的字，不带手动干扰项"""
+    have = {c["char"] for c in chars}
+    result = list(chars)
+    code = 0x4E00
+    while len(result) < size and code <= 0x9FFF:
+        ch = chr(code)
+        code += 1
+        if ch in have:
+            continue
+        result.append({
+            "id": f"h_{len(result) + 1}", "char": ch,
+            "pinyin": pinyin(ch, style=Style.TONE, heteronym=False)[0][0],
+            "level": rng.randint(1, 5), "stroke": rng.randint(1, 25),
+            "frequency": len(result) + 1, "confusingChars": {},
+        })
+    return result
+
+
+def synthetic_ids(chars, rng, components=300):
+    """随机左右/上下结构，部件从一个小池子里取 (只用于测速度，不是真实拆字)"""
+    pool = [c["char"] for c in chars[:components]]
+    return {c["char"]: rng.choice("⿰⿱") + "".join(rng.sample(pool, 2)) for c in chars[components:]}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark confusion-map builders")
+    parser.add_argument("--big", type=int, default=8000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(INPUT_FILE, encoding="utf-8") as f:
+        real = json.load(f)
+    rng = random.Random(args.seed)
+    datasets = [("real", real), ("grown", grow(real, args.big, rng))]
+
+    print(f"{'chars':>7} {'legacy':>10} {'index':>10} {'index+ids':>10} {'speedup':>8} {'stable':>7}")
+    for _, chars in datasets:
+        ids = synthetic_ids(chars, rng)
+        legacy_s, _ = timed(lambda: legacy_build(chars))
+        index_s, first = timed(lambda: ConfusionIndex(chars, seed=args.seed).build())
+        ids_s, _ = timed(lambda: ConfusionIndex(chars, ids=ids, seed=args.seed).build())
+        # 同一个 seed 再跑一遍 (字库顺序打乱)，结果应该完全一样
+        shuffled = list(chars)
+        random.Random(1).shuffle(shuffled)
+        stable = ConfusionIndex(shuffled, seed=args.seed).build() == first
+        print(f"{len(chars):>7} {legacy_s:>9.2f}s {index_s:>9.2f}s {ids_s:>9.2f}s "
+              f"{legacy_s / index_s:>7.1f}x {str(stable):>7}")
+
+
+if __name__ == "__main__":
+    main()
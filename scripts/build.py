@@ -0,0 +1,345 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# --- 数据构建 ---
+# 把各个脚本生成的文件当成一张依赖图 (DAG):
+#   characters.json -> chars_index.json
+#                   -> chars_detail_{i}.json (每 200 字一片，每片单独一个目标)
+#                   -> confusion_map.json (+ 可选的 IDS 文件 / 字体)
+#                   -> audio_chars.json (要合成哪些音频、文本和音色，generate_audio_bulk.py 读这个)
+#   story.json      -> audio_story.json
+#   levels.json + characters.json + confusion_map.json + public/audio/chars/*.mp3 (有 opt/chars/ 的压缩版本时用它)
+#                   -> public/audio/bundles/{level_N,pool_N}.bin/.json (bundle_audio.py，要等 confusion_map 做完)
+# 每个目标的 "输入指纹" = 输入内容的哈希 + 生成它的代码的哈希 + 参数。指纹和上次一样、
+# 输出文件也没被改过，就跳过；分片的指纹只看自己那 200 个字，改一个字只重写一片。
+# 内容没变的输出不会重写 (mtime 不动)。耗时的目标 (confusion_map) 放进进程池，
+# 其余的在主进程里同时做掉。状态存在 scripts/data/build_state.json。
+#
+# 用法: cd scripts && python build.py [--dry-run] [--force] [target ...]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+CHARACTERS = os.path.join(ROOT, "src", "data", "characters.json")
+STORY = os.path.join(ROOT, "src", "data", "story.json")
+LEVELS = os.path.join(ROOT, "src", "data", "levels.json")
+INDEX = os.path.join(ROOT, "src", "data", "chars_index.json")
+CONFUSION = os.path.join(ROOT, "src", "data", "confusion_map.json")
+DETAIL_DIR = os.path.join(ROOT, "public", "data")
+AUDIO_DIR = os.path.join(ROOT, "public", "audio")
+BUNDLE_DIR = os.path.join(AUDIO_DIR, "bundles")
+AUDIO_CHARS = os.path.join(HERE, "data", "audio_chars.json")
+AUDIO_STORY = os.path.join(HERE, "data", "audio_story.json")
+STATE_FILE = os.path.join(HERE, "data", "build_state.json")
+
+# 和 generate_audio_bulk.py / generate_story_audio.py 原来的设置一致
+CHAR_VOICE = "zh-CN-XiaoxiaoNeural"
+CHAR_RATE = "-10%"
+STORY_VOICE = "zh-CN-YunxiNeural"
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def dump(obj) -> bytes:
+    # 和原来脚本里 json.dump(..., ensure_ascii=False) 写出来的字节一样
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """内容一样就不写；否则先写临时文件再替换，中途失败不会留下半个文件"""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+# --- 各个目标的生成函数 (顶层函数，可以交给子进程) ---
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_index(out):
+    from split_json import make_index
+    return write_if_changed(out, dump(make_index(load_json(CHARACTERS))))
+
+
+def run_chunk(out, i):
+    from split_json import make_chunk
+    return write_if_changed(out, dump(make_chunk(load_json(CHARACTERS), i)))
+
+
+def run_confusion(out, seed, ids_path, font):
+    from build_final_confusion import build_map
+    return write_if_changed(out, dump(build_map(load_json(CHARACTERS), seed, ids_path, font)))
+
+
+def char_clips(chars):
+    """每个字两条：单字读音、题目 "请找出 tiān，天空的天" """
+    clips = []
+    for c in chars:
+        char = c["char"]
+        example = c.get("example") or f"{char}字"
+        clips.append({"file": f"chars/{char}.mp3", "text": char, "voice": CHAR_VOICE, "rate": CHAR_RATE})
+        clips.append({"file": f"chars/{char}_question.mp3", "voice": CHAR_VOICE, "rate": "+0%",
+                      "text": f"请找出{c.get('pinyin', '')}，{example}的{char}"})
+    return clips
+
+
+def run_audio_chars(out):
+    return write_if_changed(out, dump({"clips": char_clips(load_json(CHARACTERS))}))
+
+
+def run_audio_story(out):
+    clips = []
+    for level_id, script in load_json(STORY).items():
+        for idx, dialog in enumerate(script["dialogs"]):
+            clips.append({"file": f"story/story_{level_id}_{idx}.mp3", "text": dialog["text"],
+                          "voice": STORY_VOICE, "rate": "+0%"})
+    return write_if_changed(out, dump({"clips": clips}))
+
+
+def bundle_plan():
+    from bundle_audio import plan
+    return plan(load_json(CHARACTERS), load_json(LEVELS), load_json(CONFUSION))
+
+
+def run_bundle(out, name):
+    from bundle_audio import build_bundle
+    before = FileHashes({}).hash(out)
+    build_bundle(name, bundle_plan()[name], BUNDLE_DIR, AUDIO_DIR)
+    return FileHashes({}).hash(out) != before
+
+
+def clip_stamps(clips) -> str:
+    """音频包的指纹：实际打包的成员音频 (可能是 opt/ 下的版本) 的路径、大小、mtime，不用读文件内容"""
+    from bundle_audio import clip_path
+
+    stamps = []
+    for name in clips:
+        path, _ = clip_path(name, AUDIO_DIR)
+        if path:
+            st = os.stat(path)
+            stamps.append(f"{os.path.relpath(path, AUDIO_DIR)}:{st.st_size}:{st.st_mtime_ns}")
+        else:
+            stamps.append(f"{name}:missing")
+    return sha("\n".join(stamps).encode())
+
+
+# --- 依赖图 ---
+
+class Target:
+    def __init__(self, name, out, fn, args=(), inputs=(), code=(), extra="", heavy=False, deps=(), also=()):
+        self.name = name
+        self.out = out
+        self.fn = fn
+        self.args = args
+        self.inputs = inputs # 输入文件 (用整个文件的哈希)
+        self.code = code # 生成代码 (改了也要重建)
+        self.extra = extra # 额外参与指纹的内容，比如分片自己的那段数据；可以是函数 (依赖做完后再算)
+        self.heavy = heavy # 放进进程池
+        self.deps = deps # 要先做完的目标，它们的输出一般也在 inputs 里
+        self.also = also # 同时生成的其他文件 (只检查存在)
+
+    def fingerprint(self, files) -> str:
+        parts = [files.hash(p) for p in self.inputs + self.code]
+        parts.append(repr(self.args[1:]))
+        parts.append(self.extra() if callable(self.extra) else self.extra)
+        return sha("|".join(parts).encode())
+
+
+class FileHashes:
+    """按 (大小, mtime) 缓存文件哈希，没动过的文件不用重新读"""
+
+    def __init__(self, cache: dict):
+        self.cache = cache
+        self.memo = {}
+
+    def hash(self, path: str) -> str:
+        if path in self.memo:
+            return self.memo[path]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.memo[path] = "missing"
+            return "missing"
+        stamp = [st.st_size, st.st_mtime_ns]
+        cached = self.cache.get(path)
+        if cached and cached[:2] == stamp:
+            digest = cached[2]
+        else:
+            with open(path, "rb") as f:
+                digest = sha(f.read())
+            self.cache[path] = stamp + [digest]
+        self.memo[path] = digest
+        return digest
+
+
+def code(*names):
+    return tuple(os.path.join(HERE, n) for n in names + ("build.py",))
+
+
+def targets(args) -> list:
+    chars = load_json(CHARACTERS)
+    from glyphs import find_font
+    from split_json import chunk_count, make_chunk
+
+    font = find_font(args.font) # 没指定时自动找到的字体也算输入
+
+    result = [
+        Target("index", INDEX, run_index, (INDEX,), (CHARACTERS,), code("split_json.py")),
+        Target("confusion", CONFUSION, run_confusion, (CONFUSION, args.seed, args.ids, font),
+               (CHARACTERS, args.ids) + ((font,) if font else ()),
+               code("build_final_confusion.py", "confusion.py", "glyphs.py"), heavy=True),
+        Target("audio_chars", AUDIO_CHARS, run_audio_chars, (AUDIO_CHARS,), (CHARACTERS,), code()),
+        Target("audio_story", AUDIO_STORY, run_audio_story, (AUDIO_STORY,), (STORY,), code()),
+    ]
+    # 分片：指纹只看这一片的内容
+    for i in range(chunk_count(chars)):
+        out = os.path.join(DETAIL_DIR, f"chars_detail_{i}.json")
+        result.append(Target(f"chunk_{i}", out, run_chunk, (out, i), (), code("split_json.py"),
+                             extra=sha(dump(make_chunk(chars, i)))))
+
+    # 音频包：成员和干扰项要等 confusion_map 做完才知道；还没合成过音频就不建
+    if os.path.isdir(os.path.join(AUDIO_DIR, "chars")):
+        plans = {}
+
+        def clips_of(name):
+            if "plan" not in plans: # 同一层里只算一次
+                plans["plan"] = bundle_plan()
+            return clip_stamps(plans["plan"].get(name, []))
+
+        names = [f"level_{level['levelId']}" for level in load_json(LEVELS)]
+        names += [f"pool_{n}" for n in sorted({c.get("level", 1) for c in chars})]
+        for name in names:
+            out = os.path.join(BUNDLE_DIR, f"{name}.bin")
+            result.append(Target(f"bundle_{name}", out, run_bundle, (out, name), (CHARACTERS, LEVELS, CONFUSION),
+                                 code("bundle_audio.py"), extra=lambda name=name: clips_of(name),
+                                 deps=("confusion",), also=(os.path.join(BUNDLE_DIR, f"{name}.json"),)))
+    return result
+
+
+def load_state():
+    try:
+        return load_json(STATE_FILE)
+    except (FileNotFoundError, ValueError):
+        return {"files": {}, "targets": {}}
+
+
+def save_state(state):
+    write_if_changed(STATE_FILE, json.dumps(state, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def run(args):
+    start = time.perf_counter()
+    state = load_state()
+    files = FileHashes(state["files"])
+    all_targets = targets(args)
+    by_name = {t.name: t for t in all_targets}
+    wanted = set(args.targets) if args.targets else set(by_name)
+    unknown = wanted - set(by_name)
+    if unknown:
+        sys.exit(f"unknown target: {', '.join(sorted(unknown))} (have: {', '.join(by_name)})")
+
+    # 字库变短后多出来的旧分片 / 旧音频包
+    stale = [name for name in state["targets"] if name not in by_name]
+    if not args.dry_run:
+        for name in stale:
+            entry = state["targets"].pop(name)
+            for out in [entry.get("path")] + entry.get("also", []):
+                if out and os.path.exists(out):
+                    os.remove(out)
+                    print(f"removed {os.path.relpath(out, ROOT)}")
+
+    def is_dirty(t, fp):
+        old = state["targets"].get(t.name, {})
+        out_ok = old.get("out") == files.hash(t.out) != "missing" and all(os.path.exists(p) for p in t.also)
+        return args.force or old.get("fingerprint") != fp or not out_ok
+
+    dirty, written = {}, 0
+
+    def finish(t, changed):
+        nonlocal written
+        written += bool(changed)
+        files.memo.pop(t.out, None) # 下游目标重新读它的哈希
+        state["targets"][t.name] = {"fingerprint": dirty[t.name], "out": files.hash(t.out),
+                                    "path": t.out, "also": list(t.also)}
+        print(f"{'built' if changed else 'unchanged'} {t.name}")
+
+    # 按依赖分层：一层里的目标互不依赖，依赖的目标做完后才算下一层的指纹
+    remaining = [t for t in all_targets if t.name in wanted]
+    pool = None
+    try:
+        while remaining:
+            names = {t.name for t in remaining}
+            layer = [t for t in remaining if not names & set(t.deps)]
+            if not layer:
+                sys.exit(f"dependency cycle: {', '.join(sorted(names))}")
+            remaining = [t for t in remaining if t not in layer]
+            todo = []
+            for t in layer:
+                fp = t.fingerprint(files)
+                if is_dirty(t, fp) or (args.dry_run and any(d in dirty for d in t.deps)):
+                    dirty[t.name] = fp
+                    todo.append(t)
+            if args.dry_run:
+                for t in todo:
+                    print(f"would build {t.name} -> {os.path.relpath(t.out, ROOT)}")
+                continue
+
+            # 耗时的目标交给进程池，其余的在主进程里同时做
+            heavy = [t for t in todo if t.heavy]
+            if heavy and pool is None:
+                pool = ProcessPoolExecutor(max_workers=args.jobs)
+            futures = {pool.submit(t.fn, *t.args): t for t in heavy}
+            for t in todo:
+                if not t.heavy:
+                    finish(t, t.fn(*t.args))
+            for fut in as_completed(futures):
+                finish(futures[fut], fut.result())
+    finally:
+        if pool:
+            pool.shutdown()
+        # 已经完成的目标也记下来，中途失败时下次不用重做
+        if not args.dry_run:
+            save_state(state)
+
+    if args.dry_run:
+        for name in stale:
+            print(f"would remove {name}")
+        print(f"{len(dirty)} of {len(wanted)} targets out of date")
+        return
+    print(f"{len(dirty)} of {len(wanted)} targets rebuilt, {written} files written "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally rebuild generated data files")
+    parser.add_argument("targets", nargs="*", help="只建这些目标 (默认全部)")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要重建的目标")
+    parser.add_argument("--force", action="store_true", help="忽略指纹全部重建")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0, help="confusion_map 的随机种子")
+    parser.add_argument("--ids", default=os.path.join(HERE, "data", "ids.txt"), help="IDS 拆字文件")
+    parser.add_argument("--font", help="中文字体 (形近字用)")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
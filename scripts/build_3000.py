@@ -1,7 +1,7 @@
 import json
 import os
 import math
-from pypinyin import pinyin, Style
+from enrich_chars import reading
 
 # --- 配置区 ---
 OUTPUT_INDEX_FILE = "../src/data/chars_index.json"
@@ -21,8 +21,8 @@ RAW_CHARS = """
 CHARS_LIST = list(dict.fromkeys([c for c in RAW_CHARS if c.strip()]))
 
 def get_pinyin_tone(char):
-    # 获取带声调拼音: zhōng
-    return pinyin(char, style=Style.TONE, heteronym=False)[0][0]
+    # 获取带声调拼音: zhōng (enrich_chars 里按字缓存)
+    return reading(char)
 
 def main():
     print(f"Processing {len(CHARS_LIST)} characters...")
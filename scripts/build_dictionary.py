@@ -1,6 +1,6 @@
 import json
 import os
-from pypinyin import pinyin, Style, lazy_pinyin
+from enrich_chars import reading, tone_of
 
 # --- 配置区 ---
 OUTPUT_FILE = "../src/data/characters.json"
@@ -25,17 +25,12 @@ RAW_CHARS = """
 CHARS_LIST = list(dict.fromkeys([c for c in RAW_CHARS if c.strip()]))
 
 def get_tone(char):
-    # 获取声调 (1,2,3,4)
-    # pypinyin 返回的是 [['zhōng']] 这种格式
-    # 我们用 style=Style.TONE3 返回 zhong1
-    py = pinyin(char, style=Style.TONE3, heteronym=False)[0][0]
-    if py[-1].isdigit():
-        return int(py[-1])
-    return 0 # 轻声
+    # 获取声调 (1,2,3,4)，轻声返回 0；从带调拼音里拆，不再单独调一次 pinyin()
+    return tone_of(reading(char))
 
 def get_pinyin_display(char):
-    # 获取带声调的拼音显示 (如 zhōng)
-    return pinyin(char, style=Style.TONE, heteronym=False)[0][0]
+    # 获取带声调的拼音显示 (如 zhōng)，enrich_chars 里按字缓存
+    return reading(char)
 
 def estimate_level(index):
     # 根据频率排名估算等级
@@ -1,56 +1,41 @@
+import argparse
 import json
 import os
-import random
 
-INPUT_FILE = "../src/data/characters.json"
-OUTPUT_FILE = "../src/data/confusion_map.json"
+from confusion import ConfusionIndex, load_ids
+from glyphs import find_font, similar_glyphs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(HERE, "../src/data/characters.json")
+OUTPUT_FILE = os.path.join(HERE, "../src/data/confusion_map.json")
+IDS_FILE = os.path.join(HERE, "data/ids.txt") # 可选的拆字数据 (cjkvi-ids 格式)
+
+def build_map(chars_list, seed=0, ids_path=IDS_FILE, font=None):
+    ids = load_ids(ids_path) if os.path.exists(ids_path) else None
+    font = find_font(font)
+    visual = similar_glyphs([c['char'] for c in chars_list], font) if font else None
+
+    # A. 优先使用手动配置 (Hard > Medium > Easy)
+    # B. 不够5个时补同音字 (先同声调，再不同声调)
+    # C. 再补形近字 (字形图相似度 > IDS 部件重合 > 笔画接近)，最后同级随机
+    index = ConfusionIndex(chars_list, ids=ids, seed=seed, visual=visual)
+    return index.build(size=5, manual=True)
 
 def main():
+    parser = argparse.ArgumentParser(description="Build confusion_map.json, manual distractors first")
+    parser.add_argument("--seed", type=int, default=0, help="同一个 seed 输出完全一样")
+    parser.add_argument("--ids", default=IDS_FILE)
+    parser.add_argument("--font", help="中文字体，用字形图找形近字 (不给就在常见位置找)")
+    args = parser.parse_args()
+
     with open(INPUT_FILE, 'r', encoding='utf-8') as f:
         chars_list = json.load(f)
-        
-    # 1. 预计算拼音索引 (用于自动补充)
-    pinyin_map = {}
-    for c in chars_list:
-        py = c.get('pinyin', '')
-        if py not in pinyin_map: pinyin_map[py] = []
-        pinyin_map[py].append(c['char'])
-
-    final_map = {}
-
-    for c in chars_list:
-        target = c['char']
-        candidates = []
-        
-        # A. 优先使用手动配置 (Hard > Medium > Easy)
-        manual = c.get('confusingChars', {})
-        if manual:
-            candidates.extend(manual.get('hard', []))
-            candidates.extend(manual.get('medium', []))
-            candidates.extend(manual.get('easy', []))
-            
-        # B. 自动补充 (如果不够5个)
-        if len(candidates) < 5:
-            # 找同音字
-            py = c.get('pinyin', '')
-            same_py = [x for x in pinyin_map.get(py, []) if x != target]
-            # 过滤已有的
-            same_py = [x for x in same_py if x not in candidates]
-            candidates.extend(same_py[:3])
-            
-        # C. 随机补充同级字
-        if len(candidates) < 5:
-            level = c.get('level', 1)
-            mates = [x['char'] for x in chars_list if x.get('level') == level and x['char'] != target]
-            mates = [x for x in mates if x not in candidates]
-            if mates:
-                candidates.extend(random.sample(mates, min(5-len(candidates), len(mates))))
-        
-        final_map[target] = candidates[:5] # 截取前5个
+
+    final_map = build_map(chars_list, args.seed, args.ids, args.font)
 
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         json.dump(final_map, f, ensure_ascii=False)
     print("Confusion map built.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
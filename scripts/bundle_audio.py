@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+
+# --- 音频打包 ---
+# 前端原来每个字单独请求 /audio/chars/{字}.mp3 和 {字}_question.mp3，一关要几十个小请求。
+# 这里把一关用到的音频首尾相接拼成一个文件 public/audio/bundles/{name}.bin，
+# 旁边的 {name}.json 记录每条音频的 [偏移, 长度, 时长(秒), MIME 类型]：
+#   - level_{id}: levels.json 里的关卡，目标字的题目 + 单字音频，以及干扰项的单字音频。整包一次取完
+#   - pool_{n}:   characters.json 里 level == n 的全部字 (自动生成的关卡从这里随机抽字)。
+#                 包比较大，前端按索引只用一个多段 Range 请求取需要的那几条
+# optimize_media.py 生成过 public/audio/opt/chars/ 下的压缩版本时优先打包它 (格式不一定是 MP3，所以记 MIME)。
+# 缺的音频 (还没合成) 直接跳过，前端对不在包里的字退回单文件 / 浏览器 TTS。
+#
+# 用法: cd scripts && python bundle_audio.py (一般由 build.py 调用)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHARACTERS = os.path.join(HERE, "../src/data/characters.json")
+LEVELS = os.path.join(HERE, "../src/data/levels.json")
+CONFUSION = os.path.join(HERE, "../src/data/confusion_map.json")
+AUDIO_DIR = os.path.join(HERE, "../public/audio")
+BUNDLE_DIR = os.path.join(AUDIO_DIR, "bundles")
+VARIANTS = {".m4a": "audio/mp4", ".webm": "audio/webm", ".mp3": "audio/mpeg"}
+
+# MPEG 帧头查表: 比特率 (kbps)，按 (MPEG-1?, layer) 区分；只算 Layer III
+BITRATES = {
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def mp3_duration(data: bytes) -> float:
+    """逐帧累加 MP3 (Layer III) 的时长；不是 MP3 时返回 0"""
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size
+    seconds = 0.0
+    while pos + 4 <= len(data):
+        b1, b2 = data[pos + 1], data[pos + 2]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            break
+        version = (b1 >> 3) & 0x3 # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+        layer = (b1 >> 1) & 0x3 # 1 = Layer III
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+        if version == 1 or layer != 1 or rate_index == 3:
+            break
+        mpeg1 = version == 3
+        bitrate = BITRATES[mpeg1][bitrate_index] * 1000
+        sample_rate = SAMPLE_RATES[version][rate_index]
+        if not bitrate:
+            break
+        samples = 1152 if mpeg1 else 576
+        length = samples // 8 * bitrate // sample_rate + ((b2 >> 1) & 0x1)
+        seconds += samples / sample_rate
+        pos += length
+    return round(seconds, 3)
+
+
+def plan(chars, levels, confusion) -> dict:
+    """{包名: [音频名, ...]}，音频名 = chars/ 下去掉 .mp3 的文件名"""
+    bundles = {}
+    for level in levels:
+        clips = []
+        for char in level.get("targetChars", []):
+            clips += [f"{char}_question", char]
+            clips += confusion.get(char, [])
+        bundles[f"level_{level['levelId']}"] = list(dict.fromkeys(clips))
+    for c in chars:
+        bundles.setdefault(f"pool_{c.get('level', 1)}", []).extend([f"{c['char']}_question", c["char"]])
+    return bundles
+
+
+def clip_path(name, audio_dir=AUDIO_DIR):
+    """-> (要打包的文件, MIME)：opt/ 下的压缩版本优先，其次原始 MP3；都没有返回 (None, None)"""
+    for ext, mime in VARIANTS.items():
+        path = os.path.join(audio_dir, "opt", "chars", f"{name}{ext}")
+        if os.path.exists(path):
+            return path, mime
+    path = os.path.join(audio_dir, "chars", f"{name}.mp3")
+    return (path, "audio/mpeg") if os.path.exists(path) else (None, None)
+
+
+def pack(clips, audio_dir=AUDIO_DIR):
+    """-> (拼好的字节, 索引)；没有的音频跳过"""
+    parts, index, offset = [], {}, 0
+    for name in clips:
+        path, mime = clip_path(name, audio_dir)
+        if not path:
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        duration = mp3_duration(data)
+        if mime != "audio/mpeg":
+            # 转码后的时长和原始 MP3 一样，从原文件算
+            with open(os.path.join(audio_dir, "chars", f"{name}.mp3"), "rb") as f:
+                duration = mp3_duration(f.read())
+        index[name] = [offset, len(data), duration, mime]
+        parts.append(data)
+        offset += len(data)
+    return b"".join(parts), index
+
+
+def build_bundle(name, clips, out_dir=BUNDLE_DIR, audio_dir=AUDIO_DIR) -> dict:
+    """写 {name}.bin 和 {name}.json，返回统计"""
+    from build import dump, sha, write_if_changed
+
+    data, index = pack(clips, audio_dir)
+    meta = {"name": name, "file": f"{name}.bin", "size": len(data), "sha": sha(data), "clips": index}
+    write_if_changed(os.path.join(out_dir, f"{name}.bin"), data)
+    write_if_changed(os.path.join(out_dir, f"{name}.json"), dump(meta))
+    return {"name": name, "clips": len(index), "missing": len(clips) - len(index), "bytes": len(data)}
+
+
+def report(stats, per_start: int = 25):
+    """请求数对比：
+    level_N 原来每条音频一个请求，打包后整包 1 个数据请求 + 1 个索引请求；
+    pool_N 每次开局只取 per_start 条左右 (5 个目标 × 题目 + 4 个选项)，原来 per_start 个请求，现在 1 个多段 Range 请求
+    """
+    print(f"{'bundle':>10} {'clips':>6} {'missing':>8} {'size':>10} {'requests per start':>19}")
+    total_bytes = saved = 0
+    for s in stats:
+        total_bytes += s["bytes"]
+        if not s["clips"]:
+            after = before = 0
+        elif s["name"].startswith("pool_"):
+            before, after = min(per_start, s["clips"]), 1
+        else:
+            before, after = s["clips"], 2
+        saved += before - after
+        print(f"{s['name']:>10} {s['clips']:>6} {s['missing']:>8} {s['bytes'] / 1024:>8.0f}KB {before:>11} -> {after}")
+    print(f"total {total_bytes / 1024 / 1024:.1f} MB in {len(stats)} bundles, "
+          f"{saved} requests saved over one cold start of every bundle")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concatenate per-level audio clips into bundles with an offset index")
+    parser.add_argument("--audio-dir", default=AUDIO_DIR)
+    parser.add_argument("--out", default=BUNDLE_DIR)
+    args = parser.parse_args()
+
+    bundles = plan(load_json(CHARACTERS), load_json(LEVELS), load_json(CONFUSION))
+    stats = [build_bundle(name, clips, args.out, args.audio_dir) for name, clips in bundles.items()]
+    report(stats)
+
+
+if __name__ == "__main__":
+    main()
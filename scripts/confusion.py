@@ -0,0 +1,190 @@
+import heapq
+import random
+import unicodedata
+from collections import Counter
+
+# --- 干扰项 (confusion map) 引擎 ---
+# 以前的脚本在每个字的循环里重新扫一遍整个字库找同级字 (O(n²))，
+# "形近字" 其实是 random.sample，每次跑结果都不一样。
+# 这里先一次性建好索引:
+#   - 等级桶、拼音桶 (带声调 / 不带声调)、笔画桶
+#   - 可选的部件倒排索引：读本地 IDS 拆字文件 (cjkvi-ids 的 ids.txt 格式)，
+#     把每个字递归拆到最小部件，部件重合度高、笔画数接近的排在前面
+# 随机部分按 (seed, 字) 取随机数，结果可复现，也不受字库顺序影响。
+#
+# IDS 文件每行: U+5929<TAB>天<TAB>⿱一大 (多个拆法只取第一个，[GTJ] 之类的地区标记会去掉)
+# 有中文字体时还可以传入 glyphs.py 按字形图算出来的形近字 (visual)，优先于 IDS。
+# 两者都没有时，形近字退化为同级中笔画数最接近的字。
+
+IDC = set("⿰⿱⿲⿳⿴⿵⿶⿷⿸⿹⿺⿻") # IDS 里的结构符，不算部件
+TONE_MARKS = {"̄", "́", "̌", "̀"}
+
+
+def toneless(pinyin: str) -> str:
+    """zhōng -> zhong，lǜ -> lv"""
+    letters = [ch for ch in unicodedata.normalize("NFD", pinyin) if ch not in TONE_MARKS]
+    return unicodedata.normalize("NFC", "".join(letters)).replace("ü", "v").lower()
+
+
+def load_ids(path: str) -> dict:
+    """读 IDS 文件 -> {字: 拆分序列}"""
+    ids = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 3:
+                continue
+            seq = parts[2].split("[")[0] # 去掉 [GTJKV] 地区标记
+            if seq and seq != parts[1]:
+                ids[parts[1]] = seq
+    return ids
+
+
+class Components:
+    """递归拆字，带缓存。拆不动的 (自己就是部件，或 IDS 里没有) 返回自己"""
+
+    def __init__(self, ids: dict):
+        self.ids = ids
+        self._memo = {}
+
+    def leaves(self, char: str, _stack=()) -> Counter:
+        if char in self._memo:
+            return self._memo[char]
+        seq = self.ids.get(char)
+        if not seq or char in _stack: # 防止数据里有环
+            result = Counter([char])
+        else:
+            result = Counter()
+            for part in seq:
+                if part in IDC:
+                    continue
+                result.update(self.leaves(part, _stack + (char,)))
+            if not result:
+                result = Counter([char])
+        self._memo[char] = result
+        return result
+
+
+class ConfusionIndex:
+    def __init__(self, chars: list, ids: dict = None, seed: int = 0, visual: dict = None):
+        self.chars = chars
+        self.seed = seed
+        self.visual = visual or {}
+        self.by_char = {c["char"]: c for c in chars}
+        self.strokes = {c["char"]: c.get("stroke", 0) for c in chars}
+        self.freqs = {c["char"]: c.get("frequency", 0) for c in chars}
+
+        # 桶：只建一次，每个字查询时直接取
+        self.by_level = {}
+        self.by_pinyin = {}
+        self.by_toneless = {}
+        self.by_stroke = {}
+        for c in chars:
+            self.by_level.setdefault(c.get("level", 1), []).append(c["char"])
+            self.by_pinyin.setdefault(c.get("pinyin", ""), []).append(c["char"])
+            self.by_toneless.setdefault(toneless(c.get("pinyin", "")), []).append(c["char"])
+            self.by_stroke.setdefault((c.get("level", 1), c.get("stroke", 0)), []).append(c["char"])
+        # 桶内按 (字频, 字) 排好，输出不受字库顺序影响
+        order = lambda x: (self.freqs[x], x)
+        for buckets in (self.by_level, self.by_pinyin, self.by_toneless, self.by_stroke):
+            for bucket in buckets.values():
+                bucket.sort(key=order)
+
+        # 部件倒排索引：部件 -> [(字, 这个部件在字里出现几次)]
+        self.components = Components(ids) if ids else None
+        self.by_component = {}
+        self.sizes = {}
+        if self.components:
+            for c in chars:
+                leaves = self.components.leaves(c["char"])
+                self.sizes[c["char"]] = sum(leaves.values())
+                for comp, count in leaves.items():
+                    if comp != c["char"]:
+                        self.by_component.setdefault(comp, []).append((c["char"], count))
+
+    def rng(self, char: str) -> random.Random:
+        # 每个字单独一个随机数发生器：结果不依赖处理顺序
+        return random.Random(f"{self.seed}:{char}")
+
+    def sound_alike(self, char: str, limit: int = 3) -> list:
+        """同音字优先，不够再取只差声调的"""
+        c = self.by_char[char]
+        same = [x for x in self.by_pinyin.get(c.get("pinyin", ""), []) if x != char]
+        near = [x for x in self.by_toneless.get(toneless(c.get("pinyin", "")), []) if x != char and x not in same]
+        return (same + near)[:limit]
+
+    def shape_alike(self, char: str, limit: int = 3) -> list:
+        c = self.by_char[char]
+        stroke = c.get("stroke", 0)
+        if self.visual.get(char):
+            return [x for x in self.visual[char] if x in self.by_char and x != char][:limit]
+        if self.components:
+            # 沿倒排索引直接累加重合部件数，不用对每个候选字做 Counter 交集
+            mine = self.components.leaves(char)
+            overlap = Counter()
+            for comp, need in mine.items():
+                for x, count in self.by_component.get(comp, ()):
+                    overlap[x] += min(need, count)
+            overlap.pop(char, None)
+            if overlap:
+                # Dice 系数 (取千分位) 高的优先，再看笔画差、字频
+                size = self.sizes.get(char) or sum(mine.values())
+                sizes, strokes, freqs = self.sizes, self.strokes, self.freqs
+                return heapq.nsmallest(
+                    limit, overlap,
+                    key=lambda x: (-2000 * overlap[x] // (size + sizes[x]), abs(strokes[x] - stroke), freqs[x], x),
+                )
+        # 没有拆字数据：同级里笔画数最接近的字 (同样接近的随机取)
+        level = c.get("level", 1)
+        rng = self.rng(char)
+        result = []
+        for distance in range(0, 40):
+            for s in {stroke - distance, stroke + distance}:
+                bucket = [x for x in self.by_stroke.get((level, s), ()) if x != char]
+                rng.shuffle(bucket)
+                result.extend(bucket)
+            if len(result) >= limit:
+                break
+        return result[:limit]
+
+    def random_mates(self, char: str, exclude: set, limit: int) -> list:
+        c = self.by_char[char]
+        mates = self.by_level.get(c.get("level", 1), [])
+        rng = self.rng(char)
+        result = []
+        # 从同级里随机抽，跳过已有的；同级的字远多于 limit，几次就够
+        for _ in range(limit * 10):
+            if len(result) >= limit or not mates:
+                break
+            x = mates[rng.randrange(len(mates))]
+            if x != char and x not in exclude and x not in result:
+                result.append(x)
+        return result
+
+    def build(self, size: int = 5, manual: bool = True) -> dict:
+        """{字: [干扰项...]}：手动配置 (hard > medium > easy) -> 同音 -> 形近 -> 同级随机"""
+        result = {}
+        for c in self.chars:
+            char = c["char"]
+            candidates = []
+
+            def add(items):
+                for x in items:
+                    if x != char and x not in candidates:
+                        candidates.append(x)
+
+            if manual:
+                conf = c.get("confusingChars") or {}
+                add(conf.get("hard", []))
+                add(conf.get("medium", []))
+                add(conf.get("easy", []))
+            if len(candidates) < size:
+                add(self.sound_alike(char))
+            if len(candidates) < size:
+                add(self.shape_alike(char))
+            if len(candidates) < size:
+                add(self.random_mates(char, set(candidates), size - len(candidates)))
+            result[char] = candidates[:size]
+        return result
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import random
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from pypinyin import Style, pinyin
+
+from confusion import toneless
+
+# --- 字库补全 (拼音 / 笔画 / 组词) ---
+# 原来 build_dictionary.py 对每个字分别调两次 pinyin() 取显示拼音和声调，组词是 "{字}字" 占位，
+# 笔画写死 5。这里一次性补全 characters.json：
+#   - 拼音: 每个字、每个词只调一次 pypinyin (lru_cache)，声调从带调拼音里直接拆出来，不再调第二次
+#   - 多音字: 按组词定读音 (的: 我的 de / 目的 dì / 的确 dí)，组词里这个字的读音就是它的拼音，保证两者一致；
+#             一/不 的变调和词里的轻声 (儿子 zi) 换回字本身的读音。已有的拼音是人工校对过的，
+#             只要是这个字的读音就不动 (pypinyin 按词定的读音也会错，比如 炸鸡 zhà)，--reread 才全部重定
+#   - 组词: 占位的 ("的字" / "的词" / 空) 从本地词表里挑，优先两字词、词频高、另一个字也是常用字的词；
+#           词表用 --words (jieba dict.txt 格式 "词 词频 [词性]"，或每行一个词)，没有时用 pypinyin 自带的词组表。
+#           "名字" 这种真词和 "的字" 这种占位要靠 --words 的词表分辨，没给时只补空的组词
+#   - 笔画: --strokes 给了 Unihan 的 kTotalStrokes 文件 (或 "字<TAB>笔画" 两列) 时按文件填，否则保留原值
+# 字按进程数分片并行处理，最后输出每个字段的覆盖率和来源统计。
+#
+# 用法: cd scripts && python enrich_chars.py [--words dict.txt] [--strokes Unihan_IRGSources.txt] [--dry-run]
+#       python enrich_chars.py --big 8000 --dry-run   # 补到 8000 字测速度
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHARACTERS = os.path.join(HERE, "../src/data/characters.json")
+TONE_MARKS = {"̄": 1, "́": 2, "̌": 3, "̀": 4}
+SANDHI = {"一": "yī", "不": "bù"} # 一个 yí gè、不要 bú yào 是变调，不是字本身的读音
+PARTICLES = set("的地得了着过么吗呢吧啊呀啦嘛们") # 这几个字单独认的时候就读轻声
+
+
+def is_placeholder(char: str, example: str) -> bool:
+    """老脚本生成的占位组词 (名字、写字这种真词由调用方按词表排除)"""
+    return example in ("", f"{char}字", f"{char}词")
+
+
+# --- 拼音 (按进程缓存) ---
+
+@lru_cache(maxsize=None)
+def readings(char: str) -> tuple:
+    """单字的全部读音，第一个是 pypinyin 的默认读音"""
+    return tuple(pinyin(char, style=Style.TONE, heteronym=True)[0])
+
+
+@lru_cache(maxsize=None)
+def word_readings(word: str) -> tuple:
+    """词里每个字的读音 (按词组上下文)"""
+    return tuple(p[0] for p in pinyin(word, style=Style.TONE, errors=lambda s: list(s)))
+
+
+def citation(char: str, py: str) -> str:
+    """词里的读音 -> 字卡上的读音：去掉一/不的变调；儿子 zi、衣裳 shang 这种轻声换回本调"""
+    if char in SANDHI:
+        return SANDHI[char]
+    if tone_of(py) == 0 and char not in PARTICLES:
+        base = toneless(py)
+        for r in readings(char):
+            if tone_of(r) and toneless(r) == base:
+                return r
+    return py
+
+
+def reading(char: str, example: str = "") -> str:
+    """字的拼音：组词里有这个字时按组词的读音，否则默认读音"""
+    py = readings(char)[0]
+    if example and char in example:
+        context = word_readings(example)[example.index(char)]
+        if context in readings(char):
+            py = context
+    return citation(char, py)
+
+
+def tone_of(py: str) -> int:
+    """zhōng -> 1；轻声 (没有声调符号) -> 0，和 build_dictionary.py 原来的约定一致"""
+    for ch in unicodedata.normalize("NFD", py):
+        if ch in TONE_MARKS:
+            return TONE_MARKS[ch]
+    return 0
+
+
+# --- 本地数据文件 ---
+
+def load_words(path) -> list:
+    """-> [(词, 词频)]；没有文件时用 pypinyin 的词组表 (没有词频，都算 0)"""
+    if not path:
+        from pypinyin.phrases_dict import phrases_dict
+
+        return [(w, 0) for w in phrases_dict]
+    words = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                freq = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+                words.append((parts[0], freq))
+    return words
+
+
+def load_strokes(path) -> dict:
+    """Unihan (U+4E00<TAB>kTotalStrokes<TAB>1) 或 "字<TAB>笔画" 两列 -> {字: 笔画}"""
+    strokes = {}
+    if not path:
+        return strokes
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 3 and parts[1] == "kTotalStrokes":
+                strokes[chr(int(parts[0][2:], 16))] = int(parts[2].split()[0]) # 多个值时第一个是大陆字形
+            elif len(parts) == 2 and len(parts[0]) == 1 and parts[1].isdigit():
+                strokes[parts[0]] = int(parts[1])
+    return strokes
+
+
+# --- 组词 ---
+
+def example_index(words, rank: dict) -> dict:
+    """{字: [候选词, ...]}，按 (词长, -词频, 另外几个字里最生僻的那个的字频排名) 排好序；
+    另外的字不在字库里的词不要 (小朋友不认识)"""
+    by_char = {}
+    for word, freq in words:
+        if not 2 <= len(word) <= 4 or any(ch not in rank for ch in word):
+            continue
+        for i, ch in enumerate(word):
+            others = word[:i] + word[i + 1:]
+            if ch in others:
+                continue
+            key = (len(word), -freq, max(rank[o] for o in others), word)
+            by_char.setdefault(ch, []).append(key)
+    return {ch: [k[-1] for k in sorted(keys)] for ch, keys in by_char.items()}
+
+
+# --- 分片处理 ---
+# 词表和笔画表在每个进程里各建一份 (initializer)，字的拼音缓存也是每个进程各自的
+
+_index, _known, _strokes = {}, None, {}
+
+
+def init_worker(words_path, strokes_path, rank):
+    global _index, _known, _strokes
+    words = load_words(words_path)
+    _index = example_index(words, rank)
+    # pypinyin 的词组表只收了读音特殊的词 (没有 "名字")，分不出真词和占位，这时只把空组词当占位
+    _known = {w for w, _ in words} if words_path else None
+    _strokes = load_strokes(strokes_path)
+
+
+def enrich_one(c: dict, refresh: bool, reread: bool) -> tuple:
+    """-> (补全后的字, {字段: 来源})"""
+    char = c["char"]
+    out = dict(c)
+    source = {}
+
+    example = c.get("example", "")
+    placeholder = not example or (_known is not None and is_placeholder(char, example) and example not in _known)
+    candidates = _index.get(char, [])
+    if (refresh or placeholder) and candidates:
+        out["example"], source["example"] = candidates[0], "words"
+    else:
+        source["example"] = "placeholder" if placeholder else "kept"
+
+    # 已有的拼音 (人工校对过) 只要是这个字的读音就保留；新挑了组词、拼音不对或 --reread 时按组词重新定
+    current = c.get("pinyin", "")
+    if not reread and source["example"] != "words" and current in readings(char):
+        source["pinyin"] = "kept"
+    else:
+        context = "" if source["example"] == "placeholder" else out["example"]
+        out["pinyin"] = reading(char, context)
+        if len(readings(char)) == 1:
+            source["pinyin"] = "single"
+        else:
+            # 多音字: 组词里有这个字就按组词定，否则只能用默认读音
+            source["pinyin"] = "context" if char in context else "default"
+    source["tone"] = "neutral" if tone_of(out["pinyin"]) == 0 else "marked"
+
+    if char in _strokes:
+        out["stroke"] = _strokes[char]
+        source["stroke"] = "file"
+    else:
+        source["stroke"] = "kept" if c.get("stroke") else "missing"
+    return out, source
+
+
+def enrich_shard(shard, refresh, reread):
+    return [enrich_one(c, refresh, reread) for c in shard]
+
+
+def enrich(chars, words_path=None, strokes_path=None, jobs=None, refresh=False, reread=False):
+    """-> (补全后的字库, 每个字的来源)；顺序和输入一样"""
+    rank = {c["char"]: c.get("frequency", i + 1) for i, c in enumerate(chars)}
+    jobs = jobs or os.cpu_count()
+    size = -(-len(chars) // jobs)
+    shards = [chars[i:i + size] for i in range(0, len(chars), size)]
+    init = (words_path, strokes_path, rank)
+    if jobs == 1:
+        init_worker(*init)
+        results = [enrich_shard(s, refresh, reread) for s in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=init) as pool:
+            results = list(pool.map(enrich_shard, shards, [refresh] * len(shards), [reread] * len(shards)))
+    pairs = [p for r in results for p in r]
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def report(before, after, sources, seconds):
+    total = len(after)
+    print(f"{total} chars in {seconds:.2f}s")
+    print(f"{'field':>8} {'filled':>8} {'changed':>8}  sources")
+    for field in ("pinyin", "tone", "stroke", "example"):
+        if field == "tone":
+            filled = total
+            changed = sum(1 for b, a in zip(before, after)
+                          if tone_of(b.get("pinyin", "")) != tone_of(a["pinyin"]))
+        else:
+            filled = sum(1 for a, s in zip(after, sources) if a.get(field) and s[field] not in ("placeholder", "missing"))
+            changed = sum(1 for b, a in zip(before, after) if b.get(field) != a.get(field))
+        counts = Counter(s[field] for s in sources)
+        detail = ", ".join(f"{k} {v}" for k, v in counts.most_common())
+        print(f"{field:>8} {filled / total:>8.1%} {changed:>8}  {detail}")
+    heteronyms = sum(1 for a in after if len(readings(a["char"])) > 1)
+    print(f"heteronyms: {heteronyms}, resolved by example: {sum(1 for s in sources if s['pinyin'] == 'context')}, "
+          f"default reading: {sum(1 for s in sources if s['pinyin'] == 'default')}")
+
+
+def main():
+    from build import load_json, write_if_changed
+
+    parser = argparse.ArgumentParser(description="Fill pinyin, stroke counts and example words in characters.json")
+    parser.add_argument("--words", help="词表 (jieba dict.txt 格式或每行一个词)")
+    parser.add_argument("--strokes", help="Unihan kTotalStrokes 文件或 字<TAB>笔画")
+    parser.add_argument("--refresh-examples", action="store_true", help="已有的组词也重新挑")
+    parser.add_argument("--reread", action="store_true", help="已有的拼音也按组词重新定 (改动要人工核对)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--big", type=int, default=0, help="用 CJK 基本区的字补到这么多个 (测速度用，配合 --dry-run)")
+    parser.add_argument("--dry-run", action="store_true", help="只打印统计，不写文件")
+    parser.add_argument("--out", default=CHARACTERS)
+    args = parser.parse_args()
+
+    chars = load_json(CHARACTERS)
+    if args.big:
+        from bench_confusion import grow
+
+        chars = grow(chars, args.big, random.Random(0))
+    start = time.perf_counter()
+    enriched, sources = enrich(chars, args.words, args.strokes, args.jobs, args.refresh_examples, args.reread)
+    report(chars, enriched, sources, time.perf_counter() - start)
+    if not args.dry_run:
+        # 和 characters.json 原来的格式一样 (indent=2)，没变的字 diff 里不出现
+        data = json.dumps(enriched, ensure_ascii=False, indent=2).encode("utf-8")
+        print("written" if write_if_changed(args.out, data) else "unchanged", args.out)
+
+
+if __name__ == "__main__":
+    main()
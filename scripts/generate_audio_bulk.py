@@ -1,119 +1,316 @@
+import argparse
 import asyncio
-import os
+import glob
+import hashlib
 import json
-import edge_tts
+import os
+import random
+import tempfile
 import time
 
-# --- 配置区 ---
-# [关键] 读取你的完整源文件
-DATA_FILE = "../src/data/characters.json" 
-OUTPUT_DIR_CHARS = "../public/audio/chars"
-VOICE = "zh-CN-XiaoxiaoNeural"
-CONCURRENCY = 5  # 并发数 (5个线程同时生成)
-
-# 确保输出目录存在
-if not os.path.exists(OUTPUT_DIR_CHARS):
-    os.makedirs(OUTPUT_DIR_CHARS)
-
-async def generate_one(char_data, sem, index):
-    async with sem: # 控制并发
-        char = char_data['char']
-        pinyin = char_data.get('pinyin', '') # 如果没有拼音，脚本不会挂
-        # [优化] 优先使用 example (组词)，如果没有则回退到 "X字"
-        example = char_data.get('example')
-        if not example:
-            example = f"{char}字"
-            
-        # 文件名: 天.mp3 / 天_question.mp3
-        file_char = os.path.join(OUTPUT_DIR_CHARS, f"{char}.mp3")
-        file_question = os.path.join(OUTPUT_DIR_CHARS, f"{char}_question.mp3")
-        
-        generated = False
-        
-        # 1. 生成单字读音
-        if not os.path.exists(file_char):
-            try:
-                # 语速稍慢 (-10%)
-                communicate = edge_tts.Communicate(char, VOICE, rate="-10%")
-                await communicate.save(file_char)
-                generated = True
-            except Exception as e:
-                print(f"[{index}] Error generating char {char}: {e}")
+# --- 批量音频生成 ---
+# 按音频清单 (build.py 生成的 scripts/data/audio_chars.json，每个字 单字 + 题目 两条) 合成全部音频。
+#   - 真正的工作池：--max-concurrency 个协程从队列取任务，同时在合成的数量由自适应并发控制：
+#     连续成功就慢慢加 (每个窗口 +1)，出错 (限流、超时) 立刻减半，失败的任务退避后重试
+#   - 日志 (journal)：每合成完一条追加一行 {文件, 内容 key, 大小, sha256}。
+#     重跑时只有日志里有、内容 key 没变、文件大小也对得上的才算完成；
+#     之前崩溃留下的半截文件、改过文本的音频都会重新合成
+#   - 先写临时文件再 os.replace，磁盘上不会出现半截 mp3
+#   - 每隔几秒打印进度、速度、预计剩余时间和当前并发
+#
+# 用法: cd scripts && python generate_audio_bulk.py
+#      python generate_audio_bulk.py --backend fake --latency 0.3 --capacity 8  # 离线测吞吐
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(HERE, "../public/audio")
+JOURNAL_FILE = os.path.join(HERE, "data/audio_journal.jsonl")
+MANIFEST_FILES = {
+    "chars": os.path.join(HERE, "data/audio_chars.json"),
+    "story": os.path.join(HERE, "data/audio_story.json"),
+}
+
+
+def clip_key(clip) -> str:
+    # 和 server/tts_cache.py 一样：音色、语速、文本任何一个变了都算新内容
+    return hashlib.md5(f"{clip['voice']}|{clip['rate']}|{clip['text']}".encode()).hexdigest()
+
+
+# --- 合成后端 ---
+class EdgeBackend:
+    async def synthesize(self, text: str, voice: str, rate: str) -> bytes:
+        import edge_tts
+
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        chunks = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        if not chunks:
+            raise RuntimeError(f"edge-tts returned no audio for {text!r}")
+        return b"".join(chunks)
+
+
+class FakeBackend:
+    """离线替身：固定延迟；同时请求超过 capacity 个时像服务端限流一样报错"""
+
+    def __init__(self, latency: float = 0.2, capacity: int = 0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.active = 0
+
+    async def synthesize(self, text: str, voice: str, rate: str) -> bytes:
+        self.active += 1
+        try:
+            if self.capacity and self.active > self.capacity:
+                await asyncio.sleep(self.latency / 10)
+                raise RuntimeError("fake TTS: 429 too many requests")
+            await asyncio.sleep(self.latency)
+            if self.rng.random() < self.error_rate:
+                raise RuntimeError("fake TTS: connection reset")
+            return b"ID3" + hashlib.md5(f"{voice}|{rate}|{text}".encode()).digest() * 64
+        finally:
+            self.active -= 1
+
+
+# --- 自适应并发 (AIMD) ---
+class AdaptiveLimit:
+    def __init__(self, start: int, maximum: int):
+        self.limit = float(start)
+        self.maximum = maximum
+        self.active = 0
+        self.peak = start
+        self.cuts = 0
+        self._epoch = 0 # 每减一次 +1
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> int:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+            return self._epoch
+
+    async def release(self):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def succeeded(self):
+        # 每成功 limit 次大约 +1
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self.peak = max(self.peak, int(self.limit))
+
+    def failed(self, epoch: int):
+        # 同一波错误只减一次：上次减半之前就发出去的请求再失败不算
+        if epoch == self._epoch:
+            self.limit = max(1.0, self.limit / 2)
+            self._epoch += 1
+            self.cuts += 1
+
+
+# --- 日志 ---
+class Journal:
+    def __init__(self, path: str, out_dir: str):
+        self.path = path
+        self.out_dir = out_dir
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # 崩溃时写了一半的最后一行
+                    self.entries[entry["file"]] = entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
 
-        # 2. 生成题目语音
-        if not os.path.exists(file_question):
+    def is_done(self, clip, verify: bool = False) -> bool:
+        entry = self.entries.get(clip["file"])
+        if not entry or entry["key"] != clip_key(clip):
+            return False
+        path = os.path.join(self.out_dir, clip["file"])
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return False
+        except FileNotFoundError:
+            return False
+        if verify:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest() == entry["sha256"]
+        return True
+
+    def record(self, clip, data: bytes):
+        entry = {"file": clip["file"], "key": clip_key(clip), "size": len(data),
+                 "sha256": hashlib.sha256(data).hexdigest()}
+        self.entries[clip["file"]] = entry
+        self._f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def compact(self):
+        """只保留每个文件最新的一条"""
+        self._f.close()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+
+def write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_clips(names) -> list:
+    clips = []
+    for name in names:
+        path = MANIFEST_FILES[name]
+        if not os.path.exists(path):
+            # 清单还没生成过：用 build.py 现场生成
+            import build
+            {"chars": build.run_audio_chars, "story": build.run_audio_story}[name](path)
+        with open(path, encoding="utf-8") as f:
+            clips.extend(json.load(f)["clips"])
+    return clips
+
+
+async def generate(clips, backend, journal: Journal, args) -> dict:
+    limit = AdaptiveLimit(args.concurrency, args.max_concurrency)
+    queue = asyncio.Queue()
+    for clip in clips:
+        queue.put_nowait((clip, 0))
+    stats = {"done": 0, "failed": [], "errors": 0}
+    total = len(clips)
+    start = time.monotonic()
+
+    async def worker():
+        while True:
+            clip, attempt = await queue.get()
+            epoch = await limit.acquire()
             try:
-                # 话术: "请找出 [pinyin]，[example] 的 [char]"
-                # 示例: "请找出 tiān，天空 的 天"
-                # 注意：如果 pinyin 为空，TTS 会读汉字，可能不太自然，但能用
-                text_parts = ["请找出"]
-                if pinyin:
-                    text_parts.append(pinyin)
-                
-                # 稍微加个停顿符号
-                text_parts.append("，") 
-                text_parts.append(example)
-                text_parts.append("的")
-                text_parts.append(char)
-                
-                text = "".join(text_parts)
-                
-                communicate = edge_tts.Communicate(text, VOICE)
-                await communicate.save(file_question)
-                generated = True
+                try:
+                    data = await asyncio.wait_for(
+                        backend.synthesize(clip["text"], clip["voice"], clip["rate"]), args.timeout)
+                finally:
+                    await limit.release()
+                if not data:
+                    raise RuntimeError("empty audio")
+                write_atomic(os.path.join(journal.out_dir, clip["file"]), data)
+                journal.record(clip, data)
+                limit.succeeded()
+                stats["done"] += 1
             except Exception as e:
-                print(f"[{index}] Error generating question {char}: {e}")
-                
-        if generated:
-            print(f"[{index}] Generated: {char} ({example})")
-            # 极短延时，防止请求过于密集
-            await asyncio.sleep(0.1)
-
-async def worker(queue):
-    while True:
-        # 获取任务
-        item = await queue.get()
-        await generate_one(item['data'], item['sem'], item['i'])
-        queue.task_done()
-
-async def main():
-    # 1. 读取完整数据
-    if not os.path.exists(DATA_FILE):
-        print(f"Error: {DATA_FILE} not found!")
-        return
-
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        chars_list = json.load(f)[:100]
-    
-    print(f"Total characters to process: {len(chars_list)}")
-    
-    # 2. 创建队列
-    queue = asyncio.Queue()
-    semaphore = asyncio.Semaphore(1) # 限制每个worker内部的并发（其实由worker数量控制更准）
-    
-    # 3. 填充队列
-    for i, char_data in enumerate(chars_list):
-        queue.put_nowait({
-            'data': char_data,
-            'sem': semaphore,
-            'i': i + 1
-        })
-        
-    # 4. 创建 Workers
-    tasks = []
-    for _ in range(CONCURRENCY):
-        task = asyncio.create_task(worker(queue))
-        tasks.append(task)
-        
-    # 5. 等待完成
+                stats["errors"] += 1
+                limit.failed(epoch)
+                if attempt + 1 < args.retries:
+                    # 指数退避 + 抖动，退避期间不占并发名额
+                    delay = min(30.0, args.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                    asyncio.get_running_loop().call_later(delay, queue.put_nowait, (clip, attempt + 1))
+                else:
+                    stats["failed"].append((clip["file"], str(e)))
+                    print(f"FAILED {clip['file']}: {e}")
+            finally:
+                queue.task_done()
+
+    async def progress():
+        while True:
+            await asyncio.sleep(args.progress)
+            finished = stats["done"] + len(stats["failed"])
+            elapsed = time.monotonic() - start
+            speed = stats["done"] / elapsed if elapsed else 0
+            eta = (total - finished) / speed if speed else float("inf")
+            print(f"{finished}/{total} ({finished / total:.0%})  {speed:.1f} clips/s  ETA {eta:.0f}s  "
+                  f"concurrency {int(limit.limit)}  errors {stats['errors']}")
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.max_concurrency)]
+    reporter = asyncio.create_task(progress()) if total else None
+    # 重试是 call_later 放回队列的，queue.join 期间 unfinished 计数不会归零，
+    # 所以等到 "完成 + 失败 == 总数"
+    while stats["done"] + len(stats["failed"]) < total:
+        await asyncio.sleep(0.05)
     await queue.join()
-    
-    # 取消 workers
-    for task in tasks:
+    for task in workers + ([reporter] if reporter else []):
         task.cancel()
-    await asyncio.gather(*tasks, return_exceptions=True)
-    
-    print("All audio generation complete!")
+    await asyncio.gather(*workers, *([reporter] if reporter else []), return_exceptions=True)
+    stats["elapsed"] = time.monotonic() - start
+    stats["peak"] = limit.peak
+    stats["final"] = int(limit.limit)
+    stats["cuts"] = limit.cuts
+    return stats
+
+
+async def main(args):
+    out_dir = args.out
+    journal_file = args.journal
+    if args.backend == "fake":
+        backend = FakeBackend(args.latency, args.capacity, args.error_rate)
+        if not out_dir: # 假音频不要写进 public/
+            out_dir = tempfile.mkdtemp(prefix="fake_audio_")
+    else:
+        backend = EdgeBackend()
+    out_dir = os.path.abspath(out_dir or OUTPUT_DIR)
+    if not journal_file:
+        journal_file = JOURNAL_FILE if out_dir == os.path.abspath(OUTPUT_DIR) else os.path.join(out_dir, "journal.jsonl")
+
+    # 上次崩溃留下的临时文件
+    for tmp in glob.glob(os.path.join(out_dir, "**", "*.tmp"), recursive=True):
+        os.remove(tmp)
+
+    clips = load_clips(args.manifest)
+    if args.limit:
+        clips = clips[:args.limit]
+    journal = Journal(journal_file, out_dir)
+
+    if args.adopt:
+        # 老脚本生成的文件没有日志：信任已有的非空文件，直接记进日志
+        adopted = 0
+        for clip in clips:
+            path = os.path.join(out_dir, clip["file"])
+            if clip["file"] not in journal.entries and os.path.exists(path) and os.path.getsize(path) > 0:
+                with open(path, "rb") as f:
+                    journal.record(clip, f.read())
+                adopted += 1
+        print(f"Adopted {adopted} existing files")
+
+    todo = [c for c in clips if not journal.is_done(c, args.verify)]
+    print(f"{len(clips)} clips, {len(clips) - len(todo)} already done, {len(todo)} to generate -> {out_dir}")
+    stats = await generate(todo, backend, journal, args)
+    journal.compact()
+
+    elapsed = stats["elapsed"]
+    print(f"Generated {stats['done']} clips in {elapsed:.1f}s ({stats['done'] / elapsed if elapsed else 0:.1f} clips/s), "
+          f"{len(stats['failed'])} failed, {stats['errors']} errors retried, "
+          f"concurrency peak {stats['peak']} / final {stats['final']} ({stats['cuts']} backoffs)")
+    if stats["failed"]:
+        print("Re-run to retry the failed clips.")
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate all TTS clips with resume and adaptive concurrency")
+    parser.add_argument("--manifest", nargs="+", default=["chars"], choices=sorted(MANIFEST_FILES))
+    parser.add_argument("--out", help="输出目录 (默认 public/audio；fake 后端默认临时目录)")
+    parser.add_argument("--journal", help="日志文件 (默认 scripts/data/audio_journal.jsonl)")
+    parser.add_argument("--backend", choices=["edge", "fake"], default="edge")
+    parser.add_argument("--concurrency", type=int, default=4, help="起始并发")
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--backoff", type=float, default=1.0, help="第一次重试前等待秒数，之后翻倍")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单条合成超时 (秒)")
+    parser.add_argument("--progress", type=float, default=5.0, help="进度打印间隔 (秒)")
+    parser.add_argument("--limit", type=int, help="只处理前 N 条 (调试用)")
+    parser.add_argument("--verify", action="store_true", help="续跑时重新校验 sha256，而不只是大小")
+    parser.add_argument("--adopt", action="store_true", help="把已有但不在日志里的文件当作完成")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake: 每条耗时")
+    parser.add_argument("--capacity", type=int, default=8, help="fake: 超过这个并发就报限流错误 (0 不限)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake: 随机失败的比例")
+    asyncio.run(main(parser.parse_args()))
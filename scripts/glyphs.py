@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+# --- 字形相似度 ---
+# 用本地的中文字体把每个字画成 SIZE x SIZE 的灰度小图，存成一个 NumPy 数组 (带缓存)，
+# 再用矩阵乘法成块地算两两相似度，取每个字最像的 k 个字。
+#   - 先做 3x3 均值模糊，笔画差一两个像素的字也能对上
+#   - 每张图减去均值、除以范数后做内积 (即相关系数)，分块计算，内存只占 BLOCK x N
+#   - 字体里没有的字 (画出来是空白或和豆腐块一样) 不参与比较
+# 3000 字: 画图约几秒，相似度计算 1 秒以内 (单核)。
+#
+# 用法: cd scripts && python glyphs.py --font /path/to/NotoSansCJK-Regular.ttc --show 日,目,天
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(HERE, "../src/data/characters.json")
+CACHE_DIR = os.path.join(HERE, "data")
+SIZE = 32 # 小图边长 (像素)
+BLOCK = 1024 # 每次算多少行相似度
+
+# 常见系统上的中文字体，--font 没给时按顺序找
+FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/wenquanyi/wqy-microhei/wqy-microhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+]
+
+
+def find_font(path: str = None):
+    if path:
+        return path if os.path.exists(path) else None
+    return next((p for p in FONT_CANDIDATES if os.path.exists(p)), None)
+
+
+def render(chars: list, font_path: str, size: int = SIZE) -> np.ndarray:
+    """-> uint8 数组 (n, size, size)，字居中，留一点边"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = ImageFont.truetype(font_path, int(size * 0.9))
+    out = np.zeros((len(chars), size, size), dtype=np.uint8)
+    image = Image.new("L", (size, size))
+    draw = ImageDraw.Draw(image)
+    for i, ch in enumerate(chars):
+        draw.rectangle((0, 0, size, size), fill=0)
+        draw.text((size / 2, size / 2), ch, fill=255, font=font, anchor="mm")
+        out[i] = np.asarray(image)
+    return out
+
+
+def load_bitmaps(chars: list, font_path: str, size: int = SIZE, cache_dir: str = CACHE_DIR) -> np.ndarray:
+    """带缓存的 render：字体、尺寸、字表都没变时直接读 .npz"""
+    name = os.path.splitext(os.path.basename(font_path))[0]
+    path = os.path.join(cache_dir, f"glyphs_{name}_{size}.npz")
+    text = "".join(chars)
+    if os.path.exists(path):
+        cached = np.load(path)
+        if str(cached["chars"]) == text:
+            return cached["bitmaps"]
+    bitmaps = render(chars, font_path, size)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez_compressed(path, chars=np.array(text), bitmaps=bitmaps)
+    return bitmaps
+
+
+def missing(bitmaps: np.ndarray, tofu: np.ndarray) -> np.ndarray:
+    """字体里没有的字：空白，或者和 .notdef (豆腐块) 一模一样"""
+    blank = bitmaps.reshape(len(bitmaps), -1).max(axis=1) == 0
+    same = (bitmaps == tofu).all(axis=(1, 2))
+    return blank | same
+
+
+def features(bitmaps: np.ndarray) -> np.ndarray:
+    """模糊 -> 去均值 -> 单位化，返回 float32 (n, size*size)"""
+    x = bitmaps.astype(np.float32) / 255
+    # 3x3 均值模糊：对所有字一起做，边缘补 0
+    padded = np.pad(x, ((0, 0), (1, 1), (1, 1)))
+    h, w = x.shape[1:]
+    blurred = sum(padded[:, dy:dy + h, dx:dx + w] for dy in range(3) for dx in range(3)) / 9
+    flat = blurred.reshape(len(x), -1)
+    flat -= flat.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(flat, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return flat / norms
+
+
+def top_k(feats: np.ndarray, k: int = 5, valid: np.ndarray = None, block: int = BLOCK):
+    """每个字最像的 k 个字 -> (下标 (n, k), 相似度 (n, k))，按相似度从高到低"""
+    n = len(feats)
+    k = min(k, n - 1)
+    if valid is None:
+        valid = np.ones(n, dtype=bool)
+    index = np.zeros((n, k), dtype=np.int32)
+    score = np.full((n, k), -np.inf, dtype=np.float32)
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        sim = feats[start:stop] @ feats.T # (block, n)
+        sim[:, ~valid] = -np.inf
+        sim[np.arange(stop - start), np.arange(start, stop)] = -np.inf # 去掉自己
+        part = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        part_score = np.take_along_axis(sim, part, axis=1)
+        order = np.argsort(-part_score, axis=1, kind="stable")
+        index[start:stop] = np.take_along_axis(part, order, axis=1)
+        score[start:stop] = np.take_along_axis(part_score, order, axis=1)
+    score[~valid] = -np.inf
+    return index, score
+
+
+def similar_glyphs(chars: list, font_path: str, k: int = 5, size: int = SIZE, min_score: float = 0.0) -> dict:
+    """{字: [形近字...]}，字体里没有的字不出现在结果里"""
+    bitmaps = load_bitmaps(chars, font_path, size)
+    tofu = render(["\U0010FFFD"], font_path, size)[0]
+    valid = ~missing(bitmaps, tofu)
+    index, score = top_k(features(bitmaps), k, valid)
+    result = {}
+    for i, ch in enumerate(chars):
+        if valid[i]:
+            result[ch] = [chars[j] for j, s in zip(index[i], score[i]) if s > min_score]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find visually similar characters by rendering glyphs")
+    parser.add_argument("--font", help="中文字体 (.ttf/.ttc/.otf)，不给就在常见位置找")
+    parser.add_argument("--size", type=int, default=SIZE)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--show", default="日,目,天,人,土", help="打印这些字的结果")
+    args = parser.parse_args()
+
+    font = find_font(args.font)
+    if not font:
+        print("No CJK font found, pass --font")
+        return
+    with open(INPUT_FILE, encoding="utf-8") as f:
+        chars = [c["char"] for c in json.load(f)]
+
+    start = time.perf_counter()
+    bitmaps = load_bitmaps(chars, font, args.size)
+    tofu = render(["\U0010FFFD"], font, args.size)[0]
+    valid = ~missing(bitmaps, tofu)
+    rendered = time.perf_counter()
+    index, score = top_k(features(bitmaps), args.k, valid)
+    done = time.perf_counter()
+    print(f"{len(chars)} chars ({(~valid).sum()} missing in {os.path.basename(font)}): "
+          f"render {rendered - start:.2f}s, similarity {done - rendered:.2f}s")
+    for ch in args.show.split(","):
+        if ch in chars:
+            i = chars.index(ch)
+            print(ch, " ".join(f"{chars[j]}:{s:.2f}" for j, s in zip(index[i], score[i])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import argparse
+import fnmatch
+import glob
+import io
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from build import FileHashes, sha, write_if_changed
+from bundle_audio import BITRATES, CHARACTERS, CONFUSION, LEVELS, SAMPLE_RATES, VARIANTS, load_json, plan
+
+# --- 媒体瘦身 ---
+# edge-tts 的音频原样保存，public/images 光成就图标就 15 MB (2048x2048 的 PNG，页面上只显示 48px)。
+# 这里做一遍离线优化，输出每类资源和每一关的下载量，方便盯住低带宽家庭的流量：
+#   - 字音 / 剧情配音: 有 ffmpeg 时转成单声道低码率 AAC (或 Opus)，并用 loudnorm 统一响度
+#     (单字和题目音量一致)，写到 public/audio/opt/ 下，原文件不动 (generate_audio_bulk.py 的日志还认它)。
+#     bundle_audio.py 打包时优先用 opt/ 里的版本。
+#     没有 ffmpeg 时退回纯 Python: 不转码，只调 MP3 每帧的 global_gain (和 mp3gain 一样无损，步长 1.5 dB)，
+#     响度按有声帧的 global_gain 估算，把所有音频对齐到中位数
+#   - 图片: Pillow 按规则缩小尺寸、PNG 转 256 色调色板；原图第一次处理前备份到 scripts/data/media_originals/，
+#     以后每次都从原图重新生成，不会越压越糊。结果比原图大就保留原图
+#   - 按文件并行 (进程池)，源文件和参数都没变的跳过 (scripts/data/media_state.json)
+#
+# 用法: cd scripts && python optimize_media.py [--codec aac|opus] [--report report.json] [--strict]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PUBLIC = os.path.join(HERE, "../public")
+AUDIO_DIR = os.path.join(PUBLIC, "audio")
+OPT_DIR = os.path.join(AUDIO_DIR, "opt")
+ORIGINALS = os.path.join(HERE, "data/media_originals")
+STATE_FILE = os.path.join(HERE, "data/media_state.json")
+
+CODECS = {
+    # 扩展名, ffmpeg 参数
+    "aac": (".m4a", ["-c:a", "aac", "-b:a", "32k", "-movflags", "+faststart"]),
+    "opus": (".webm", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+}
+LOUDNESS = "loudnorm=I=-16:TP=-1.5:LRA=11" # EBU R128，所有音频同一个目标
+
+# 图片规则: 路径 (相对 public/) -> 最长边像素，先匹配先用；
+# NAMED = 用文件名里的尺寸 (PWA 图标，manifest 里声明的就是这个尺寸)
+NAMED = "named"
+IMAGE_RULES = [
+    ("images/achievements/*", 256), # 页面上只有几十 px，留 3 倍屏余量
+    ("images/scenes/*", 1280),
+    ("icon-*.png", NAMED),
+    ("pwa-*.png", NAMED),
+    ("*", 1024),
+]
+
+# 每类资源的预算 (KB)，--strict 时超出就返回非 0
+BUDGETS = {
+    "images": 1024,
+    "icons": 320,
+    "sfx": 256,
+    "chars": 40 * 1024,
+    "story": 4 * 1024,
+    "level": 300, # 每关音频包
+}
+
+
+def read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# --- MP3 帧 / global_gain (纯 Python 的响度调整) ---
+# 只处理 Layer III (帧头查表和 bundle_audio.py 共用)。side info 里每个 granule/声道有一个 8 位的 global_gain，
+# +1 = 音量 +1.5 dB。
+
+
+def frames(data: bytes):
+    """逐帧产出 (帧起点, 帧长, side info 起点, 是否 MPEG-1, 声道数, 是否带 CRC)"""
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        pos = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+    while pos + 4 <= len(data):
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            return
+        version, layer, rate_index = (b1 >> 3) & 0x3, (b1 >> 1) & 0x3, (b2 >> 2) & 0x3
+        if version == 1 or layer != 1 or rate_index == 3:
+            return
+        mpeg1 = version == 3
+        bitrate = BITRATES[mpeg1][b2 >> 4] * 1000
+        if not bitrate:
+            return
+        samples = 1152 if mpeg1 else 576
+        length = samples // 8 * bitrate // SAMPLE_RATES[version][rate_index] + ((b2 >> 1) & 0x1)
+        crc = not (b1 & 0x1)
+        yield pos, length, pos + 4 + (2 if crc else 0), mpeg1, 1 if (b3 >> 6) == 3 else 2, crc
+        pos += length
+
+
+def gain_fields(mpeg1: bool, channels: int):
+    """side info 里各个 global_gain 的比特偏移，以及对应的 big_values 偏移 (判断是不是静音)"""
+    if mpeg1:
+        start = 9 + (5 if channels == 1 else 3) + 4 * channels
+        granules, size = 2, 59
+    else:
+        start = 8 + (1 if channels == 1 else 2)
+        granules, size = 1, 63
+    fields = []
+    for i in range(granules * channels):
+        base = start + i * size
+        fields.append((base + 21, base + 12)) # part2_3_length(12) big_values(9) global_gain(8)
+    return fields
+
+
+def get_bits(buf, offset, n):
+    value = 0
+    for i in range(offset, offset + n):
+        value = (value << 1) | ((buf[i >> 3] >> (7 - (i & 7))) & 1)
+    return value
+
+
+def set_bits(buf, offset, n, value):
+    for i in range(n):
+        bit = (value >> (n - 1 - i)) & 1
+        j = offset + i
+        if bit:
+            buf[j >> 3] |= 1 << (7 - (j & 7))
+        else:
+            buf[j >> 3] &= ~(1 << (7 - (j & 7))) & 0xFF
+
+
+def crc16(data: bytes, crc: int = 0xFFFF) -> int:
+    # MPEG 音频帧 CRC: 多项式 0x8005，覆盖帧头后两个字节和 side info
+    for byte in data:
+        for i in range(7, -1, -1):
+            bit = ((crc >> 15) ^ (byte >> i)) & 1
+            crc = ((crc << 1) & 0xFFFF) ^ (0x8005 if bit else 0)
+    return crc
+
+
+def mp3_level(data: bytes):
+    """响度估计: 有声 granule 的 global_gain 里较大的一半取平均；不是 MP3 返回 None"""
+    gains = []
+    for _, _, side, mpeg1, channels, _ in frames(data):
+        for gain_at, big_at in gain_fields(mpeg1, channels):
+            if get_bits(data, side * 8 + big_at, 9): # big_values == 0 基本是静音
+                gains.append(get_bits(data, side * 8 + gain_at, 8))
+    if not gains:
+        return None
+    gains.sort()
+    return statistics.mean(gains[len(gains) // 2:])
+
+
+def mp3_apply_gain(data: bytes, steps: int) -> bytes:
+    """所有 global_gain 加 steps (每步 1.5 dB)，不解码、不损失音质"""
+    buf = bytearray(data)
+    for pos, _, side, mpeg1, channels, crc in frames(data):
+        for gain_at, _ in gain_fields(mpeg1, channels):
+            offset = side * 8 + gain_at
+            set_bits(buf, offset, 8, max(0, min(255, get_bits(buf, offset, 8) + steps)))
+        if crc:
+            side_len = (17 if channels == 1 else 32) if mpeg1 else (9 if channels == 1 else 17)
+            value = crc16(bytes(buf[pos + 2:pos + 4]) + bytes(buf[side:side + side_len]))
+            buf[pos + 4:pos + 6] = value.to_bytes(2, "big")
+    return bytes(buf)
+
+
+# --- 单个文件的处理 (顶层函数，交给进程池) ---
+
+def audio_output(dst, codec):
+    """ffmpeg 时按编码换扩展名，纯 Python 时还是 .mp3"""
+    return os.path.splitext(dst)[0] + CODECS[codec][0] if codec else dst
+
+
+def drop_other_variants(out):
+    """换了编码后，同一条音频的旧版本要删掉，不然 bundle_audio.py 会挑到它"""
+    stem = os.path.splitext(out)[0]
+    for ext in VARIANTS:
+        if stem + ext != out and os.path.exists(stem + ext):
+            os.remove(stem + ext)
+
+
+def transcode(src, out, codec):
+    """ffmpeg: 单声道、24kHz、低码率 + loudnorm"""
+    ext, params = CODECS[codec]
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    tmp = f"{out}.tmp{os.getpid()}{ext}"
+    subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", src, "-ac", "1", "-ar", "24000",
+                    "-af", LOUDNESS, *params, tmp], check=True)
+    os.replace(tmp, out)
+    drop_other_variants(out)
+
+
+def regain(src, out, steps):
+    data = read(src)
+    write_if_changed(out, mp3_apply_gain(data, steps) if steps else data)
+    drop_other_variants(out)
+
+
+def optimize_image(path, original, max_side):
+    from PIL import Image
+
+    data = read(original)
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = io.BytesIO()
+    if path.lower().endswith(".png"):
+        # 256 色调色板；带透明通道的用 RGBA 量化
+        mode = "RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB"
+        image = image.convert(mode).quantize(256, method=Image.Quantize.FASTOCTREE if mode == "RGBA" else Image.Quantize.MEDIANCUT)
+        image.save(out, "PNG", optimize=True)
+    else:
+        image.convert("RGB").save(out, "JPEG", quality=82, optimize=True, progressive=True)
+    result = out.getvalue()
+    write_if_changed(path, result if len(result) < len(data) else data)
+
+
+# --- 资源清单 ---
+
+def audio_sources():
+    """[(类别, 源文件, opt 下的输出路径)]"""
+    items = []
+    for kind in ("chars", "story"):
+        for src in sorted(glob.glob(os.path.join(AUDIO_DIR, kind, "*.mp3"))):
+            items.append((kind, src, os.path.join(OPT_DIR, kind, os.path.basename(src))))
+    return items
+
+
+def image_sources():
+    """[(类别, public 里的路径, 最长边)]，0 字节的占位文件跳过"""
+    items = []
+    for path in sorted(glob.glob(os.path.join(PUBLIC, "**", "*"), recursive=True)):
+        rel = os.path.relpath(path, PUBLIC).replace(os.sep, "/")
+        if rel.startswith("audio/") or not rel.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        if os.path.getsize(path) == 0 and not os.path.exists(os.path.join(ORIGINALS, rel)):
+            continue
+        max_side = next(size for pattern, size in IMAGE_RULES if fnmatch.fnmatch(rel, pattern))
+        if max_side == NAMED:
+            m = re.search(r"(\d+)(?:x\d+)?\.\w+$", rel)
+            max_side = int(m.group(1)) if m else None
+        items.append(("images" if rel.startswith("images/") else "icons", path, max_side))
+    return items
+
+
+def variant(path):
+    """opt/ 下实际存在的版本 (扩展名可能是 .m4a / .webm / .mp3)"""
+    stem = os.path.splitext(path)[0]
+    for ext in VARIANTS:
+        if os.path.exists(stem + ext):
+            return stem + ext
+    return None
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def run(args):
+    codec = args.codec if shutil.which("ffmpeg") and not args.no_ffmpeg else None
+    state = load_state()
+    hashes = FileHashes(state.setdefault("hashes", {}))
+    done = state.setdefault("done", {}) # 输出路径 -> 生成它时的指纹
+    jobs = [] # (输出路径, 指纹, 函数, 参数)
+
+    audio = audio_sources()
+    if codec:
+        for _, src, dst in audio:
+            out = audio_output(dst, codec)
+            jobs.append((out, f"{hashes.hash(src)}:{codec}:{LOUDNESS}", transcode, (src, out, codec)))
+    elif audio:
+        print("ffmpeg not found: audio is gain-matched only (no transcoding)")
+        # 响度估计按内容哈希缓存，没变的文件不用再解析
+        cache = state.setdefault("levels", {})
+        levels = {}
+        for _, src, _ in audio:
+            digest = hashes.hash(src)
+            if digest not in cache:
+                cache[digest] = mp3_level(read(src))
+            levels[src] = cache[digest]
+        known = [v for v in levels.values() if v is not None]
+        target = statistics.median(known) if known else 0
+        for _, src, dst in audio:
+            steps = round(target - levels[src]) if levels[src] is not None else 0
+            jobs.append((dst, f"{hashes.hash(src)}:gain{steps}", regain, (src, dst, steps)))
+
+    written = state.setdefault("written", {}) # 图片路径 -> 上次写出去的内容哈希
+    for _, path, max_side in image_sources():
+        original = os.path.join(ORIGINALS, os.path.relpath(path, PUBLIC))
+        # 没备份过，或者 public 里的图被换成了新图 (不是上次写出去的那份)，就把它当新的原图
+        if not os.path.exists(original) or written.get(path, hashes.hash(path)) != hashes.hash(path):
+            os.makedirs(os.path.dirname(original), exist_ok=True)
+            shutil.copy2(path, original)
+        jobs.append((path, f"{hashes.hash(original)}:{max_side}", optimize_image, (path, original, max_side)))
+
+    todo = [j for j in jobs if args.force or done.get(j[0]) != j[1] or not os.path.exists(j[0])]
+    print(f"{len(jobs)} files, {len(todo)} to process")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(fn, *fn_args): (out, fp, fn) for out, fp, fn, fn_args in todo}
+        for i, fut in enumerate(futures, 1):
+            out, fp, fn = futures[fut]
+            try:
+                fut.result()
+                done[out] = fp
+                if fn is optimize_image:
+                    written[out] = sha(read(out))
+            except Exception as e:
+                failed += 1
+                print(f"FAILED {os.path.relpath(out, PUBLIC)}: {e}")
+            if i % 500 == 0:
+                print(f"{i}/{len(todo)}")
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+
+    report = size_report(audio)
+    report["codec"] = codec or "mp3 (gain only)"
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    over = [c for c in report["classes"] if c["over"]] + [lv for lv in report["levels"] if lv["over"]]
+    if args.strict and (over or failed):
+        sys.exit(1)
+
+
+# --- 体积报告 ---
+
+def size_report(audio) -> dict:
+    classes = {}
+
+    def add(kind, before, after):
+        c = classes.setdefault(kind, {"class": kind, "files": 0, "before": 0, "after": 0})
+        c["files"] += 1
+        c["before"] += before
+        c["after"] += after
+
+    clip_size = {} # 音频名 -> (原始大小, 优化后大小)
+    for kind, src, dst in audio:
+        out = variant(dst)
+        before = os.path.getsize(src)
+        after = os.path.getsize(out) if out else before
+        if kind == "chars":
+            clip_size[os.path.splitext(os.path.basename(src))[0]] = (before, after)
+        add(kind, before, after)
+    for kind, path, _ in image_sources():
+        original = os.path.join(ORIGINALS, os.path.relpath(path, PUBLIC))
+        add(kind, os.path.getsize(original if os.path.exists(original) else path), os.path.getsize(path))
+    for path in glob.glob(os.path.join(AUDIO_DIR, "sfx", "*.mp3")):
+        add("sfx", os.path.getsize(path), os.path.getsize(path))
+
+    # 每关要下载的字音 (和 bundle_audio.py 的 level_N 包同一份清单)
+    levels = []
+    bundles = plan(load_json(CHARACTERS), load_json(LEVELS), load_json(CONFUSION))
+    for name, clips in bundles.items():
+        if not name.startswith("level_"):
+            continue
+        sizes = [clip_size[c] for c in clips if c in clip_size]
+        after = sum(a for _, a in sizes)
+        levels.append({"level": name, "clips": len(sizes), "before": sum(b for b, _ in sizes), "after": after,
+                       "over": after > BUDGETS["level"] * 1024})
+
+    result = []
+    for kind, c in classes.items():
+        c["budget"] = BUDGETS.get(kind, 0) * 1024
+        c["over"] = bool(c["budget"]) and c["after"] > c["budget"]
+        result.append(c)
+    return {"classes": result, "levels": levels}
+
+
+def print_report(report):
+    kb = lambda n: f"{n / 1024:,.0f}KB"
+    print(f"\n{'class':>8} {'files':>6} {'before':>11} {'after':>11} {'saved':>6} {'budget':>9}")
+    for c in report["classes"]:
+        saved = 1 - c["after"] / c["before"] if c["before"] else 0
+        flag = "  OVER" if c["over"] else ""
+        print(f"{c['class']:>8} {c['files']:>6} {kb(c['before']):>11} {kb(c['after']):>11} {saved:>6.0%} "
+              f"{kb(c['budget']):>9}{flag}")
+    if report["levels"]:
+        print(f"\n{'level':>9} {'clips':>6} {'before':>9} {'after':>9}")
+        for lv in report["levels"]:
+            print(f"{lv['level']:>9} {lv['clips']:>6} {kb(lv['before']):>9} {kb(lv['after']):>9}"
+                  f"{'  OVER' if lv['over'] else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcode/normalize TTS audio, recompress images and report sizes")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="aac")
+    parser.add_argument("--no-ffmpeg", action="store_true", help="即使有 ffmpeg 也用纯 Python 的音量对齐")
+    parser.add_argument("--force", action="store_true", help="忽略缓存全部重做")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--report", help="把体积报告写成 JSON")
+    parser.add_argument("--strict", action="store_true", help="有超预算的类别时返回 1")
+    run(parser.parse_args())
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+# --- 鉴权开销微基准 ---
+# 直接调用 main.get_current_user (不走 HTTP)，对比:
+#   - cold: 每次都解 JWT + 查 users 表 (缓存清空)
+#   - hot : 命中登录用户缓存
+# 用户带一份较大的 save_data，确认鉴权时不会再把它读出来。
+#
+# 用法: cd server && python bench_auth.py --calls 20000
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def timed(fn, calls: int) -> float:
+    """平均每次调用耗时 (微秒)"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        await fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def run(args, main):
+    from sqlalchemy import update
+
+    from database import AsyncSessionLocal, migrate
+    from models import User
+
+    await migrate()
+    async with AsyncSessionLocal() as db:
+        db.add(User(username="bench", hashed_password="x"))
+        await db.commit()
+        blob = json.dumps({"characters": {str(i): {"level": 1, "lastTime": i} for i in range(args.save_kb * 20)}})
+        await db.execute(update(User).where(User.username == "bench").values(save_data=blob))
+        await db.commit()
+
+    token = main.create_access_token({"sub": "bench"})
+
+    async def cold():
+        main.user_cache.clear()
+        await main.get_current_user(token)
+
+    async def hot():
+        await main.get_current_user(token)
+
+    await hot() # 预热
+    cold_us = await timed(cold, args.calls // 10)
+    hot_us = await timed(hot, args.calls)
+    print(f"save_data: {len(blob) / 1024:.0f} KB")
+    print(f"get_current_user cold (jwt.decode + SELECT): {cold_us:9.1f} us/call")
+    print(f"get_current_user hot  (cache hit)          : {hot_us:9.2f} us/call")
+    print(f"cache: {main.user_cache.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark get_current_user with and without the user cache")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--save-kb", type=int, default=200, help="approximate size of the user's save_data")
+    args = parser.parse_args()
+
+    # 在临时目录里建库和静态目录，不碰 server/ 下的 sql_app.db
+    workdir = tempfile.mkdtemp(prefix="hanzi_auth_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("TTS_BACKEND", "fake")
+    os.chdir(workdir)
+    sys.path.insert(0, SERVER_DIR)
+    try:
+        import main
+        asyncio.run(run(args, main))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from chardict import CharDict, build, split_tone
+
+
+# --- 字典：JSON vs 二进制 ---
+# 启动: json.load(characters.json) + 建索引 vs mmap 打开 characters.bin
+# 查询: 按字 / id / 等级 / 拼音，分别对比
+#   - json-scan : 和前端 getCharDetail 一样在列表里线性查找
+#   - json-dict : 加载后自己建好 dict 索引
+#   - binary    : chardict.py
+#
+# 用法: cd server && python bench_chardict.py --lookups 20000
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data", "characters.json")
+
+
+def timed(fn, repeat: int = 1) -> float:
+    """平均每次耗时 (微秒)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def load_json_indexed():
+    with open(DATA_FILE, encoding="utf-8") as f:
+        chars = json.load(f)
+    by_char = {c["char"]: c for c in chars}
+    by_id = {c["id"]: c for c in chars}
+    by_level, by_pinyin = {}, {}
+    for c in chars:
+        by_level.setdefault(c["level"], []).append(c)
+        by_pinyin.setdefault(split_tone(c["pinyin"])[0], []).append(c)
+    return chars, by_char, by_id, by_level, by_pinyin
+
+
+def run(args):
+    with open(DATA_FILE, encoding="utf-8") as f:
+        chars = json.load(f)
+    rng = random.Random(args.seed)
+    keys = [rng.choice(chars) for _ in range(args.lookups)]
+    plains = [split_tone(c["pinyin"])[0] for c in keys]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "characters.bin")
+        build_us = timed(lambda: build(chars, path))
+        print(f"{len(chars)} chars: json {os.path.getsize(DATA_FILE) / 1024:.0f} KB, "
+              f"binary {os.path.getsize(path) / 1024:.0f} KB (build {build_us / 1000:.1f} ms)")
+
+        def open_binary():
+            CharDict(path).close()
+
+        print("\nstartup")
+        print(f"  json.load             {timed(lambda: json.load(open(DATA_FILE, encoding='utf-8')), args.repeat) / 1000:8.2f} ms")
+        print(f"  json.load + indexes   {timed(load_json_indexed, args.repeat) / 1000:8.2f} ms")
+        print(f"  binary mmap open      {timed(open_binary, args.repeat) / 1000:8.2f} ms")
+
+        _, by_char, by_id, by_level, by_pinyin = load_json_indexed()
+        d = CharDict(path)
+        n = len(keys)
+        print(f"\nlookups (µs per lookup, {n} random keys)")
+        print(f"{'':>10} {'json-scan':>10} {'json-dict':>10} {'binary':>10} {'binary row':>11}")
+
+        rows = [
+            ("char",
+             lambda: [next(c for c in chars if c["char"] == k["char"]) for k in keys[:n // 20]],
+             lambda: [by_char[k["char"]] for k in keys],
+             lambda: [d.find_char(k["char"]) for k in keys],
+             lambda: [d.get(k["char"]) for k in keys]),
+            ("id",
+             lambda: [next(c for c in chars if c["id"] == k["id"]) for k in keys[:n // 20]],
+             lambda: [by_id[k["id"]] for k in keys],
+             lambda: [d.find_id(k["id"]) for k in keys],
+             lambda: [d.get(k["id"]) for k in keys]),
+            ("level",
+             lambda: [[c for c in chars if c["level"] == k["level"]] for k in keys[:n // 20]],
+             lambda: [by_level[k["level"]] for k in keys],
+             lambda: [d.find_level(k["level"]) for k in keys],
+             lambda: [d.by_level(k["level"], 0, 20) for k in keys[:n // 20]]),
+            ("pinyin",
+             lambda: [[c for c in chars if split_tone(c["pinyin"])[0] == p] for p in plains[:n // 200]],
+             lambda: [by_pinyin[p] for p in plains],
+             lambda: [d.find_pinyin(p) for p in plains],
+             lambda: [d.by_pinyin(p) for p in plains]),
+        ]
+        for name, scan, indexed, binary, binary_row in rows:
+            scan_n = n // 200 if name == "pinyin" else n // 20
+            row_n = n // 20 if name == "level" else n
+            print(f"{name:>10} {timed(scan) / scan_n:10.2f} {timed(indexed) / n:10.2f} "
+                  f"{timed(binary) / n:10.2f} {timed(binary_row) / row_n:11.2f}")
+        print("\n(binary = 只查行号；binary row = 再解码成和 JSON 一样的 dict；level 的 binary row 每次取 20 个)")
+        d.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare characters.json with the binary dictionary")
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from models import create_tables
+from review import due_query, now_ms
+
+
+# --- 待复习队列查询压测 ---
+# 在临时 SQLite 里造 N 个用户 x 全部字 (默认 10k x 2726) 的字记录，
+# 对比两种做法拿"某个用户到期的字":
+#   - 新: char_records 上的 (user_id, next_review_time) 索引查询
+#   - 旧: 解析整包 save_data JSON 再过滤排序
+#
+# 用法: cd server && python bench_due.py --users 10000
+# (全量数据约 2700 万行，建库需要几分钟；先用 --users 500 试跑)
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data", "characters.json")
+DAY_MS = 24 * 3600 * 1000
+
+
+def fake_record(rng: random.Random, now: int) -> dict:
+    if rng.random() < 0.3: # 还没学过
+        return {"status": "new", "level": 0, "nextReviewTime": 0, "correct": 0, "wrong": 0, "streak": 0, "lastTime": 0}
+    level = rng.randint(0, 5)
+    return {
+        "status": "mastered" if level >= 4 else "learning",
+        "level": level,
+        "nextReviewTime": now + rng.randint(-7 * DAY_MS, 7 * DAY_MS),
+        "correct": rng.randint(0, 20),
+        "wrong": rng.randint(0, 10),
+        "streak": rng.randint(0, 5),
+        "lastTime": now - rng.randint(0, 30 * DAY_MS),
+    }
+
+
+def build(engine, chars: list[str], users: int, legacy_users: int, now: int, seed: int):
+    rng = random.Random(seed)
+    legacy_blobs = {}
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            "INSERT INTO users (id, username, hashed_password) VALUES (?, ?, ?)",
+            [(uid, f"user{uid}", "x") for uid in range(1, users + 1)],
+        )
+        for uid in range(1, users + 1):
+            records = {c: fake_record(rng, now) for c in chars}
+            cur.executemany(
+                "INSERT INTO char_records (user_id, char, status, level, next_review_time, correct, wrong, streak, last_time, rev) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                [(uid, c, r["status"], r["level"], r["nextReviewTime"], r["correct"], r["wrong"], r["streak"], r["lastTime"])
+                 for c, r in records.items()],
+            )
+            if uid <= legacy_users:
+                legacy_blobs[uid] = json.dumps({"characters": records}, ensure_ascii=False)
+            if uid % 1000 == 0:
+                raw.commit()
+                print(f"  ... {uid} users")
+        raw.commit()
+    finally:
+        raw.close()
+    return legacy_blobs
+
+
+def legacy_due(blob: str, now: int, limit: int) -> list:
+    characters = json.loads(blob)["characters"]
+    due = [(r["nextReviewTime"], c) for c, r in characters.items()
+           if r["nextReviewTime"] > 0 and r["nextReviewTime"] <= now and r["level"] < 5]
+    return sorted(due)[:limit]
+
+
+def report(name: str, samples: list):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:>22}: n={len(samples)}  p50={statistics.median(samples):.3f}ms  p99={p99:.3f}ms")
+
+
+def main(args):
+    with open(DATA_FILE, encoding="utf-8") as f:
+        chars = [c["char"] for c in json.load(f)][:args.chars]
+
+    workdir = tempfile.mkdtemp(prefix="hanzi_due_")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    create_tables(engine)
+    now = now_ms()
+
+    print(f"Building {args.users} users x {len(chars)} chars ...")
+    start = time.perf_counter()
+    legacy_blobs = build(engine, chars, args.users, min(args.legacy_users, args.users), now, args.seed)
+    print(f"Built in {time.perf_counter() - start:.1f}s")
+
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(args.seed + 1)
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM char_records WHERE user_id = 1 "
+            "AND next_review_time > 0 AND next_review_time <= :now AND level < 5 ORDER BY next_review_time LIMIT 20"
+        ), {"now": now}).fetchall()
+        print("Query plan:", "; ".join(row[-1] for row in plan))
+
+    db = Session()
+    indexed = []
+    for _ in range(args.queries):
+        uid = rng.randint(1, args.users)
+        t = time.perf_counter()
+        db.scalars(due_query(uid, now, args.limit)).all()
+        indexed.append((time.perf_counter() - t) * 1000)
+    db.close()
+
+    legacy = []
+    for _ in range(min(args.queries, len(legacy_blobs) * 10)):
+        uid = rng.randint(1, len(legacy_blobs))
+        t = time.perf_counter()
+        legacy_due(legacy_blobs[uid], now, args.limit)
+        legacy.append((time.perf_counter() - t) * 1000)
+
+    report("indexed char_records", indexed)
+    if legacy:
+        report("parse save_data blob", legacy)
+
+    engine.dispose()
+    if not args.keep:
+        shutil.rmtree(workdir)
+    else:
+        print(f"Database kept at {workdir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the due-for-review query")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--chars", type=int, default=3000, help="per user (capped by characters.json)")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--legacy-users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the temp database")
+    main(parser.parse_args())
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from stub_ollama import start_stub
+
+
+# --- LLM 负载压测 ---
+# 启动本地 Ollama 替身 + 一个独立的 API 服务 (临时目录里的数据库)，
+# 先测空闲时 /users/me 的延迟，再在 N 个故事生成进行中时测一遍，
+# 两次的 p99 应该基本持平 (说明 LLM 调用不再卡住事件循环)。
+#
+# 用法: cd server && python bench_llm.py --stories 20 --latency 3
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def start_api(ollama_url: str, workdir: str, **extra_env):
+    port = free_port()
+    env = dict(os.environ, OLLAMA_API_URL=ollama_url, TTS_BACKEND="fake", **extra_env)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SERVER_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base}/docs", timeout=0.5)
+            return proc, base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("API server did not start")
+
+
+async def probe(client: httpx.AsyncClient, headers: dict, duration: float, interval: float = 0.05):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        r = await client.get("/users/me", headers=headers)
+        r.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(args):
+    stub, ollama_url = start_stub(latency=args.latency)
+    workdir = tempfile.mkdtemp(prefix="hanzi_bench_")
+    proc, base = start_api(ollama_url, workdir)
+
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=120) as client:
+            r = await client.post("/register", json={"username": "bench", "password": "bench"})
+            r.raise_for_status()
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+            # 1. 空闲基线
+            idle = await probe(client, headers, args.duration)
+
+            # 2. N 个故事生成同时在跑
+            async def one_story():
+                start = time.perf_counter()
+                await client.post("/story/generate", json={"known_chars": list("人口手天地大小")}, headers=headers)
+                return time.perf_counter() - start
+
+            stories = [asyncio.create_task(one_story()) for _ in range(args.stories)]
+            await asyncio.sleep(0.2)
+            loaded = await probe(client, headers, args.duration)
+            story_times = await asyncio.gather(*stories)
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub.shutdown()
+
+    print(f"Ollama stub latency: {args.latency}s, concurrent stories: {args.stories}")
+    for name, lat in (("idle", idle), ("under LLM load", loaded)):
+        print(f"/users/me {name:>15}: n={len(lat):4d}  p50={percentile(lat, 50):7.2f}ms  "
+              f"p99={percentile(lat, 99):7.2f}ms  max={max(lat):7.2f}ms")
+    print(f"/story/generate: mean={statistics.mean(story_times):.2f}s  max={max(story_times):.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API latency while LLM calls are in flight")
+    parser.add_argument("--stories", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    asyncio.run(run(parser.parse_args()))
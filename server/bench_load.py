@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from bench_llm import SERVER_DIR, percentile, start_api
+from stub_ollama import start_stub
+
+
+# --- 综合负载压测 ---
+# 起一个独立的 API 服务 (临时目录里的新库)，Ollama 换成本地替身 (stub_ollama.py)，
+# TTS 换成离线假合成 (TTS_BACKEND=fake)，两者的延迟都可以配置。
+# C 个并发客户端按权重随机混合真实流量:
+#   登录、整包上传/下载存档 (按 --learned 个字生成，大小接近真实存档)、增量同步、
+#   复习队列、故事生成 (普通 + 流式)、剧情。
+# 输出每个路由的吞吐和 p50/p95/p99，并把结果存成 JSON，方便不同提交之间对比:
+#
+#   cd server
+#   python bench_load.py --out before.json
+#   git checkout <new commit>
+#   python bench_load.py --out after.json --compare before.json
+
+DATA_DIR = os.path.join(SERVER_DIR, "..", "src", "data")
+
+# 路由 -> 权重 (大致按一节课里的请求比例)
+MIX = {
+    "login": 4,
+    "me": 20,
+    "upload": 6,
+    "download": 10,
+    "delta": 16,
+    "download_since": 10,
+    "review_due": 12,
+    "review_next": 8,
+    "story": 2,
+    "story_stream": 2,
+    "scenario": 5,
+}
+
+
+def make_save(rng: random.Random, chars: list[str], learned: int) -> dict:
+    """造一份和前端 userStore 结构一致的整包存档"""
+    now = int(time.time() * 1000)
+    characters = {}
+    for c in rng.sample(chars, min(learned, len(chars))):
+        level = rng.randint(0, 5)
+        characters[c] = {
+            "status": "mastered" if level == 5 else "learning", "level": level,
+            "nextReviewTime": now + rng.randint(-86400000, 86400000), "correct": rng.randint(0, 20),
+            "wrong": rng.randint(0, 10), "streak": rng.randint(0, 5), "lastTime": now - rng.randint(0, 86400000),
+        }
+    return {
+        "characters": characters,
+        "info": {"name": "小朋友", "avatar": "boy"},
+        "progress": {"currentLevel": rng.randint(1, 200), "totalScore": rng.randint(0, 99999)},
+        "history": [{"date": "2026-01-01", "level": i, "score": rng.randint(0, 100)} for i in range(learned // 4)],
+        "trains": ["train_1"], "currentTrainId": "train_1", "achievements": [],
+        "settings": {"bgmVolume": 0.5, "sfxVolume": 0.8}, "unlockedParts": [], "equippedParts": {},
+        "lastPlayDate": "2026-01-01", "dailyStreak": 3, "checkInDates": [],
+    }
+
+
+def make_delta(rng: random.Random, chars: list[str], size: int) -> dict:
+    now = int(time.time() * 1000)
+    picked = rng.sample(chars, size)
+    return {
+        "base_rev": 0,
+        "chars": {
+            c: {"status": "learning", "level": rng.randint(0, 5), "nextReviewTime": now + 60000,
+                "correct": rng.randint(0, 9), "wrong": rng.randint(0, 9), "streak": 0, "lastTime": now}
+            for c in picked
+        },
+        "events": [{"char": c, "correct": rng.random() < 0.7, "time": now} for c in picked],
+        "fields": {"progress": {"currentLevel": rng.randint(1, 200), "totalScore": rng.randint(0, 9999)}},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, text=True, stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def ok(self, route: str, ms: float):
+        self.latencies.setdefault(route, []).append(ms)
+
+    def error(self, route: str):
+        self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(route, [])
+            routes[route] = {
+                "count": len(values),
+                "errors": self.errors.get(route, 0),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        return routes
+
+
+async def run(args):
+    with open(os.path.join(DATA_DIR, "characters.json"), encoding="utf-8") as f:
+        chars = [c["char"] for c in json.load(f)]
+    with open(os.path.join(DATA_DIR, "chars_index.json"), encoding="utf-8") as f:
+        chars_index = json.load(f)
+    rng = random.Random(args.seed)
+    extra_env = dict(kv.split("=", 1) for kv in args.env)
+
+    stub, ollama_url = start_stub(latency=args.ollama_latency)
+    workdir = tempfile.mkdtemp(prefix="hanzi_load_")
+    proc, base = start_api(
+        ollama_url, workdir,
+        TTS_FAKE_LATENCY=str(args.tts_latency), SCENARIO_PREFILL_MAX_LEVEL=str(args.prefill_level), **extra_env,
+    )
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.clients + 8)
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+            users = []
+            for i in range(args.users):
+                start = time.perf_counter()
+                r = await client.post("/register", json={"username": f"load{i}", "password": "bench"})
+                r.raise_for_status()
+                rec.ok("register", (time.perf_counter() - start) * 1000)
+                users.append((f"load{i}", {"Authorization": f"Bearer {r.json()['access_token']}"}))
+
+            saves = [json.dumps(make_save(rng, chars, args.learned), ensure_ascii=False) for _ in range(8)]
+            save_kb = sum(len(s.encode()) for s in saves) / len(saves) / 1024
+
+            def request(op: str, name: str, headers: dict):
+                if op == "login":
+                    return client.post("/token", data={"username": name, "password": "bench"})
+                if op == "me":
+                    return client.get("/users/me", headers=headers)
+                if op == "upload":
+                    return client.post("/sync/upload", json={"data": rng.choice(saves)}, headers=headers)
+                if op == "download":
+                    return client.get("/sync/download", headers=headers)
+                if op == "delta":
+                    body = json.dumps(make_delta(rng, chars, args.chars_per_delta), ensure_ascii=False)
+                    return client.post("/sync/delta", content=body, headers={**headers, "Content-Type": "application/json"})
+                if op == "download_since":
+                    return client.get("/sync/download", params={"since": 0}, headers=headers)
+                if op == "review_due":
+                    return client.get("/review/due", headers=headers)
+                if op == "review_next":
+                    return client.get("/review/next", headers=headers)
+                if op == "story":
+                    return client.post("/story/generate", json={"known_chars": rng.sample(chars, 10)}, headers=headers)
+                if op == "scenario":
+                    level = rng.randrange(5, 55, 5)
+                    char_level = min((level + 19) // 20, 5)
+                    picked = [c["char"] for c in chars_index if c["level"] == char_level][:5]
+                    return client.post("/story/scenario", json={"level": level, "chars": picked}, headers=headers)
+                raise ValueError(op)
+
+            async def stream_story(headers: dict) -> int:
+                async with client.stream("POST", "/story/generate/stream",
+                                         json={"known_chars": rng.sample(chars, 10)}, headers=headers) as r:
+                    async for _ in r.aiter_bytes():
+                        pass
+                    return r.status_code
+
+            ops, weights = list(MIX), list(MIX.values())
+            deadline = time.perf_counter() + args.duration
+
+            async def worker():
+                while time.perf_counter() < deadline:
+                    op = rng.choices(ops, weights)[0]
+                    name, headers = rng.choice(users)
+                    start = time.perf_counter()
+                    try:
+                        if op == "story_stream":
+                            status = await stream_story(headers)
+                        else:
+                            status = (await request(op, name, headers)).status_code
+                    except httpx.HTTPError:
+                        rec.error(op)
+                        continue
+                    # 还没有存档时下载返回 404，算正常
+                    if status == 200 or (status == 404 and op == "download"):
+                        rec.ok(op, (time.perf_counter() - start) * 1000)
+                    else:
+                        rec.error(op)
+
+            started = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(args.clients)])
+            elapsed = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    routes = rec.summary(elapsed)
+    routes.pop("register", None) # 注册只在准备阶段跑，不计入混合流量
+    all_latencies = [ms for op, values in rec.latencies.items() if op != "register" for ms in values]
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "save_kb": round(save_kb, 1),
+            "args": vars(args),
+        },
+        "total": {
+            "count": len(all_latencies),
+            "errors": sum(n for op, n in rec.errors.items() if op != "register"),
+            "rps": round(len(all_latencies) / elapsed, 2),
+            "p50_ms": round(percentile(all_latencies, 50), 2),
+            "p95_ms": round(percentile(all_latencies, 95), 2),
+            "p99_ms": round(percentile(all_latencies, 99), 2),
+        },
+        "routes": routes,
+    }
+
+
+def change(new: float, old: float) -> str:
+    if not old:
+        return ""
+    return f"({(new - old) / old * 100:+.0f}%)"
+
+
+def report(result: dict, baseline: dict = None):
+    meta = result["meta"]
+    print(f"commit {meta['commit']}, {meta['args']['clients']} clients, {meta['args']['duration']}s, "
+          f"save ~{meta['save_kb']} KB, ollama latency {meta['args']['ollama_latency']}s, "
+          f"tts latency {meta['args']['tts_latency']}s")
+    if baseline:
+        print(f"compared with commit {baseline['meta']['commit']}")
+    print(f"{'route':>15} {'count':>7} {'err':>5} {'req/s':>16} {'p50 ms':>9} {'p95 ms':>16} {'p99 ms':>16}")
+    rows = list(result["routes"].items()) + [("TOTAL", result["total"])]
+    for route, r in rows:
+        old = {}
+        if baseline:
+            old = baseline["total"] if route == "TOTAL" else baseline["routes"].get(route, {})
+        print(f"{route:>15} {r['count']:>7} {r['errors']:>5} "
+              f"{r['rps']:>8.1f}{change(r['rps'], old.get('rps')):>8} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>8.1f}{change(r['p95_ms'], old.get('p95_ms')):>8} "
+              f"{r['p99_ms']:>8.1f}{change(r['p99_ms'], old.get('p99_ms')):>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mixed-traffic load test for the API server")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--learned", type=int, default=800, help="chars per uploaded save blob")
+    parser.add_argument("--chars-per-delta", type=int, default=10)
+    parser.add_argument("--ollama-latency", type=float, default=1.0)
+    parser.add_argument("--tts-latency", type=float, default=0.2)
+    parser.add_argument("--prefill-level", type=int, default=0, help="SCENARIO_PREFILL_MAX_LEVEL for the server")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="extra env for the server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"results saved to {args.out}")
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+
+import httpx
+
+from bench_llm import percentile, start_api
+from stub_ollama import start_stub
+
+
+# --- 集中登录压测 ---
+# 模拟上课时全班同时登录：L 个客户端不停 POST /token，
+# 同时 P 个客户端不停请求不需要算密码的接口 (/users/me、/review/due)，
+# 先测一段没有登录压力的基线，再测登录高峰期间的吞吐和 p99。
+# 分别在两种配置下跑一遍:
+#   - threadpool: PASSWORD_WORKERS=0 (在线程池里算 bcrypt，不限并发)
+#   - pool      : PASSWORD_WORKERS=2 (独立进程池 + 排队上限 + nice)
+#
+# 用法: cd server && python bench_login.py --logins 30 --duration 10
+
+MODES = {
+    "threadpool": {"PASSWORD_WORKERS": "0"},
+    "pool": {"PASSWORD_WORKERS": "2"},
+}
+
+
+async def measure(client: httpx.AsyncClient, headers: list[dict], clients: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(i: int):
+        nonlocal errors
+        paths = ["/users/me", "/review/due"]
+        n = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                r = await client.get(paths[n % 2], headers=headers[(i + n) % len(headers)])
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            n += 1
+            if r.status_code != 200:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(clients)])
+    elapsed = time.perf_counter() - started
+    return {"rps": len(latencies) / elapsed, "p99": percentile(latencies, 99), "errors": errors}
+
+
+async def run_mode(name: str, args, ollama_url: str) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"hanzi_login_{name}_")
+    proc, base = start_api(ollama_url, workdir, SCENARIO_PREFILL_MAX_LEVEL="0",
+                           BCRYPT_ROUNDS=str(args.rounds), **MODES[name])
+    limits = httpx.Limits(max_connections=args.logins + args.probes + 8)
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+            headers = []
+            for i in range(args.users):
+                r = await client.post("/register", json={"username": f"kid{i}", "password": "bench"})
+                r.raise_for_status()
+                headers.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+
+            idle = await measure(client, headers, args.probes, args.duration)
+
+            logins = {"ok": 0, "busy": 0, "errors": 0}
+            deadline = time.perf_counter() + args.duration
+
+            async def login(i: int):
+                while time.perf_counter() < deadline:
+                    try:
+                        r = await client.post("/token", data={"username": f"kid{i % args.users}", "password": "bench"})
+                    except httpx.HTTPError:
+                        logins["errors"] += 1
+                        continue
+                    if r.status_code == 200:
+                        logins["ok"] += 1
+                    elif r.status_code == 503:
+                        logins["busy"] += 1
+                        await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+                    else:
+                        logins["errors"] += 1
+
+            busy, _ = await asyncio.gather(
+                measure(client, headers, args.probes, args.duration),
+                asyncio.gather(*[login(i) for i in range(args.logins)]),
+            )
+            stats = (await client.get("/auth/stats")).json()["passwords"]
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"mode": name, "idle": idle, "busy": busy, "logins": logins, "max_pending": stats["max_pending"]}
+
+
+async def run(args):
+    stub, ollama_url = start_stub(latency=0.1)
+    try:
+        results = [await run_mode(name, args, ollama_url) for name in args.modes]
+    finally:
+        stub.shutdown()
+
+    print(f"{args.users} users, {args.logins} concurrent logins, {args.probes} probe clients, "
+          f"bcrypt rounds={args.rounds}, {args.duration}s per phase")
+    for r in results:
+        idle, busy = r["idle"], r["busy"]
+        print(f"{r['mode']:>10}: idle {idle['rps']:7.1f} req/s p99={idle['p99']:7.1f}ms | "
+              f"during logins {busy['rps']:7.1f} req/s p99={busy['p99']:7.1f}ms "
+              f"({busy['rps'] / idle['rps'] * 100 if idle['rps'] else 0:5.1f}%)  "
+              f"logins={r['logins']}  max_pending={r['max_pending']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of non-auth routes during a login burst")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--logins", type=int, default=30)
+    parser.add_argument("--probes", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    asyncio.run(run(parser.parse_args()))
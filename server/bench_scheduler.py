@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from scheduler import DAY, Deck, batch_next_targets, next_targets
+
+
+# --- 复习调度压测 ---
+# 随机生成 D 副牌 (每副 = 字库全部汉字)，分别测:
+#   - 逐个用户调用 next_targets (接口里的用法)
+#   - 把所有用户拼成 (D, 字数) 矩阵一次 batch_next_targets
+# 目标：单核每秒 1000 副牌以上。
+#
+# 用法: cd server && python bench_scheduler.py --decks 2000
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data", "characters.json")
+
+
+def main(args):
+    with open(DATA_FILE, encoding="utf-8") as f:
+        chars = [c["char"] for c in json.load(f)]
+    rng = np.random.default_rng(args.seed)
+    now = int(time.time() * 1000)
+    shape = (args.decks, len(chars))
+
+    level = rng.integers(0, 6, size=shape)
+    learned = rng.random(shape) > 0.3
+    last_time = np.where(learned, now - rng.integers(0, 30 * DAY, size=shape), 0)
+    correct = rng.integers(0, 20, size=shape)
+    wrong = rng.integers(0, 10, size=shape)
+
+    decks = [Deck(chars, level[i], last_time[i], correct[i], wrong[i]) for i in range(args.decks)]
+
+    start = time.perf_counter()
+    for deck in decks:
+        next_targets(deck, now, args.n)
+    per_deck = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_next_targets(level, last_time, correct, wrong, now, args.n)
+    batch = time.perf_counter() - start
+
+    print(f"{args.decks} decks x {len(chars)} chars, top {args.n}")
+    print(f"  next_targets (per deck): {per_deck:.3f}s  -> {args.decks / per_deck:,.0f} decks/s")
+    print(f"  batch_next_targets     : {batch:.3f}s  -> {args.decks / batch:,.0f} decks/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy review scheduler")
+    parser.add_argument("--decks", type=int, default=2000)
+    parser.add_argument("-n", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
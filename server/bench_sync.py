@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import httpx
+
+from bench_llm import percentile, start_api
+from stub_ollama import start_stub
+
+
+# --- 存档同步负载压测 ---
+# 起一个独立的 API 服务 (临时目录里的新库)，注册 N 个家庭账号，
+# 然后 C 个并发客户端不停 POST /sync/delta (每次改若干个字 + 答题流水)，
+# 同时 R 个客户端不停 GET /sync/download?since=0 模拟其他设备拉取。
+# 分别在两种配置下跑一遍:
+#   - before: SQLITE_TUNING=0 SYNC_GROUP_COMMIT=0 (默认 journal，每个请求单独提交)
+#   - after : WAL + pragma + 写合并
+# 输出每秒上传数和上传/下载的 p50/p99。
+# 压测前先做一次并发正确性检查：同一个账号同时上传 K 次 (改同一批字)，
+# 要求全部 200、拿到的 rev 正好是 1..K 各一次、最后下载到的 rev = K，否则直接失败。
+#
+# 用法: cd server && python bench_sync.py --users 50 --clients 32 --duration 10
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data", "characters.json")
+
+MODES = {
+    "before": {"SQLITE_TUNING": "0", "SYNC_GROUP_COMMIT": "0"},
+    "after": {"SQLITE_TUNING": "1", "SYNC_GROUP_COMMIT": "1"},
+}
+
+
+def make_delta(rng: random.Random, chars: list[str], size: int) -> dict:
+    now = int(time.time() * 1000)
+    picked = rng.sample(chars, size)
+    return {
+        "base_rev": 0,
+        "chars": {
+            c: {"status": "learning", "level": rng.randint(0, 5), "nextReviewTime": now + 60000,
+                "correct": rng.randint(0, 9), "wrong": rng.randint(0, 9), "streak": 0, "lastTime": now}
+            for c in picked
+        },
+        "events": [{"char": c, "correct": rng.random() < 0.7, "time": now} for c in picked],
+        "fields": {"progress": {"currentLevel": rng.randint(1, 50), "totalScore": rng.randint(0, 9999)}},
+    }
+
+
+async def check_concurrent(client: httpx.AsyncClient, headers: dict, rng: random.Random, chars: list[str], k: int):
+    """同一账号并发上传 k 次：不能有报错，rev 不能重复或丢失"""
+    shared = rng.sample(chars, 5) # 每次都带上这几个字，专门撞 char_records 的唯一约束
+    bodies = []
+    for _ in range(k):
+        delta = make_delta(rng, chars, 5)
+        delta["chars"].update(make_delta(random.Random(rng.random()), shared, 5)["chars"])
+        bodies.append(json.dumps(delta, ensure_ascii=False))
+    responses = await asyncio.gather(*[
+        client.post("/sync/delta", content=body, headers={**headers, "Content-Type": "application/json"})
+        for body in bodies
+    ])
+    failed = [r.status_code for r in responses if r.status_code != 200]
+    assert not failed, f"concurrent uploads failed: {failed}"
+    revs = sorted(r.json()["rev"] for r in responses)
+    assert revs == list(range(1, k + 1)), f"revs not strictly increasing: {revs}"
+    final = (await client.get("/sync/download", params={"since": 0}, headers=headers)).json()
+    assert final["rev"] == k, f"final rev {final['rev']} != {k}"
+    assert set(shared) <= set(final["chars"]), "shared chars missing after concurrent uploads"
+
+
+async def run_mode(name: str, args, ollama_url: str, chars: list[str]) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"hanzi_sync_{name}_")
+    proc, base = start_api(ollama_url, workdir, SCENARIO_PREFILL_MAX_LEVEL="0", **MODES[name])
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.clients + args.readers + 8)
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+            headers = []
+            for i in range(args.users):
+                r = await client.post("/register", json={"username": f"family{i}", "password": "bench"})
+                r.raise_for_status()
+                headers.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+
+            r = await client.post("/register", json={"username": "race", "password": "bench"})
+            r.raise_for_status()
+            await check_concurrent(client, {"Authorization": f"Bearer {r.json()['access_token']}"},
+                                   rng, chars, args.race)
+
+            uploads, downloads = [], []
+            errors = {"upload": 0, "download": 0}
+            deadline = time.perf_counter() + args.duration
+
+            async def uploader():
+                while time.perf_counter() < deadline:
+                    body = json.dumps(make_delta(rng, chars, args.chars_per_upload), ensure_ascii=False)
+                    start = time.perf_counter()
+                    try:
+                        r = await client.post("/sync/delta", content=body, headers={
+                            **rng.choice(headers), "Content-Type": "application/json"})
+                    except httpx.HTTPError:
+                        errors["upload"] += 1
+                        continue
+                    if r.status_code != 200:
+                        errors["upload"] += 1
+                        continue
+                    uploads.append((time.perf_counter() - start) * 1000)
+
+            async def reader():
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        r = await client.get("/sync/download", params={"since": 0}, headers=rng.choice(headers))
+                    except httpx.HTTPError:
+                        errors["download"] += 1
+                        continue
+                    if r.status_code != 200:
+                        errors["download"] += 1
+                        continue
+                    downloads.append((time.perf_counter() - start) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*[uploader() for _ in range(args.clients)], *[reader() for _ in range(args.readers)])
+            elapsed = time.perf_counter() - started
+            stats = (await client.get("/sync/stats")).json()
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "mode": name,
+        "uploads_per_sec": len(uploads) / elapsed,
+        "upload_p50": percentile(uploads, 50),
+        "upload_p99": percentile(uploads, 99),
+        "download_p99": percentile(downloads, 99),
+        "errors": errors,
+        "avg_batch": stats.get("avg_batch"),
+    }
+
+
+async def run(args):
+    with open(DATA_FILE, encoding="utf-8") as f:
+        chars = [c["char"] for c in json.load(f)]
+    stub, ollama_url = start_stub(latency=0.1)
+    try:
+        results = [await run_mode(name, args, ollama_url, chars) for name in args.modes]
+    finally:
+        stub.shutdown()
+
+    print(f"{args.users} families, {args.clients} uploaders, {args.readers} readers, "
+          f"{args.chars_per_upload} chars/upload, {args.duration}s per mode")
+    for r in results:
+        print(f"{r['mode']:>7}: {r['uploads_per_sec']:7.1f} uploads/s  "
+              f"upload p50={r['upload_p50']:7.1f}ms p99={r['upload_p99']:7.1f}ms  "
+              f"download p99={r['download_p99']:7.1f}ms  errors={r['errors']}  avg_batch={r['avg_batch']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test /sync/delta before and after SQLite tuning")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--chars-per-upload", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--race", type=int, default=32, help="并发正确性检查: 同一账号同时上传几次")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
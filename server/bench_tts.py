@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+
+from tts_cache import FakeTTSBackend, TTSCache
+
+
+# --- 剧情对话语音合成压测 ---
+# 用固定延迟的假 TTS 后端，对比逐句串行合成和 get_many 并发合成的耗时。
+# 并发版本的耗时应接近最慢的一句，而不是所有句子之和。
+#
+# 用法: cd server && python bench_tts.py --lines 3 --latency 0.8
+
+class JitterTTSBackend(FakeTTSBackend):
+    """每句延迟在 [latency/2, latency] 之间随机，更接近真实的 edge-tts"""
+
+    def __init__(self, latency: float, seed: int = 0):
+        super().__init__(latency=latency)
+        self._rng = random.Random(seed)
+        self.slowest = 0.0
+
+    async def synthesize(self, text: str, voice: str, rate: str) -> bytes:
+        delay = self._rng.uniform(self.latency / 2, self.latency)
+        self.slowest = max(self.slowest, delay)
+        await asyncio.sleep(delay)
+        return await FakeTTSBackend(latency=0).synthesize(text, voice, rate)
+
+
+async def run_serial(cache: TTSCache, texts: list[str]) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        await cache.get(text)
+    return time.perf_counter() - start
+
+
+async def run_parallel(cache: TTSCache, texts: list[str], concurrency: int) -> float:
+    start = time.perf_counter()
+    await cache.get_many(texts, concurrency=concurrency)
+    return time.perf_counter() - start
+
+
+async def main(args):
+    texts = [f"第{i}句：列车长说，前面有写着汉字的山洞！" for i in range(args.lines)]
+    for mode in ("serial", "parallel"):
+        times = []
+        slowest = []
+        for r in range(args.rounds):
+            workdir = tempfile.mkdtemp(prefix="hanzi_tts_")
+            backend = JitterTTSBackend(args.latency, seed=r)
+            cache = TTSCache(workdir, backend)
+            if mode == "serial":
+                times.append(await run_serial(cache, texts))
+            else:
+                times.append(await run_parallel(cache, texts, args.concurrency))
+            slowest.append(backend.slowest)
+            shutil.rmtree(workdir)
+        print(f"{mode:>8}: mean wall={sum(times) / len(times):.3f}s  "
+              f"(slowest line mean={sum(slowest) / len(slowest):.3f}s, lines={args.lines})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark serial vs parallel dialog TTS")
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,390 @@
+import mmap
+import os
+import struct
+import tempfile
+import unicodedata
+from typing import Optional
+
+import numpy as np
+
+
+# --- 二进制字典 (characters.json -> characters.bin) ---
+# characters.json 是 1MB 的格式化 JSON，2700 多个 dict；服务端每次都要整个 json.load，
+# 前端按字查详情还要先在 chars_index 里线性 find。
+# 这里编译成一个可以直接 mmap 的二进制文件:
+#   - 定长记录表 (id、码点、等级、笔画、字频、声调、拼音/组词的字符串编号)
+#   - 字符串池：拼音、组词、易混字都去重后只存一份 (utf-8 拼在一起 + 偏移表)
+#   - 索引：按字 (开放寻址哈希)、按 id (直接下标)、按等级、按拼音 (分组 + 偏移)
+# 打开文件只做 mmap + np.frombuffer，不复制、不解析；查询都是 O(1) 下标运算。
+# 源文件变了 (mtime 更新) 会自动重新编译。
+#
+# 版本：字典有一个整体版本号，每条记录记下自己最后一次变化时的版本 (rev)。
+# 重新编译时和旧的 characters.bin 逐条比较，只有内容变了的字才拿到新版本号，
+# 删掉的字留一条墓碑；客户端拿着旧版本号就能只取变化的部分 (changed_since)。
+#
+# 用法: cd server && python chardict.py   # 手动编译并打印统计
+
+MAGIC = b"HZDICT\x00\x01"
+VERSION = 2 # 文件格式版本 (不是字典内容的版本)
+LEVELS = ("easy", "medium", "hard") # confusingChars 的三档
+EMPTY = 0xFFFFFFFF
+
+RECORD = np.dtype([
+    ("id", "<u4"),        # h_123 -> 123
+    ("code", "<u4"),      # 汉字码点
+    ("frequency", "<u4"),
+    ("pinyin", "<u4"),    # 字符串池编号
+    ("plain", "<u4"),     # 不带声调的拼音 (ü 写成 v)，字符串池编号
+    ("example", "<u4"),
+    ("rev", "<u4"),       # 这条记录最后一次变化时的字典版本
+    ("level", "u1"),
+    ("tone", "u1"),       # 1-4，轻声 5
+    ("stroke", "u1"),
+    ("_pad", "u1"),
+])
+
+# 文件里的数组，顺序固定；头部存每个数组的 (偏移, 元素个数)
+SECTIONS = (
+    ("records", RECORD),
+    ("confusing", np.dtype("<u4")), # n x 3 x k 个字符串编号，空位 EMPTY
+    ("str_offsets", np.dtype("<u4")),
+    ("str_data", np.dtype("u1")),
+    ("char_hash", np.dtype("<i4")),  # 码点哈希 -> 行号，-1 表示空
+    ("id_index", np.dtype("<i4")),   # id -> 行号，-1 表示没有
+    ("level_order", np.dtype("<i4")),
+    ("level_offsets", np.dtype("<i4")),
+    ("pinyin_keys", np.dtype("<u4")),
+    ("pinyin_order", np.dtype("<i4")),
+    ("pinyin_offsets", np.dtype("<i4")),
+    ("plain_keys", np.dtype("<u4")),
+    ("plain_order", np.dtype("<i4")),
+    ("plain_offsets", np.dtype("<i4")),
+    ("deleted_ids", np.dtype("<u4")),  # 墓碑：被删掉的字的 id 和删除时的版本
+    ("deleted_revs", np.dtype("<u4")),
+)
+HEADER = struct.Struct("<8sIIII") # magic, 格式版本, 记录数, 每档易混字个数 k, 字典版本
+SECTION = struct.Struct("<QQ")
+HEADER_SIZE = HEADER.size + SECTION.size * len(SECTIONS)
+
+TONE_MARKS = {"̄": 1, "́": 2, "̌": 3, "̀": 4}
+
+
+def split_tone(pinyin: str) -> tuple[str, int]:
+    """拼音 -> (不带声调的拼音, 声调)，例如 "lǜ" -> ("lv", 4)，轻声返回 5"""
+    tone = 5
+    letters = []
+    for ch in unicodedata.normalize("NFD", pinyin):
+        if ch in TONE_MARKS:
+            tone = TONE_MARKS[ch]
+        else:
+            letters.append(ch)
+    plain = unicodedata.normalize("NFC", "".join(letters)).replace("ü", "v")
+    return plain.lower(), tone
+
+
+def _hash_slot(codes: np.ndarray, size: int) -> np.ndarray:
+    return (codes.astype(np.uint64) * np.uint64(2654435761)) & np.uint64(size - 1)
+
+
+def _group(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """按 key 分组：(去重后的 key, 行号按 key 排好, 每组的起止偏移)"""
+    order = np.argsort(keys, kind="stable").astype(np.int32)
+    unique, counts = np.unique(keys, return_counts=True)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    return unique.astype(np.uint32), order, offsets
+
+
+def _content(c: dict) -> tuple:
+    """用来判断一条记录有没有变的内容 (和 characters.json 的字段一致)"""
+    return (
+        c["char"], c["pinyin"], c.get("level", 1), c.get("stroke", 0), c.get("example", ""),
+        c.get("frequency", 0), tuple(tuple(c.get("confusingChars", {}).get(lv, [])) for lv in LEVELS),
+    )
+
+
+def _previous_revisions(path: str) -> tuple[int, dict[str, tuple], dict[str, int]]:
+    """读旧的 characters.bin：(字典版本, id -> (rev, 内容), 墓碑 id -> rev)；没有或读不了就从头开始"""
+    try:
+        old = CharDict(path)
+    except (OSError, ValueError):
+        return 0, {}, {}
+    try:
+        records = {}
+        for i in range(len(old)):
+            row = old.row(i)
+            records[row["id"]] = (old.rev(i), _content(row))
+        deleted = {f"h_{i}": r for i, r in zip(old.deleted_ids.tolist(), old.deleted_revs.tolist())}
+        return old.version, records, deleted
+    finally:
+        old.close()
+
+
+# --- 编译 ---
+def build(chars: list[dict], path: str) -> int:
+    """编译到 path，返回新的字典版本号"""
+    old_version, old_records, old_deleted = _previous_revisions(path)
+    new_version = old_version + 1
+    changed = False
+
+    strings: dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    n = len(chars)
+    k = max((len(c.get("confusingChars", {}).get(lv, [])) for c in chars for lv in LEVELS), default=0)
+    records = np.zeros(n, dtype=RECORD)
+    confusing = np.full((n, len(LEVELS), k), EMPTY, dtype=np.uint32)
+    for i, c in enumerate(chars):
+        if not c["id"].startswith("h_") or len(c["char"]) != 1:
+            raise ValueError(f"unexpected entry: {c['id']} {c['char']}")
+        plain, tone = split_tone(c["pinyin"])
+        old = old_records.get(c["id"])
+        if old is not None and old[1] == _content(c):
+            rev = old[0]
+        else:
+            rev = new_version
+            changed = True
+        records[i] = (
+            int(c["id"][2:]), ord(c["char"]), c.get("frequency", 0),
+            intern(c["pinyin"]), intern(plain), intern(c.get("example", "")), rev,
+            c.get("level", 1), tone, c.get("stroke", 0), 0,
+        )
+        for j, lv in enumerate(LEVELS):
+            for m, s in enumerate(c.get("confusingChars", {}).get(lv, [])):
+                confusing[i, j, m] = intern(s)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    str_offsets = np.concatenate([[0], np.cumsum([len(b) for b in encoded])]).astype(np.uint32)
+    str_data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    # 按字：开放寻址，装载率 <= 50%
+    size = 1 << max(1, (2 * n - 1).bit_length())
+    char_hash = np.full(size, -1, dtype=np.int32)
+    for i, slot in enumerate(_hash_slot(records["code"], size)):
+        slot = int(slot)
+        while char_hash[slot] != -1:
+            slot = (slot + 1) & (size - 1)
+        char_hash[slot] = i
+
+    id_index = np.full(int(records["id"].max(initial=0)) + 1, -1, dtype=np.int32)
+    id_index[records["id"]] = np.arange(n, dtype=np.int32)
+
+    # 按等级：行号按等级排序 (同级保持原顺序，即字频顺序)，level_offsets[lv] 是该级的起点
+    level_order = np.argsort(records["level"], kind="stable").astype(np.int32)
+    level_offsets = np.searchsorted(
+        records["level"][level_order], np.arange(int(records["level"].max(initial=0)) + 2)
+    ).astype(np.int32)
+
+    pinyin_keys, pinyin_order, pinyin_offsets = _group(records["pinyin"])
+    plain_keys, plain_order, plain_offsets = _group(records["plain"])
+
+    # 墓碑：这次消失的字记新版本，以前删掉且没有加回来的沿用旧版本
+    ids = {c["id"] for c in chars}
+    deleted = {i: r for i, r in old_deleted.items() if i not in ids}
+    for char_id in old_records.keys() - ids:
+        deleted[char_id] = new_version
+        changed = True
+    version = new_version if changed else old_version
+    deleted_ids = np.array([int(i[2:]) for i in deleted], dtype=np.uint32)
+    deleted_revs = np.array(list(deleted.values()), dtype=np.uint32)
+
+    arrays = {
+        "records": records, "confusing": confusing.ravel(), "str_offsets": str_offsets, "str_data": str_data,
+        "char_hash": char_hash, "id_index": id_index, "level_order": level_order, "level_offsets": level_offsets,
+        "pinyin_keys": pinyin_keys, "pinyin_order": pinyin_order, "pinyin_offsets": pinyin_offsets,
+        "plain_keys": plain_keys, "plain_order": plain_order, "plain_offsets": plain_offsets,
+        "deleted_ids": deleted_ids, "deleted_revs": deleted_revs,
+    }
+
+    # 每个数组 8 字节对齐，np.frombuffer 可以直接用
+    directory, chunks, offset = [], [], HEADER_SIZE
+    for name, dtype in SECTIONS:
+        data = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+        pad = -offset % 8
+        chunks.append(b"\x00" * pad + data)
+        offset += pad
+        directory.append(SECTION.pack(offset, len(arrays[name].ravel())))
+        offset += len(data)
+
+    # 先写临时文件再 os.replace，正在 mmap 旧文件的进程不受影响
+    directory_path = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory_path, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, n, k, version))
+            f.write(b"".join(directory))
+            f.write(b"".join(chunks))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return version
+
+
+# --- 读取 ---
+# 单条查询走 struct.unpack_from 直接读 mmap (比逐个取 numpy 标量快一个数量级)，
+# 按等级/拼音这种批量结果用 np.frombuffer 出来的数组切片。
+RECORD_STRUCT = struct.Struct("<7I4B") # 和 RECORD 的字段一一对应
+U32_PAIR = struct.Struct("<II")
+I32 = struct.Struct("<i")
+assert RECORD_STRUCT.size == RECORD.itemsize
+
+
+class CharDict:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.n, self.k, self.version = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path}: not a character dictionary (format {fmt})")
+        self._offsets = {}
+        for i, (name, dtype) in enumerate(SECTIONS):
+            offset, count = SECTION.unpack_from(self._mm, HEADER.size + i * SECTION.size)
+            self._offsets[name] = offset
+            setattr(self, name, np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset))
+        self.confusing = self.confusing.reshape(self.n, len(LEVELS), self.k)
+        self._confusing_struct = struct.Struct(f"<{len(LEVELS) * self.k}I")
+        self._hash_mask = len(self.char_hash) - 1
+        self._strings: list[Optional[str]] = [None] * (len(self.str_offsets) - 1)
+        self._pinyin_groups: Optional[dict[str, int]] = None
+        self._plain_groups: Optional[dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def string(self, i: int) -> str:
+        # 拼音/组词/易混字重复得很多，解码过的留一份 (最多几千个短字符串)
+        s = self._strings[i]
+        if s is None:
+            start, end = U32_PAIR.unpack_from(self._mm, self._offsets["str_offsets"] + 4 * i)
+            base = self._offsets["str_data"]
+            s = self._strings[i] = self._mm[base + start:base + end].decode("utf-8")
+        return s
+
+    def _record(self, i: int) -> tuple:
+        return RECORD_STRUCT.unpack_from(self._mm, self._offsets["records"] + i * RECORD_STRUCT.size)
+
+    def row(self, i: int) -> dict:
+        char_id, code, frequency, pinyin, _plain, example, _rev, level, tone, stroke, _ = self._record(i)
+        confusing = self._confusing_struct.unpack_from(
+            self._mm, self._offsets["confusing"] + i * self._confusing_struct.size
+        )
+        k = self.k
+        return {
+            "id": f"h_{char_id}",
+            "char": chr(code),
+            "pinyin": self.string(pinyin),
+            "level": level,
+            "stroke": stroke,
+            "example": self.string(example),
+            "frequency": frequency,
+            "tone": tone,
+            "confusingChars": {
+                lv: [self.string(s) for s in confusing[j * k:(j + 1) * k] if s != EMPTY]
+                for j, lv in enumerate(LEVELS)
+            },
+        }
+
+    def rev(self, i: int) -> int:
+        return self._record(i)[6]
+
+    # --- 查询 (返回行号，找不到返回 None / 空) ---
+    def find_char(self, char: str) -> Optional[int]:
+        if len(char) != 1:
+            return None
+        code = ord(char)
+        slot = (code * 2654435761) & self._hash_mask # 和 _hash_slot 一致
+        base = self._offsets["char_hash"]
+        while (i := I32.unpack_from(self._mm, base + 4 * slot)[0]) != -1:
+            if self._record(i)[1] == code:
+                return i
+            slot = (slot + 1) & self._hash_mask
+        return None
+
+    def find_id(self, char_id: str) -> Optional[int]:
+        if not char_id.startswith("h_") or not char_id[2:].isdigit():
+            return None
+        num = int(char_id[2:])
+        if num >= len(self.id_index):
+            return None
+        i = I32.unpack_from(self._mm, self._offsets["id_index"] + 4 * num)[0]
+        return None if i < 0 else i
+
+    def find_level(self, level: int) -> np.ndarray:
+        if not 0 <= level < len(self.level_offsets) - 1:
+            return self.level_order[:0]
+        return self.level_order[self.level_offsets[level]:self.level_offsets[level + 1]]
+
+    def find_pinyin(self, pinyin: str) -> np.ndarray:
+        """带声调 (zhōng) 精确匹配，不带声调 (zhong / lv) 匹配所有声调"""
+        if self._pinyin_groups is None:
+            # 只在第一次按拼音查时解码这一千来个拼音
+            self._pinyin_groups = {self.string(s): g for g, s in enumerate(self.pinyin_keys)}
+            self._plain_groups = {self.string(s): g for g, s in enumerate(self.plain_keys)}
+        pinyin = unicodedata.normalize("NFC", pinyin.strip())
+        if (g := self._pinyin_groups.get(pinyin)) is not None:
+            return self.pinyin_order[self.pinyin_offsets[g]:self.pinyin_offsets[g + 1]]
+        if (g := self._plain_groups.get(split_tone(pinyin)[0])) is not None:
+            return self.plain_order[self.plain_offsets[g]:self.plain_offsets[g + 1]]
+        return self.pinyin_order[:0]
+
+    def changed_since(self, since: int) -> tuple[np.ndarray, list[str]]:
+        """版本 since 之后变过的行号，以及之后被删掉的 id"""
+        rows = np.flatnonzero(self.records["rev"] > since)
+        deleted = [f"h_{i}" for i in self.deleted_ids[self.deleted_revs > since].tolist()]
+        return rows, deleted
+
+    # --- 查询 (返回和 characters.json 同样结构的 dict) ---
+    def get(self, key: str) -> Optional[dict]:
+        """key 可以是字 ("的") 或 id ("h_1")，和前端 getCharDetail 一样"""
+        i = self.find_id(key) if key.startswith("h_") else self.find_char(key)
+        return None if i is None else self.row(i)
+
+    def by_level(self, level: int, offset: int = 0, limit: Optional[int] = None) -> list[dict]:
+        rows = self.find_level(level)[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        return [self.row(i) for i in rows.tolist()]
+
+    def by_pinyin(self, pinyin: str) -> list[dict]:
+        return [self.row(i) for i in self.find_pinyin(pinyin).tolist()]
+
+    def close(self):
+        for name, _ in SECTIONS:
+            setattr(self, name, None) # 先释放 np.frombuffer 的引用，mmap 才能关
+        self.confusing = None
+        self._mm.close()
+
+
+def load(path: str, source: str) -> CharDict:
+    """打开二进制字典；不存在或比 source (characters.json) 旧就先重新编译"""
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        try:
+            return CharDict(path)
+        except ValueError:
+            pass # 旧的文件格式，重新编译
+    import json
+
+    with open(source, encoding="utf-8") as f:
+        build(json.load(f), path)
+    return CharDict(path)
+
+
+if __name__ == "__main__":
+    import json
+    import time
+
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data", "characters.json")
+    with open(source, encoding="utf-8") as f:
+        chars = json.load(f)
+    start = time.perf_counter()
+    version = build(chars, "characters.bin")
+    print(f"built characters.bin v{version}: {len(chars)} chars, {os.path.getsize('characters.bin') / 1024:.1f} KB "
+          f"(json {os.path.getsize(source) / 1024:.1f} KB) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    d = CharDict("characters.bin")
+    assert all(d.get(c["id"]) == {**c, "tone": d.get(c["id"])["tone"]} for c in chars), "round trip mismatch"
+    print("round trip ok")
@@ -0,0 +1,122 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from sqlalchemy.orm import Session, sessionmaker
+
+
+# --- 写合并 (group commit) ---
+# SQLite 同一时刻只能有一个写事务，很多家庭同时 /sync/upload 时，每个请求各自
+# BEGIN ... COMMIT，一个个抢写锁，每次提交还要单独落盘。
+# 这里改成一个专门的写线程：把排队中的写操作攒成一批，放进同一个事务里执行，
+# 每个写操作包一层 SAVEPOINT (一个失败不影响同批其他的)，最后只提交一次。
+# 路由调用 submit() / await submit_async() 等待自己那一份的结果。
+
+class GroupCommitter:
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        max_batch: int = 64,        # 一批最多合并多少个写操作
+        max_wait: float = 0.002,    # 拿到第一个写操作后，最多再等多久凑批 (秒)
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self.stats = {"writes": 0, "batches": 0, "failed": 0, "max_batch_seen": 0, "commit_time": 0.0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, fn: Callable[[Session], object], timeout: float = 30.0):
+        """在写线程的会话里执行 fn(db)，返回它的结果 (异常原样抛出)"""
+        if self._thread is None:
+            # 没有启动写线程时 (脚本/测试)，直接单独提交
+            with self.session_factory() as db:
+                result = fn(db)
+                db.commit()
+                return result
+        future = Future()
+        self._queue.put((fn, future))
+        return future.result(timeout=timeout)
+
+    async def submit_async(self, fn: Callable[[Session], object], timeout: float = 30.0):
+        """submit() 的异步版本：在事件循环里等结果，不占用线程池"""
+        if self._thread is None:
+            return await asyncio.to_thread(self.submit, fn, timeout)
+        future = Future()
+        self._queue.put((fn, future))
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def _next_batch(self, first) -> list:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None) # 处理完这批再退出
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._commit(self._next_batch(first))
+
+    def _commit(self, batch: list):
+        results = []
+        with self.session_factory() as db:
+            for fn, future in batch:
+                savepoint = db.begin_nested()
+                try:
+                    results.append((future, fn(db), None))
+                    savepoint.commit()
+                except Exception as e:
+                    savepoint.rollback()
+                    results.append((future, None, e))
+
+            start = time.perf_counter()
+            try:
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                results = [(future, None, e) for future, _, _ in results]
+            self.stats["commit_time"] += time.perf_counter() - start
+
+        self.stats["writes"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+        for future, result, error in results:
+            if error is not None:
+                self.stats["failed"] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def snapshot(self) -> dict:
+        batches = self.stats["batches"] or 1
+        return {
+            **self.stats,
+            "avg_batch": round(self.stats["writes"] / batches, 2),
+            "pending": self._queue.qsize(),
+        }
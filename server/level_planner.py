@@ -0,0 +1,185 @@
+import hashlib
+import json
+import math
+import random
+from typing import Callable, Iterable, Optional
+
+
+# --- 关卡预排 ---
+# 以前前端 initLevel 每次开局现场随机挑字 (优先字 / 同级随机)，再一个个去取字详情，
+# 选项是从全部字里随便抽的，和易混字表没关系。
+# 这里启动时把每一关、每种选项数 (optionCount) 的题目都排好，序列化成 JSON 放在内存里：
+#   - 目标字: levels.json 里有的关卡照抄；自动关卡按前端原来的规则 (每关 3/4/5 个字，第 n 关取
+#     min(ceil(n/20), 5) 级的字)，同一级的字按字频顺序轮流取，相邻的关卡不重复
+#   - 干扰项: 从 confusion_map.json 里取 (同音 / 形近 / 手动配置)，同一关内不重复、不和目标字重复；
+#     字库里没有的易混字 (拿不到拼音和音频) 不用；候选少的目标先挑，不够时用同级字频最接近的字补
+#   - 每道题的选项顺序按 (关卡, 选项数, 目标字) 固定打乱，同一关每次打开都一样，响应可以按 ETag 缓存
+# 响应里带上所有用到的字的详情，前端一个请求就能开局。
+# 超过预排范围的关卡和带优先字 / 排除字 (已经学会或家长跳过的字) 的请求现场排 (不进缓存)，只是查表，很快。
+
+OPTION_COUNTS = (3, 4, 5, 6) # 前端最多 6 个选项
+MAX_PRIORITY = 5
+
+
+def auto_char_count(level: int) -> int:
+    return 3 if level <= 20 else (4 if level <= 50 else 5)
+
+
+def auto_difficulty(level: int) -> dict:
+    return {"optionCount": auto_char_count(level), "timeLimit": 15 if level > 20 else 0}
+
+
+def char_level_of(level: int) -> int:
+    return min(math.ceil(level / 20), 5)
+
+
+def auto_chars_before(level: int) -> int:
+    """第 1 .. level-1 关按自动规则一共有多少个目标字 (auto_char_count 的前缀和)"""
+    n = level - 1
+    return 3 * min(n, 20) + 4 * max(0, min(n, 50) - 20) + 5 * max(0, n - 50)
+
+
+def auto_offset(level: int) -> int:
+    """自动关卡在本级字池里的起点：同一级 (每 20 关，第 5 级到头) 的关卡首尾相接往后取"""
+    first = (char_level_of(level) - 1) * 20 + 1
+    return auto_chars_before(level) - auto_chars_before(first)
+
+
+class LevelPlanner:
+    def __init__(
+        self,
+        levels: list,            # levels.json
+        chars_index: list,       # chars_index.json (字频顺序)
+        confusion: dict,         # confusion_map.json {字: [易混字, ...]}
+        lookup: Callable[[str], Optional[dict]], # 字 -> 详情 (char_dict.get)
+        max_level: int = 200,    # 启动时预排到第几关
+    ):
+        self.levels = {int(lv["levelId"]): lv for lv in levels}
+        self.confusion = confusion
+        self.lookup = lookup
+        self.max_level = max_level
+
+        self.pools: dict[int, list] = {} # 字级 -> [字, ...]
+        self.position: dict[str, tuple] = {} # 字 -> (字级, 在 pool 里的下标)
+        for c in chars_index:
+            pool = self.pools.setdefault(c["level"], [])
+            self.position[c["char"]] = (c["level"], len(pool))
+            pool.append(c["char"])
+
+        self._payloads: dict[tuple, tuple] = {} # (关卡, 选项数) -> (JSON bytes, ETag)
+        self.stats = {"precomputed": 0, "bytes": 0, "hits": 0, "planned_live": 0}
+        for level in range(1, max_level + 1):
+            for n in OPTION_COUNTS:
+                body = self._encode(self._plan(level, n))
+                self._payloads[(level, n)] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+                self.stats["bytes"] += len(body)
+        self.stats["precomputed"] = len(self._payloads)
+
+    # --- 对外接口 ---
+    def get(
+        self,
+        level: int,
+        option_count: Optional[int] = None,
+        priority: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+    ) -> tuple:
+        """-> (JSON bytes, ETag)；option_count 为空时用关卡自己的难度。
+        priority / exclude 只对自动关卡生效：优先出的字 / 不要当目标的字"""
+        n = option_count or self.difficulty(level)["optionCount"]
+        n = min(max(n, OPTION_COUNTS[0]), OPTION_COUNTS[-1])
+        priority = [c for c in dict.fromkeys(priority) if c in self.position][:MAX_PRIORITY]
+        exclude = {c for c in exclude if c in self.position}
+        cached = self._payloads.get((level, n))
+        if cached and not ((priority or exclude) and level not in self.levels):
+            self.stats["hits"] += 1
+            return cached
+        self.stats["planned_live"] += 1
+        body = self._encode(self._plan(level, n, priority, exclude))
+        return body, f'"{hashlib.md5(body).hexdigest()}"'
+
+    def difficulty(self, level: int) -> dict:
+        if level in self.levels:
+            return {"timeLimit": 0, **self.levels[level].get("difficulty", {})}
+        return auto_difficulty(level)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+    # --- 目标字 ---
+    def targets(self, level: int, priority: list = (), exclude: set = frozenset()) -> list:
+        if level in self.levels:
+            return list(dict.fromkeys(self.levels[level].get("targetChars", [])))
+        count = auto_char_count(level)
+        pool = self.pools.get(char_level_of(level)) or [c for p in self.pools.values() for c in p]
+        if not pool:
+            return list(priority)[:count]
+        offset = auto_offset(level)
+        result = list(priority)[:count]
+        # 先跳过排除的字；整级都排除了 (全学会了) 就不管排除，和前端本地排的兜底一样
+        for skip in (exclude, ()):
+            for k in range(len(pool)):
+                if len(result) >= count:
+                    return result
+                c = pool[(offset + k) % len(pool)]
+                if c not in result and c not in skip:
+                    result.append(c)
+        return result
+
+    # --- 干扰项 ---
+    def _neighbors(self, char: str):
+        """同级字池里字频最接近的字，由近到远"""
+        if char not in self.position:
+            return
+        lv, i = self.position[char]
+        pool = self.pools[lv]
+        for d in range(1, len(pool)):
+            for j in (i - d, i + d):
+                if 0 <= j < len(pool):
+                    yield pool[j]
+
+    def distractors(self, targets: list, per_target: int) -> dict:
+        """{目标字: [干扰项, ...]}；同一关内干扰项不重复，也不和目标字重复"""
+        used = set(targets)
+        result = {}
+        # 易混字少的目标先挑，免得被别的目标抢光
+        confusion = {t: [c for c in self.confusion.get(t, []) if c in self.position] for t in targets}
+        for t in sorted(targets, key=lambda t: (len(confusion[t]), targets.index(t))):
+            picked = []
+            for source in (confusion[t], self._neighbors(t)):
+                for c in source:
+                    if len(picked) == per_target:
+                        break
+                    if c not in used:
+                        picked.append(c)
+                        used.add(c)
+            result[t] = picked
+        return result
+
+    # --- 组装 ---
+    def _plan(self, level: int, option_count: int, priority: list = (), exclude: set = frozenset()) -> dict:
+        config = self.levels.get(level, {})
+        targets = [t for t in self.targets(level, priority, exclude) if self.lookup(t)] # levels.json 里可能有字库外的字
+        picks = self.distractors(targets, option_count - 1)
+        details = {}
+        questions = []
+        for t in targets:
+            options = [d for d in map(self.lookup, [t, *picks[t]]) if d]
+            random.Random(f"{level}:{option_count}:{t}").shuffle(options)
+            for d in options:
+                details[d["id"]] = d
+            questions.append({"target": self.lookup(t)["id"], "options": [d["id"] for d in options]})
+        return {
+            "levelId": level,
+            "chapter": config.get("chapter", min(math.ceil(level / 20), 3)),
+            "name": config.get("name", f"第 {level} 关"),
+            "description": config.get("description", ""),
+            "difficulty": {**self.difficulty(level), "optionCount": option_count},
+            "auto": level not in self.levels,
+            "bundle": f"level_{level}" if level in self.levels else None, # 整关音频包 (bundle_audio.py)
+            "questions": questions,
+            "chars": details,
+        }
+
+    @staticmethod
+    def _encode(plan: dict) -> bytes:
+        return json.dumps(plan, ensure_ascii=False, separators=(",", ":")).encode()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from metrics import observe_stage
+
+
+# --- Ollama 异步客户端 ---
+# 之前在 async 路由里直接用 requests.post，会把整个 uvicorn 事件循环卡住 5~30 秒，
+# 这期间其他孩子的 /token、/sync/upload 全部排队。
+# 这里改成共享的 httpx.AsyncClient (连接池复用)，并用信号量限制同时打到 Ollama 的请求数，
+# 超出的请求在内存里排队，队列满了直接拒绝，让路由走兜底逻辑。
+
+class LLMBusyError(Exception):
+    """排队的请求太多 (或排队超时)，直接放弃这次调用"""
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        api_url: str,
+        model: str,
+        max_concurrency: int = 2,   # 同时在跑的生成数 (本地显卡一般只扛得住 1~2 个)
+        max_queue: int = 16,        # 最多允许多少个请求排队等待
+        queue_timeout: float = 10.0,  # 排队最长等待时间 (秒)
+        timeout: float = 30.0,      # 单次生成的读超时 (秒)
+        connect_timeout: float = 5.0,
+        pool_size: int = 10,
+    ):
+        self.api_url = api_url
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._running = 0
+
+        # 简单计数，方便排查
+        self.stats = {"calls": 0, "errors": 0, "rejected": 0, "total_time": 0.0}
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("OllamaClient not started")
+        return self._client
+
+    async def _acquire(self):
+        # 队列满了直接拒绝，不要让请求无限堆积
+        if self._waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise LLMBusyError(f"LLM queue full ({self._waiting} waiting)")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise LLMBusyError(f"LLM queue wait exceeded {self.queue_timeout}s")
+        finally:
+            self._waiting -= 1
+        self._running += 1
+
+    def _release(self):
+        self._running -= 1
+        self._sem.release()
+
+    def _payload(self, prompt: str, format: Optional[str], stream: bool) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+        }
+        if format:
+            payload["format"] = format
+        return payload
+
+    async def generate(self, prompt: str, format: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """一次性生成，返回 Ollama 的 response 文本"""
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            self.stats["calls"] += 1
+            response = await self.client.post(
+                self.api_url,
+                json=self._payload(prompt, format, stream=False),
+                timeout=httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout),
+            )
+            response.raise_for_status()
+            return response.json().get("response", "").strip()
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats["total_time"] += elapsed
+            observe_stage("llm", elapsed)
+            self._release()
+
+    async def stream(self, prompt: str, format: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """流式生成，逐块 yield Ollama 返回的文本片段。整个流期间占用一个并发名额。"""
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            self.stats["calls"] += 1
+            async with self.client.stream(
+                "POST",
+                self.api_url,
+                json=self._payload(prompt, format, stream=True),
+                timeout=httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout),
+            ) as response:
+                response.raise_for_status()
+                # Ollama 流式返回是一行一个 JSON: {"response": "...", "done": false}
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats["total_time"] += elapsed
+            observe_stage("llm", elapsed)
+            self._release()
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
@@ -1,31 +1,58 @@
+from contextlib import aclosing, asynccontextmanager
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Path, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 
 import hashlib
 import json
+import math
 import os
-import edge_tts
+import re
 import asyncio
 from pypinyin import pinyin, Style
 
+from llm import OllamaClient, LLMBusyError
+from metrics import MetricsMiddleware, gauges, registry, stage
+from passwords import PasswordBusyError, PasswordHasher
+from tts_cache import TTSCache, make_backend
+from scenario_pool import ScenarioPool
+from level_planner import LevelPlanner
+from database import IS_SQLITE, AsyncSessionLocal, WriteSessionLocal, get_async_db, migrate
+from group_commit import GroupCommitter
+from models import User
+from user_cache import CurrentUser, UserCache
+import chardict
+import review
+import sync
+
 
 # 音频存储目录 (需要前端能访问)
 # 假设前端 public/audio/story_gen 是静态目录
 # 这里我们需要把文件存在前端的 public 目录下，或者由后端提供静态文件服务
 # 为了简单，我们让后端提供静态服务 /static/audio
 AUDIO_OUTPUT_DIR = "static/audio"
+SCENARIO_AUDIO_DIR = os.path.join(AUDIO_OUTPUT_DIR, "scenario")
+# 假设后端运行在 localhost:8000
+AUDIO_BASE_URL = "http://localhost:8000/static/audio"
 if not os.path.exists(AUDIO_OUTPUT_DIR):
     os.makedirs(AUDIO_OUTPUT_DIR)
 
+# 前端的字库数据 (src/data)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "data")
+CHARDICT_PATH = os.getenv("CHARDICT_PATH", "characters.bin") # characters.json 编译出的二进制字典 (见 chardict.py)
+DICT_BULK_MAX = int(os.getenv("DICT_BULK_MAX", "500")) # /dict/chars 一次最多查几个字
+AUDIO_BUNDLE_DIR = os.getenv("AUDIO_BUNDLE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "public", "audio", "bundles")) # scripts/bundle_audio.py 的输出
+
 # 挂载静态目录
 from fastapi.staticfiles import StaticFiles
 
@@ -35,23 +62,54 @@ SECRET_KEY = "SECRET_KEY_PLEASE_CHANGE_THIS_IN_PROD" # 密钥
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60 # 30天过期
 
-# --- 数据库 (SQLite) ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# --- Models (数据库表) ---
-class User(Base):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    # 存档数据 (直接存 JSON 字符串)
-    save_data = Column(Text, nullable=True)
-    updated_at = Column(String, nullable=True) # 上次同步时间
-
-Base.metadata.create_all(bind=engine)
+# 配置 Ollama
+OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://192.168.220.1:11434/api/generate")
+# 请根据你本地部署的模型名修改，例如 "qwen:7b", "qwen2.5:1.5b" 等
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen:latest")
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")) # 同时生成数
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "16")) # 排队上限
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "30")) # 单次生成超时 (秒)
+
+# 配置 TTS
+# TTS_BACKEND=fake 时使用离线假合成 (测试/压测用)，默认 edge-tts
+TTS_BACKEND = os.getenv("TTS_BACKEND", "edge")
+TTS_FAKE_LATENCY = float(os.getenv("TTS_FAKE_LATENCY", "0")) # 假合成的固定延迟 (秒)
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "512")) # 每个音频目录的容量上限
+SCENARIO_TTS_CONCURRENCY = int(os.getenv("SCENARIO_TTS_CONCURRENCY", "4")) # 剧情对话同时合成的句数
+SCENARIO_TTS_DEADLINE = float(os.getenv("SCENARIO_TTS_DEADLINE", "8")) # 剧情对话合成总时限 (秒)
+CHAR_TTS_CONCURRENCY = int(os.getenv("CHAR_TTS_CONCURRENCY", "6")) # 自定义汉字同时合成的音频数 (所有请求共享)
+CHAR_BATCH_MAX = int(os.getenv("CHAR_BATCH_MAX", "200")) # /char/create/batch 一次最多几个字
+
+# 配置剧情预生成池
+SCENARIO_POOL_DEPTH = int(os.getenv("SCENARIO_POOL_DEPTH", "2")) # 每个 (关卡, 字) 备几份
+SCENARIO_POOL_MISS_WAIT = float(os.getenv("SCENARIO_POOL_MISS_WAIT", "3")) # 未命中最多等几秒
+SCENARIO_PREFILL_MAX_LEVEL = int(os.getenv("SCENARIO_PREFILL_MAX_LEVEL", "50")) # 启动时预生成到第几关 (0 关闭)
+SCENARIO_POOL_MAX_QUEUE = int(os.getenv("SCENARIO_POOL_MAX_QUEUE", "64")) # 最多排队几个生成任务，满了丢优先级低的
+
+# 配置关卡预排 (level_planner.py)
+LEVEL_PLAN_MAX = int(os.getenv("LEVEL_PLAN_MAX", "200")) # 启动时预排到第几关，之后的关卡现场排
+LEVEL_ID_MAX = int(os.getenv("LEVEL_ID_MAX", "10000")) # /level/{n} 接受的最大关卡号，超出返回 422
+
+# 配置同步写入 (数据库地址 DATABASE_URL、SQLite 的 WAL / pragma / 连接池见 database.py)
+# 合并并发的存档写入 (0 = 每个请求单独提交)；只对 SQLite 有意义，其他数据库总是单独提交
+SYNC_GROUP_COMMIT = IS_SQLITE and os.getenv("SYNC_GROUP_COMMIT", "1") != "0"
+SYNC_BATCH_MAX = int(os.getenv("SYNC_BATCH_MAX", "64")) # 一次提交最多合并几个写入
+SYNC_BATCH_WAIT_MS = float(os.getenv("SYNC_BATCH_WAIT_MS", "2")) # 凑批最多等待 (毫秒)
+
+# 配置登录用户缓存
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60")) # token -> 用户信息缓存多久 (秒，0 关闭)
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000")) # 最多缓存多少个 token
+
+# 配置指标 (GET /metrics 总是打开；trace 日志默认关闭)
+TRACE_LOG = os.getenv("TRACE_LOG", "") # 逐请求 trace 日志文件 (JSON Lines)，空 = 关闭
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "0")) # 只记录比这个慢的请求 (毫秒)
+
+# 配置密码哈希 (bcrypt)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12")) # bcrypt cost，改了之后老用户下次登录时自动换新哈希
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2")) # 算哈希的进程数 (0 = 线程池)
+PASSWORD_MAX_QUEUE = int(os.getenv("PASSWORD_MAX_QUEUE", "64")) # 排队上限，超过返回 503
+
+# --- 数据库 (见 database.py / models.py，表结构由 migrations/ 在启动时升级) ---
 
 # --- Schemas (Pydantic 数据验证) ---
 class UserCreate(BaseModel):
@@ -66,16 +124,9 @@ class SaveData(BaseModel):
     data: str # JSON string
 
 # --- 工具函数 ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+passwords = PasswordHasher(rounds=BCRYPT_ROUNDS, workers=PASSWORD_WORKERS, max_queue=PASSWORD_MAX_QUEUE)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -84,7 +135,14 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 # --- 核心鉴权逻辑 ---
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+user_cache = UserCache(ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    # 命中缓存时既不解 JWT 也不查库
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -98,13 +156,61 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    # 只取轻量的几列，不加载 save_data
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(User.id, User.username, User.updated_at).where(User.username == username)
+        )).first()
+    if row is None:
         raise credentials_exception
+    user = CurrentUser(id=row.id, username=row.username, updated_at=row.updated_at)
+    user_cache.put(token, user, payload.get("exp"))
     return user
 
+# --- TTS 缓存 (按目录各一个，共享合成后端) ---
+tts_backend = make_backend(TTS_BACKEND, latency=TTS_FAKE_LATENCY)
+tts_audio = TTSCache(AUDIO_OUTPUT_DIR, tts_backend, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024)
+tts_scenario = TTSCache(SCENARIO_AUDIO_DIR, tts_backend, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024)
+char_tts_limit = asyncio.Semaphore(CHAR_TTS_CONCURRENCY) # 批量加字时全局限流，不把 TTS 服务打爆
+
+# --- LLM 客户端 (全局共享连接池) ---
+llm = OllamaClient(
+    OLLAMA_API_URL,
+    OLLAMA_MODEL,
+    max_concurrency=OLLAMA_MAX_CONCURRENCY,
+    max_queue=OLLAMA_MAX_QUEUE,
+    timeout=OLLAMA_TIMEOUT,
+)
+
+# --- 存档写入合并 ---
+sync_writer = GroupCommitter(WriteSessionLocal, max_batch=SYNC_BATCH_MAX, max_wait=SYNC_BATCH_WAIT_MS / 1000)
+
+async def save_write(db: AsyncSession, fn):
+    """存档写入 fn(同步 Session)：SQLite 交给合并写线程，其他情况直接在当前异步会话里提交"""
+    if SYNC_GROUP_COMMIT:
+        return await sync_writer.submit_async(fn)
+    await db.commit() # 先结束请求里读数据开的事务：SQLite 上拿着读锁再升级写锁，并发时会直接报 database is locked
+    result = await db.run_sync(fn)
+    await db.commit()
+    return result
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await migrate()
+    passwords.start()
+    await llm.start()
+    if SYNC_GROUP_COMMIT:
+        sync_writer.start()
+    scenario_pool.start()
+    scenario_pool.prefill(scenario_prefill_targets())
+    yield
+    await scenario_pool.stop()
+    await llm.close()
+    sync_writer.stop()
+    passwords.stop()
+
 # --- App 初始化 ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 允许前端跨域
 app.add_middleware(
@@ -114,36 +220,62 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 大响应 (存档下载等) 自动 gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+# 每个路由的耗时 / 分阶段计时 (metrics.py)，放在最外层，算上 gzip
+app.add_middleware(MetricsMiddleware, trace_log=TRACE_LOG, trace_slow_ms=TRACE_SLOW_MS)
 # 挂载静态目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 # --- 路由 ---
 
+# bcrypt 在独立的进程池里算 (passwords.py)，排队满了返回 503
+def password_busy(e: PasswordBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Too many logins, please retry ({e})", headers={"Retry-After": "2"})
+
+async def hash_password(password: str) -> str:
+    try:
+        return await passwords.hash(password)
+    except PasswordBusyError as e:
+        raise password_busy(e)
+
+async def verify_password(password: str, hashed: str):
+    try:
+        return await passwords.verify_and_update(password, hashed)
+    except PasswordBusyError as e:
+        raise password_busy(e)
+
 @app.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User.id).where(User.username == user.username))).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password(user.password)
     new_user = User(username=user.username, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     access_token = create_access_token(data={"sub": new_user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not pwd_context.verify(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.username == form_data.username))).scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    ok, new_hash = await verify_password(form_data.password, user.hashed_password)
+    if not ok:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    if new_hash:
+        # bcrypt cost 改过：换成新 cost 的哈希
+        user.hashed_password = new_hash
+        await db.commit()
     
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/me")
-def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     return {
         "username": current_user.username, 
         "last_sync": current_user.updated_at
@@ -153,44 +285,87 @@ class SaveDataSchema(BaseModel):
     data: str # JSON 字符串
 
 @app.post("/sync/upload")
-def upload_save(save: SaveDataSchema, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # 更新用户的存档数据
-    current_user.save_data = save.data
-    current_user.updated_at = datetime.utcnow().isoformat()
-    db.commit()
-    return {"status": "success", "updated_at": current_user.updated_at}
+async def upload_save(save: SaveDataSchema, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    try:
+        delta = sync.snapshot_delta(json.loads(save.data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid save data: {e}")
+
+    def write(db: Session):
+        user = db.get(User, current_user.id)
+        # 更新用户的存档数据 (老接口：整包上传)
+        user.save_data = save.data
+        # 同时拆进增量同步的表，保证两套接口看到的数据一致
+        return sync.import_snapshot(db, user, delta, commit=False)
+
+    result = await save_write(db, write)
+    user_cache.invalidate(current_user.id) # last_sync 变了
+    return {"status": "success", "updated_at": result["updated_at"], "rev": result["rev"]}
+
+@app.post("/sync/delta")
+async def upload_delta(delta: sync.SyncDelta = Depends(sync.read_delta), current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # 增量上传：只传变过的字、新的答题流水、变过的小块状态 (支持 gzip 请求体)
+    # SQLite 下写入交给 sync_writer，和其他并发上传合并成一次提交
+    result = await save_write(db, lambda s: sync.apply_delta(s, s.get(User, current_user.id), delta, commit=False))
+    user_cache.invalidate(current_user.id) # last_sync 变了
+    return result
 
 @app.get("/sync/download")
-def download_save(current_user: User = Depends(get_current_user)):
-    if not current_user.save_data:
+async def download_save(since: Optional[int] = None, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    state = await sync.find_state(db, current_user.id)
+    # 只有还没走过增量同步的老用户才需要读整包存档
+    save_data = await sync.load_save_data(db, current_user.id) if state is None else None
+
+    # 带 since: 返回该 rev 之后的增量
+    if since is not None:
+        if save_data:
+            # 老用户第一次走增量同步：先把旧的整包存档拆进新表
+            delta = sync.snapshot_delta(json.loads(save_data), drop_invalid=True)
+            await save_write(db, lambda s: sync.import_snapshot(s, s.get(User, current_user.id), delta, commit=False))
+            user_cache.invalidate(current_user.id)
+        return await sync.changes_since(db, current_user.id, since)
+
+    # 不带 since: 老接口，返回整包存档
+    if state is not None and state.rev > 0:
+        data = json.dumps(await sync.snapshot(db, current_user.id), ensure_ascii=False)
+        updated_at = state.updated_at
+    elif save_data:
+        data = save_data
+        updated_at = current_user.updated_at
+    else:
         raise HTTPException(status_code=404, detail="No save data found")
     return {
-        "data": current_user.save_data,
-        "updated_at": current_user.updated_at
+        "data": data,
+        "updated_at": updated_at
     }
 
-class StoryRequest(BaseModel):
-    known_chars: list[str] # ["人", "口", "手"...]
+@app.get("/review/due")
+async def review_due(limit: int = Query(20, ge=1, le=200), current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # 到期待复习的字 (按到期时间排序)，数据来自增量同步上传的字记录
+    now = review.now_ms()
+    return {"now": now, "chars": await review.due_queue(db, current_user.id, now, limit)}
 
+@app.get("/review/next")
+async def review_next(n: int = Query(10, ge=1, le=200), current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # 服务端统一排期：按等级重新计算下次复习时间，并按逾期程度和错误率排序
+    now = review.now_ms()
+    return {"now": now, "targets": await review.scheduled_queue(db, current_user.id, now, n)}
 
+class StoryRequest(BaseModel):
+    known_chars: list[str] # ["人", "口", "手"...]
 
-# 配置 Ollama
-OLLAMA_API_URL = "http://192.168.220.1:11434/api/generate"
-# 请根据你本地部署的模型名修改，例如 "qwen:7b", "qwen2.5:1.5b" 等
-OLLAMA_MODEL = "qwen:latest" 
-import requests
 
-@app.post("/story/generate")
-async def generate_story(req: StoryRequest, current_user: User = Depends(get_current_user)):
-    chars = req.known_chars
-    if len(chars) < 5:
+def story_chars(known_chars: list[str]) -> list[str]:
+    if len(known_chars) < 5:
         # 为了演示，如果字太少，我们强制补几个字，或者直接返回
         # return {"title": "字太少啦", "content": "请先去闯关多学几个字吧！"}
-        chars = ["人", "口", "手", "天", "地", "大", "小"] # 兜底词库
+        return ["人", "口", "手", "天", "地", "大", "小"] # 兜底词库
+    return known_chars
 
+def story_prompt(chars: list[str]) -> str:
     # 构造 Prompt
     # 这里的 Prompt Engineering 很关键
-    prompt = f"""
+    return f"""
     你是一位儿童文学作家。请仅使用以下汉字列表中的字，编写一个有趣的、逻辑通顺的超短故事（50字以内）。
     允许使用的汉字：{', '.join(chars)}。
     
@@ -201,19 +376,14 @@ async def generate_story(req: StoryRequest, current_user: User = Depends(get_cur
     4. 直接输出故事内容，不要标题，不要解释，不要说"好的"。
     """
 
+@app.post("/story/generate")
+async def generate_story(req: StoryRequest, current_user: CurrentUser = Depends(get_current_user)):
+    chars = story_chars(req.known_chars)
+    prompt = story_prompt(chars)
+
     try:
-        # 调用 Ollama
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False # 关闭流式，一次性返回
-        }
-        
-        response = requests.post(OLLAMA_API_URL, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        content = result.get("response", "").strip()
+        # 调用 Ollama (异步，不阻塞事件循环)
+        content = await llm.generate(prompt)
         
         # 简单的标题生成 (取前几个字)
         title = "我的故事"
@@ -221,23 +391,16 @@ async def generate_story(req: StoryRequest, current_user: User = Depends(get_cur
              # 简单的后处理：去掉可能的引号
              content = content.replace('"', '').replace("'", "")
         
-        
-        filename = hashlib.md5(content.encode()).hexdigest() + ".mp3"
-        filepath = os.path.join(AUDIO_OUTPUT_DIR, filename)
-        
-        # 2. 如果文件不存在，调用 Edge-TTS 生成
-        if not os.path.exists(filepath):
-            try:
-                communicate = edge_tts.Communicate(content, "zh-CN-XiaoxiaoNeural")
-                await communicate.save(filepath)
-            except Exception as e:
-                print(f"TTS Error: {e}")
-                # 如果失败，前端可以回退到浏览器TTS
-                return {"title": title, "content": content, "audio_url": None}
+        # 2. 生成音频 (缓存层负责去重和原子写入)
+        try:
+            filename = await tts_audio.get(content, "zh-CN-XiaoxiaoNeural")
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            # 如果失败，前端可以回退到浏览器TTS
+            return {"title": title, "content": content, "audio_url": None}
 
         # 3. 返回音频 URL
-        # 假设后端运行在 localhost:8000
-        audio_url = f"http://localhost:8000/static/audio/{filename}"
+        audio_url = f"{AUDIO_BASE_URL}/{filename}"
         
         return {
             "title": title, 
@@ -254,66 +417,360 @@ async def generate_story(req: StoryRequest, current_user: User = Depends(get_cur
         }
 
 
+# --- 流式故事 (SSE) ---
+# 一边接收 Ollama 的 token 流一边转发给前端；每凑满一句 (。！？) 就立刻合成这句的语音，
+# 前端第一句话几秒内就能显示/朗读，不用等整篇故事和整段 mp3。
+# 事件：token {text} / sentence {index, text, audio_url} / error {message} / done {title, content}
+SENTENCE_END = re.compile(r"[。！？]")
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def story_events(chars: list[str]):
+    events: asyncio.Queue = asyncio.Queue()
+    sentences: asyncio.Queue = asyncio.Queue() # (index, text, tts_task)，None 表示结束
+
+    count = 0
+
+    def add_sentence(text: str):
+        nonlocal count
+        task = asyncio.create_task(tts_audio.get(text, "zh-CN-XiaoxiaoNeural"))
+        sentences.put_nowait((count, text, task))
+        count += 1
+
+    async def produce():
+        content = ""
+        buffer = ""
+        try:
+            # aclosing: 被取消时马上关掉生成器，释放 LLM 并发名额和 HTTP 流，不等垃圾回收
+            async with aclosing(llm.stream(story_prompt(chars))) as tokens:
+                async for token in tokens:
+                    token = token.replace('"', '').replace("'", "")
+                    if not token:
+                        continue
+                    content += token
+                    buffer += token
+                    await events.put(sse("token", {"text": token}))
+                    # 一句完整了就马上去合成
+                    while (m := SENTENCE_END.search(buffer)):
+                        sentence = buffer[:m.end()].strip()
+                        buffer = buffer[m.end():]
+                        if sentence:
+                            add_sentence(sentence)
+            if buffer.strip():
+                add_sentence(buffer.strip())
+            return {"title": "我的故事", "content": content.strip()}
+        except Exception as e:
+            print(f"Ollama Error: {e}")
+            await events.put(sse("error", {"message": "AI 正在休息"}))
+            fallback = f"AI 正在休息，这是备用故事：{''.join(chars[:5])}是好朋友。"
+            if not content:
+                add_sentence(fallback)
+                await events.put(sse("token", {"text": fallback}))
+                return {"title": "系统繁忙", "content": fallback}
+            return {"title": "我的故事", "content": content.strip()}
+        finally:
+            sentences.put_nowait(None)
+
+    async def emit_sentences():
+        # 按句子顺序发出，每句等自己的语音合成完
+        while (item := await sentences.get()) is not None:
+            index, text, task = item
+            try:
+                filename = await task
+                audio_url = f"{AUDIO_BASE_URL}/{filename}"
+            except Exception as e:
+                print(f"TTS Error: {e}")
+                audio_url = None # 前端回退到浏览器TTS
+            await events.put(sse("sentence", {"index": index, "text": text, "audio_url": audio_url}))
+
+    async def run():
+        producer = asyncio.create_task(produce())
+        try:
+            await emit_sentences()
+            result = await producer
+        finally:
+            producer.cancel() # run 被取消 (客户端断开) 时，LLM 流也一起停
+        await events.put(sse("done", result))
+        await events.put(None)
+
+    runner = asyncio.create_task(run())
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+    finally:
+        # 客户端中途断开时，停止 LLM 流 (已开始的语音合成由缓存层在后台完成)
+        runner.cancel()
+
+@app.post("/story/generate/stream")
+async def generate_story_stream(req: StoryRequest, current_user: CurrentUser = Depends(get_current_user)):
+    return StreamingResponse(
+        story_events(story_chars(req.known_chars)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- 字典查询 (二进制字典，chardict.py) ---
+char_dict = chardict.load(CHARDICT_PATH, os.path.join(DATA_DIR, "characters.json"))
+
+@app.get("/dict/char/{key}")
+def dict_char(key: str):
+    # key 可以是字或 id (h_123)，返回和 characters.json 一样的结构
+    detail = char_dict.get(key)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Character not found")
+    return detail
+
+@app.get("/dict/level/{level}")
+def dict_level(level: int, offset: int = Query(0, ge=0), limit: int = Query(200, ge=1, le=500)):
+    return char_dict.by_level(level, offset, limit)
+
+@app.get("/dict/pinyin/{pinyin}")
+def dict_pinyin(pinyin: str):
+    # 带声调精确匹配 (zhōng)，不带声调匹配所有声调 (zhong，ü 写成 v)
+    return char_dict.by_pinyin(pinyin)
+
+
+# --- 关卡 (预排好的题目，见 level_planner.py) ---
+def load_level_planner() -> LevelPlanner:
+    def read(name, default):
+        try:
+            with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+                return json.load(f)
+        except OSError:
+            return default
+    return LevelPlanner(read("levels.json", []), read("chars_index.json", []), read("confusion_map.json", {}),
+                        char_dict.get, max_level=LEVEL_PLAN_MAX)
+
+level_planner = load_level_planner()
+
+@app.get("/level/{level_id}")
+def level_plan(request: Request, level_id: int = Path(ge=1, le=LEVEL_ID_MAX), options: Optional[int] = None, priority: str = "", exclude: str = ""):
+    # 一次返回开局要的全部内容：关卡配置、每道题的目标字和选项 (字 id)、用到的字的详情
+    # options 覆盖选项数 (3-6)；priority=赢,餐 是家长标记的优先字，exclude=的,人 是已经学会 / 跳过的字，
+    # 这两个只对自动生成的关卡生效
+    body, etag = level_planner.get(
+        level_id, options, [c for c in priority.split(",") if c], [c for c in exclude.split(",") if c]
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# --- 批量取字详情 ---
+# 以前前端缺一个字就拉一整个 200 字的分片 (chars_detail_N.json)。
+# /dict/chars 一次只返回要的那几个字；/dict/changes?since=N 只返回版本 N 之后改过/删掉的字。
+# 两个接口都带强 ETag (响应内容的 md5)，客户端带 If-None-Match 重新验证，没变返回 304；
+# 响应超过 1KB 由 GZipMiddleware 压缩。
+def etag_json(request: Request, payload: dict) -> Response:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    etag = f'"{hashlib.md5(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Dict-Version": str(char_dict.version)}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/dict/chars")
+def dict_chars(request: Request, keys: list[str] = Query(...)):
+    # ?keys=的,h_2,人 或 ?keys=的&keys=h_2，字和 id 可以混用；结果按 id 索引，和分片文件一样
+    keys = list(dict.fromkeys(k for part in keys for k in part.split(",") if k))
+    if len(keys) > DICT_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many keys (max {DICT_BULK_MAX})")
+    chars, missing = {}, []
+    for key in keys:
+        detail = char_dict.get(key)
+        if detail is None:
+            missing.append(key)
+        else:
+            chars[detail["id"]] = detail
+    return etag_json(request, {"version": char_dict.version, "chars": chars, "missing": missing})
+
+@app.get("/dict/changes")
+def dict_changes(request: Request, since: int = 0):
+    # since=0 返回全部；since 比当前版本还新 (字典被重建过) 时返回全部并带 reset，客户端应清掉缓存
+    reset = since > char_dict.version
+    rows, deleted = char_dict.changed_since(0 if reset else since)
+    details = [char_dict.row(i) for i in rows.tolist()]
+    return etag_json(request, {
+        "version": char_dict.version,
+        "reset": reset,
+        "chars": {d["id"]: d for d in details},
+        "deleted": deleted,
+    })
+
+
+# --- 音频包 (scripts/bundle_audio.py) ---
+# level_N.bin / pool_N.bin 是一关 (或一个字级) 的 mp3 首尾相接，{name}.json 是 [偏移, 长度, 时长] 索引。
+# FileResponse 支持 Range (单段和多段 multipart/byteranges)，前端用一个请求取需要的几段；
+# audio/mpeg 不走 gzip，分段偏移不会被压缩打乱。
+AUDIO_BUNDLE_NAME = re.compile(r"(level|pool)_\d+\.(bin|json)")
+
+@app.get("/audio/bundles/{name}")
+def audio_bundle(request: Request, name: str):
+    path = os.path.join(AUDIO_BUNDLE_DIR, name)
+    if not AUDIO_BUNDLE_NAME.fullmatch(name) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    media_type = "audio/mpeg" if name.endswith(".bin") else "application/json"
+    # ETag 由文件大小和 mtime 生成，重新打包后才会变
+    st = os.stat(path)
+    headers = {"ETag": f'"{hashlib.md5(f"{st.st_mtime_ns}-{st.st_size}".encode()).hexdigest()}"', "Cache-Control": "no-cache"}
+    if headers["ETag"] in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
+
 # 更新请求模型
 class CharCreateRequest(BaseModel):
     char: str
     example: str = ""
     distractors: list[str] = []
 
-@app.post("/char/create")
-async def create_custom_char(req: CharCreateRequest): 
-    # req: { "char": "赢" }
-    char = req.char
-    if not char: return {"error": "No char"}
-    
-    # 1. 生成拼音
-    py = pinyin(char, style=Style.TONE, heteronym=False)[0][0]
-    
-    
-
-    # 2. 生成音频 (单字 + 题目)
-    # 文件名用 md5(char) 避免编码问题
-    char_hash = hashlib.md5(char.encode()).hexdigest()
-    file_char = os.path.join(AUDIO_OUTPUT_DIR, f"{char_hash}.mp3")
-    file_quest = os.path.join(AUDIO_OUTPUT_DIR, f"{char_hash}_q.mp3")
-    
-    base_url = "http://localhost:8000/static/audio"
-    
-    if not os.path.exists(file_char):
-        comm = edge_tts.Communicate(char, "zh-CN-XiaoxiaoNeural")
-        await comm.save(file_char)
-        
-    if not os.path.exists(file_quest):
-        text = f"请找出 {py}，{req.example}的{char}" if req.example else f"请找出 {py}，{char}"
-        comm = edge_tts.Communicate(text, "zh-CN-XiaoxiaoNeural")
-        await comm.save(file_quest)
-        
+class CharBatchRequest(BaseModel):
+    chars: list[CharCreateRequest]
+
+CHAR_VOICE = "zh-CN-XiaoxiaoNeural"
+
+@lru_cache(maxsize=4096)
+def char_pinyin(char: str, example: str) -> str:
+    """字的拼音 (每个 字+组词 只算一次)：
+    - 多音字按组词里的读音 (银行 -> háng)
+    - 组词里的读音和字典只差声调时 (一个 yí、儿子 zi 这种变调 / 轻声) 用字典里的读音
+    - 没有组词时用字典，字典里没有的字用 pypinyin 的默认读音"""
+    detail = char_dict.get(char)
+    if example and char in example:
+        context = pinyin(example, style=Style.TONE, errors=lambda s: list(s))[example.index(char)][0]
+        if not detail or chardict.split_tone(context)[0] != chardict.split_tone(detail["pinyin"])[0]:
+            return context
+    if detail:
+        return detail["pinyin"]
+    return pinyin(char, style=Style.TONE, heteronym=False)[0][0]
+
+def char_texts(req: CharCreateRequest) -> tuple[str, str]:
+    """返回 (拼音, 题目朗读文本)"""
+    py = char_pinyin(req.char, req.example)
+    text = f"请找出 {py}，{req.example}的{req.char}" if req.example else f"请找出 {py}，{req.char}"
+    return py, text
+
+def char_object(req: CharCreateRequest, py: str, file_char: str, file_quest: str) -> dict:
+    # id 仍用 md5(char)，音频文件名由缓存层按内容生成
+    char_hash = hashlib.md5(req.char.encode()).hexdigest()
     return {
         "id": f"custom_{char_hash}",
-        "char": char,
+        "char": req.char,
         "pinyin": py,
         "example": req.example,
         "confusingChars": {"hard": req.distractors}, # 存入干扰项
-        "audio_char": f"{base_url}/{char_hash}.mp3",
-        "audio_quest": f"{base_url}/{char_hash}_q.mp3",
+        "audio_char": f"{AUDIO_BASE_URL}/{file_char}",
+        "audio_quest": f"{AUDIO_BASE_URL}/{file_quest}",
         "isCustom": True
     }
 
+async def char_tts(text: str) -> str:
+    if tts_audio.contains(text, CHAR_VOICE):
+        filename = await tts_audio.get(text, CHAR_VOICE) # 已有音频直接返回，不占合成名额
+    else:
+        async with char_tts_limit:
+            filename = await tts_audio.get(text, CHAR_VOICE)
+    tts_audio.pin(filename) # 自定义字的音频 URL 存在用户进度里，不能被 LRU 淘汰
+    return filename
+
+@app.post("/char/create")
+async def create_custom_char(req: CharCreateRequest): 
+    # req: { "char": "赢" }
+    if not req.char: return {"error": "No char"}
+    
+    # 1. 生成拼音  2. 生成音频 (单字 + 题目)
+    py, text = char_texts(req)
+    file_char, file_quest = await asyncio.gather(char_tts(req.char), char_tts(text))
+    return char_object(req, py, file_char, file_quest)
+
+
+# --- 批量添加自定义汉字 ---
+# 家长一次粘贴一整课的生字 (几十个)：同一个字只处理一次，已有的音频直接复用，
+# 缺的音频全部并发合成 (受 CHAR_TTS_CONCURRENCY 全局限制)，最后一次性返回所有字。
+# ?stream=1 时以 SSE 推送进度：start {chars, clips, cached} / progress {done, total, text, ok} / done {chars, failed}
+async def char_batch_progress(items: list[CharCreateRequest]):
+    unique: dict[str, CharCreateRequest] = {}
+    for req in items:
+        req.char = req.char.strip()
+        if req.char and req.char not in unique: # 重复的字以第一次出现的组词/干扰项为准
+            unique[req.char] = req
+    reqs = list(unique.values())
+    plans = [(req, *char_texts(req)) for req in reqs]
+
+    # 单字和题目音频合在一起去重 (不同字的题目文本不会相同，但单字可能和别的题目重叠)
+    texts = list(dict.fromkeys(t for req, _, quest in plans for t in (req.char, quest)))
+    cached = sum(tts_audio.contains(t, CHAR_VOICE) for t in texts)
+    yield "start", {"chars": len(reqs), "clips": len(texts), "cached": cached}
+
+    async def one(text: str):
+        try:
+            return text, await char_tts(text)
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            return text, None
+
+    files: dict[str, Optional[str]] = {}
+    tasks = [asyncio.create_task(one(t)) for t in texts]
+    try:
+        for done, next_result in enumerate(asyncio.as_completed(tasks), 1):
+            text, filename = await next_result
+            files[text] = filename
+            yield "progress", {"done": done, "total": len(texts), "text": text, "ok": filename is not None}
+    finally:
+        # 客户端中途断开：只取消等待，已开始的合成由缓存层在后台完成
+        for task in tasks:
+            task.cancel()
+
+    chars, failed = [], []
+    for req, py, quest in plans:
+        if files.get(req.char) and files.get(quest):
+            chars.append(char_object(req, py, files[req.char], files[quest]))
+        else:
+            failed.append(req.char)
+    yield "done", {"chars": chars, "failed": failed}
+
+@app.post("/char/create/batch")
+async def create_custom_chars(req: CharBatchRequest, stream: bool = False):
+    if len(req.chars) > CHAR_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many chars (max {CHAR_BATCH_MAX})")
+    if stream:
+        async def events():
+            async for event, data in char_batch_progress(req.chars):
+                yield sse(event, data)
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    result = {}
+    async for event, data in char_batch_progress(req.chars):
+        if event == "done":
+            result = data
+    return result
+
 
 class ScenarioRequest(BaseModel):
     level: int
     chars: list[str] # 本关要学的字
 
-@app.post("/story/scenario")
-async def generate_scenario(req: ScenarioRequest, current_user: User = Depends(get_current_user)):
-    chars_str = "、".join(req.chars)
+scenario_failures = registry.counter(
+    "scenario_attempt_failures_total", "Failed scenario generation attempts (each one triggers a retry or fallback)",
+    ("reason",),
+)
+
+async def build_scenario(level: int, chars: list[str]) -> dict:
+    """调 LLM 生成剧情并合成语音，失败返回 {}。由剧情池的后台 worker 调用。"""
+    chars_str = "、".join(chars)
     
     # 强化 Prompt，要求 AI 必须返回纯 JSON
     prompt = f"""
     请为儿童识字游戏设计一段剧情对话（3句）。
     
     【任务信息】
-    当前关卡：{req.level}
+    当前关卡：{level}
     本关学习汉字：{chars_str}
     
     【剧情要求】
@@ -340,71 +797,123 @@ async def generate_scenario(req: ScenarioRequest, current_user: User = Depends(g
     for attempt in range(MAX_RETRIES):
         try:
             # 1. 调用 Ollama
-            payload = {
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json" # [优化] 强制 Ollama 返回 JSON 模式 (如果模型支持)
-            }
-            
+            # [优化] format=json 强制 Ollama 返回 JSON 模式 (如果模型支持)
             print("Calling Ollama for scenario...")
-            response = requests.post(OLLAMA_API_URL, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            raw_content = result.get("response", "").strip()
+            raw_content = await llm.generate(prompt, format="json")
             print(f"Ollama Raw: {raw_content}")
 
             # 2. 清洗与解析 JSON
-            # 有时候 AI 会加 ```json ... ```，需要去掉
-            if raw_content.startswith("```json"):
-                raw_content = raw_content.replace("```json", "").replace("```", "")
-            
-            scenario = json.loads(raw_content)
-            first_text = scenario.get("dialogs", [{}])[0].get("text", "")
-            if "对话内容" in first_text or "这里填" in first_text:
-                print("AI copied example, retrying or using mock...")
-                # 这里可以抛出异常触发重试，或者手动构造一个备用剧情
-                raise ValueError("AI output invalid")
+            with stage("llm_json"):
+                # 有时候 AI 会加 ```json ... ```，需要去掉
+                if raw_content.startswith("```json"):
+                    raw_content = raw_content.replace("```json", "").replace("```", "")
+                
+                scenario = json.loads(raw_content)
+                first_text = scenario.get("dialogs", [{}])[0].get("text", "")
+                if "对话内容" in first_text or "这里填" in first_text:
+                    print("AI copied example, retrying or using mock...")
+                    # 这里可以抛出异常触发重试，或者手动构造一个备用剧情
+                    raise ValueError("AI output invalid")
             # 3. [Day5/10 补全] 生成音频
             # 遍历 dialogs，生成每一句的语音
             # 我们需要给前端返回一个 audio_url 字段
-            
-            base_url = "http://localhost:8000/static/audio/scenario"
-            # 确保目录存在
-            scenario_audio_dir = os.path.join("static", "audio", "scenario")
-            if not os.path.exists(scenario_audio_dir):
-                os.makedirs(scenario_audio_dir)
-
-            for idx, dialog in enumerate(scenario.get("dialogs", [])):
-                text = dialog.get("text", "")
-                if not text: continue
-                
-                # 使用 md5(text) 作为文件名，避免重复生成
-                text_hash = hashlib.md5(text.encode()).hexdigest()
-                filename = f"{text_hash}.mp3"
-                filepath = os.path.join(scenario_audio_dir, filename)
-                
-                if not os.path.exists(filepath):
-                    print(f"Generating TTS: {text}")
-                    try:
-                        # 使用 Edge-TTS
-                        communicate = edge_tts.Communicate(text, "zh-CN-YunxiNeural") # 男声
-                        await communicate.save(filepath)
-                    except Exception as e:
-                        print(f"TTS Error: {e}")
-                
+            # 所有句子并发合成，单句失败或超时不影响其他句子
+            dialogs = [d for d in scenario.get("dialogs", []) if d.get("text")]
+            filenames = await tts_scenario.get_many(
+                [d["text"] for d in dialogs],
+                "zh-CN-YunxiNeural", # 男声
+                concurrency=SCENARIO_TTS_CONCURRENCY,
+                deadline=SCENARIO_TTS_DEADLINE,
+            )
+            for dialog, filename in zip(dialogs, filenames):
+                if filename is None:
+                    continue # 没有 audio_url，前端会回退到浏览器TTS
                 # 将 URL 注入到 dialog 对象中
-                dialog["audio_url"] = f"{base_url}/{filename}"
+                dialog["audio_url"] = f"{AUDIO_BASE_URL}/scenario/{filename}"
 
             return scenario
             
+        except LLMBusyError as e:
+            # 排队已满，重试只会更堵，直接让前端走本地兜底
+            print(f"Ollama busy: {e}")
+            scenario_failures.inc("busy")
+            return {}
         except Exception as e:
             print(f"Attempt {attempt+1} failed: {e}")
+            scenario_failures.inc("json" if isinstance(e, ValueError) else "error") # JSONDecodeError 也是 ValueError
             if attempt == MAX_RETRIES - 1:
                 return {} # 彻底失败
 
 
+def scenario_prefill_targets() -> list[tuple]:
+    # 和前端 initLevel 的预加载逻辑保持一致：
+    # 剧情关卡是 5 的倍数，字取对应难度等级在 chars_index 里的前 5 个
+    try:
+        with open(os.path.join(DATA_DIR, "chars_index.json"), encoding="utf-8") as f:
+            chars_index = json.load(f)
+    except OSError:
+        return []
+
+    targets = []
+    for level in range(5, SCENARIO_PREFILL_MAX_LEVEL + 1, 5):
+        char_level = min(math.ceil(level / 20), 5)
+        chars = [c["char"] for c in chars_index if c["level"] == char_level][:5]
+        if chars:
+            targets.append((level, chars))
+    return targets
+
+
+scenario_pool = ScenarioPool(
+    build_scenario, depth=SCENARIO_POOL_DEPTH, miss_wait=SCENARIO_POOL_MISS_WAIT, max_queue=SCENARIO_POOL_MAX_QUEUE
+)
+
+@app.post("/story/scenario")
+async def generate_scenario(req: ScenarioRequest, current_user: CurrentUser = Depends(get_current_user)):
+    # 优先从预生成池里拿现成的；池子没有就短暂等待，等不到返回空让前端兜底
+    scenario = await scenario_pool.take(req.level, req.chars)
+    return scenario or {}
+
+@app.get("/story/pool/stats")
+def scenario_pool_stats():
+    return scenario_pool.snapshot()
+
+
+
+@app.get("/sync/stats")
+def sync_stats():
+    return {"group_commit": SYNC_GROUP_COMMIT, **sync_writer.snapshot()}
+
+@app.get("/auth/stats")
+def auth_stats():
+    return {"user_cache": user_cache.snapshot(), "passwords": passwords.snapshot()}
+
+@app.get("/tts/stats")
+def tts_stats():
+    return {"audio": tts_audio.snapshot(), "scenario": tts_scenario.snapshot()}
+
+
+# --- Prometheus 指标 ---
+# 各模块 snapshot() 里的数字在抓取时转成 gauge，比如 hanzi_tts_audio{stat="hit_ratio"}
+@registry.collector
+def module_stats() -> list[str]:
+    lines = []
+    for name, snapshot in [
+        ("tts_audio", tts_audio.snapshot()),
+        ("tts_scenario", tts_scenario.snapshot()),
+        ("user_cache", user_cache.snapshot()),
+        ("passwords", passwords.snapshot()),
+        ("llm", llm.snapshot()),
+        ("scenario_pool", scenario_pool.snapshot()),
+        ("sync_writer", sync_writer.snapshot()),
+        ("level_planner", level_planner.snapshot()),
+    ]:
+        lines.extend(gauges(f"hanzi_{name}", f"{name} counters (see /*/stats)", snapshot, "stat"))
+    return lines
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 if __name__ == "__main__":
     import uvicorn
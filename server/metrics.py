@@ -0,0 +1,246 @@
+import atexit
+import bisect
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+
+# --- 指标 (Prometheus 文本格式) ---
+# 关卡开始慢，到底是 Ollama、edge-tts 还是 SQLite？以前只有几行 print，没法回答。
+# 这里记录:
+#   - 每个路由的请求耗时直方图 (http_request_duration_seconds)
+#   - 分阶段耗时 (stage_duration_seconds{stage="llm|llm_json|tts|db|bcrypt"})
+#   - 各模块 snapshot() 里的计数 (缓存命中率等)，抓取时现算
+# GET /metrics 输出文本格式，Prometheus 直接抓。
+# 可选的逐请求 trace 日志：每个请求一行 JSON，带各阶段的次数和耗时。
+# 写文件交给后台线程 (logging 的 QueueHandler / QueueListener)，文件只打开一次，事件循环上不做磁盘 IO。
+# 不依赖 prometheus_client，只实现用到的 counter / histogram。
+
+# 默认桶 (秒)，比 Prometheus 默认的多几个大桶，LLM 动辄十几秒
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *values, amount: float = 1.0):
+        self._values[values] = self._values.get(values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_num(total)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {} # labels -> [每个桶的计数..., sum, count]
+
+    def observe(self, value: float, *values):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, values, inf)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_num(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], list[str]]] = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], list[str]]):
+        """抓取时调用 fn() 取额外的指标行 (一般是把各模块的 snapshot() 转成 gauge)"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+
+def gauges(name: str, help: str, samples: dict, label: str) -> list[str]:
+    """{label 值: 数值} -> 一组 gauge 行，collector 里用"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in samples.items():
+        if isinstance(value, (int, float)):
+            lines.append(f"{name}{_labels((label,), (key,))} {_num(value)}")
+    return lines
+
+
+registry = Registry()
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route (until the last body chunk)",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request (llm, llm_json, tts, db, bcrypt)",
+    ("stage",),
+)
+
+
+# --- 逐请求 trace ---
+# 中间件给每个请求放一个 dict (stage -> [次数, 总秒数])，stage() 往里累加。
+# contextvar 会被 create_task 复制，请求里起的后台任务 (TTS 合成等) 也记在这个请求上。
+_trace: ContextVar[Optional[dict]] = ContextVar("metrics_trace", default=None)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = _trace.get()
+    if trace is not None:
+        entry = trace.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件：记录每个路由的耗时 (流式响应算到最后一块发完)，可选写 trace 日志"""
+
+    def __init__(self, app, trace_log: str = "", trace_slow_ms: float = 0.0):
+        self.app = app
+        self.trace_log = trace_log
+        self.trace_slow_ms = trace_slow_ms
+        self._trace_logger = self._open_trace(trace_log) if trace_log else None
+
+    @staticmethod
+    def _open_trace(path: str) -> logging.Logger:
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        lines = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(lines, handler)
+        listener.start()
+        atexit.register(listener.stop) # 退出前把队列里剩下的写完
+        logger = logging.Logger("trace") # 不进全局 logger 树，不会被别的配置带去 stderr
+        logger.addHandler(logging.handlers.QueueHandler(lines))
+        return logger
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+        token = _trace.set({})
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            stages = _trace.get()
+            _trace.reset(token)
+            route = scope.get("route")
+            # 按路由模板归类 (/char/{id} 而不是每个 id 一条)；静态文件等没有路由的归到 other
+            route = getattr(route, "path", None) or "other"
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route, str(status))
+            if self._trace_logger and elapsed * 1000 >= self.trace_slow_ms:
+                self._write_trace(scope, route, status, elapsed, stages)
+
+    def _write_trace(self, scope, route: str, status: int, elapsed: float, stages: dict):
+        record = {
+            "ts": round(time.time(), 3),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": status,
+            "ms": round(elapsed * 1000, 2),
+            "stages": {k: {"count": n, "ms": round(s * 1000, 2)} for k, (n, s) in stages.items()},
+        }
+        self._trace_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def instrument_engine(engine):
+    """SQLAlchemy 同步引擎 (异步引擎传 .sync_engine) 上挂事件，记录每条 SQL 的耗时"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        observe_stage("db", time.perf_counter() - conn.info["metrics_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        # 出错时 after_cursor_execute 不会触发，把计时出栈
+        conn = context.connection
+        if conn is not None and conn.info.get("metrics_start"):
+            conn.info["metrics_start"].pop()
@@ -0,0 +1,51 @@
+"""users 表基线
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+之前的库由 Base.metadata.create_all 建表，没有版本记录。
+这里按"缺什么补什么"处理：新库直接建表，旧库只补缺少的列，然后记下版本号。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+USER_COLUMNS = [
+    ("save_data", sa.Text(), True),
+    ("updated_at", sa.String(), True),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=True),
+            sa.Column("save_data", sa.Text(), nullable=True),
+            sa.Column("updated_at", sa.String(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        return
+
+    existing = {c["name"] for c in inspector.get_columns("users")}
+    missing = [(name, type_, nullable) for name, type_, nullable in USER_COLUMNS if name not in existing]
+    if missing:
+        with op.batch_alter_table("users") as batch:
+            for name, type_, nullable in missing:
+                batch.add_column(sa.Column(name, type_, nullable=nullable))
+
+
+def downgrade():
+    op.drop_index("ix_users_username", table_name="users")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,85 @@
+"""增量同步的表 (sync_state / char_records / answer_events / sync_fields)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+这些表之前也是 create_all 建的，已经存在的表和索引跳过。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def create_table(inspector, name: str, *columns, indexes=()):
+    if not inspector.has_table(name):
+        op.create_table(name, *columns)
+        existing = set()
+    else:
+        existing = {ix["name"] for ix in inspector.get_indexes(name)}
+    for index_name, cols in indexes:
+        if index_name not in existing:
+            op.create_index(index_name, name, cols)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    create_table(
+        inspector, "sync_state",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("rev", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.String(), nullable=True),
+    )
+    create_table(
+        inspector, "char_records",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("char", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("next_review_time", sa.BigInteger(), nullable=False),
+        sa.Column("correct", sa.Integer(), nullable=False),
+        sa.Column("wrong", sa.Integer(), nullable=False),
+        sa.Column("streak", sa.Integer(), nullable=False),
+        sa.Column("last_time", sa.BigInteger(), nullable=False),
+        sa.Column("rev", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("user_id", "char", name="uq_char_records_user_char"),
+        indexes=[
+            ("ix_char_records_user_rev", ["user_id", "rev"]),
+            ("ix_char_records_user_due", ["user_id", "next_review_time"]),
+        ],
+    )
+    create_table(
+        inspector, "answer_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("char", sa.String(), nullable=False),
+        sa.Column("correct", sa.Boolean(), nullable=False),
+        sa.Column("time", sa.BigInteger(), nullable=False),
+        sa.Column("rev", sa.Integer(), nullable=False),
+        indexes=[
+            ("ix_answer_events_user_rev", ["user_id", "rev"]),
+            ("ix_answer_events_user_time", ["user_id", "time"]),
+        ],
+    )
+    create_table(
+        inspector, "sync_fields",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("data", sa.Text(), nullable=False),
+        sa.Column("rev", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("user_id", "key", name="uq_sync_fields_user_key"),
+        indexes=[("ix_sync_fields_user_rev", ["user_id", "rev"])],
+    )
+
+
+def downgrade():
+    for name in ("sync_fields", "answer_events", "char_records", "sync_state"):
+        op.drop_table(name)
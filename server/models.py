@@ -0,0 +1,89 @@
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+
+from sqlalchemy.orm import deferred
+
+from database import Base
+
+
+# --- Models (数据库表) ---
+class User(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True)
+    hashed_password = Column(String)
+    # 存档数据 (直接存 JSON 字符串)；可能很大，默认不随用户一起加载，用到时再单独查
+    save_data = deferred(Column(Text, nullable=True))
+    updated_at = Column(String, nullable=True) # 上次同步时间
+
+
+# --- 增量同步 ---
+# 每次上传增量，用户的 rev 加 1；每行记下自己最后一次变化时的 rev，
+# 下载时只要 rev > since 的行就是"自上次以来的变化"。
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rev = Column(Integer, nullable=False, default=0) # 服务端版本号
+    updated_at = Column(String, nullable=True)
+
+
+class CharRecord(Base):
+    """每个用户每个字一行，对应前端 userStore.characters[char]"""
+    __tablename__ = "char_records"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    char = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="new")
+    level = Column(Integer, nullable=False, default=0)
+    next_review_time = Column(BigInteger, nullable=False, default=0) # 毫秒时间戳，和前端 Date.now() 一致
+    correct = Column(Integer, nullable=False, default=0)
+    wrong = Column(Integer, nullable=False, default=0)
+    streak = Column(Integer, nullable=False, default=0)
+    last_time = Column(BigInteger, nullable=False, default=0)
+    rev = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "char", name="uq_char_records_user_char"),
+        Index("ix_char_records_user_rev", "user_id", "rev"),
+        # 待复习队列: WHERE user_id = ? AND next_review_time BETWEEN 1 AND now ORDER BY next_review_time
+        Index("ix_char_records_user_due", "user_id", "next_review_time"),
+    )
+
+
+class AnswerEvent(Base):
+    """答题流水 (只增不改)"""
+    __tablename__ = "answer_events"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    char = Column(String, nullable=False)
+    correct = Column(Boolean, nullable=False)
+    time = Column(BigInteger, nullable=False) # 毫秒时间戳
+    rev = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_answer_events_user_rev", "user_id", "rev"),
+        Index("ix_answer_events_user_time", "user_id", "time"),
+    )
+
+
+class SyncField(Base):
+    """其他小块状态 (progress / settings / trains ...)，按 key 整块覆盖"""
+    __tablename__ = "sync_fields"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)
+    data = Column(Text, nullable=False) # JSON
+    rev = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_sync_fields_user_key"),
+        Index("ix_sync_fields_user_rev", "user_id", "rev"),
+    )
+
+
+def create_tables(bind):
+    Base.metadata.create_all(bind=bind)
+    # create_all 不会给已经存在的表补新索引，这里逐个补一次
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -0,0 +1,121 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from metrics import observe_stage
+
+
+# --- 密码哈希 (bcrypt) ---
+# 上课时全班 30 个孩子同时登录，每次 bcrypt 几百毫秒的 CPU，以前直接在路由里算，
+# 把线程池 (后来是事件循环) 占满，其他接口全部变慢。
+# 这里放到一个固定大小的进程池里算，排队超过上限直接拒绝 (503，让前端稍后重试)；
+# 工作进程调低优先级 (nice)，保证 API 进程总能抢到 CPU。
+# bcrypt 的 cost 可配置，登录成功时如果旧哈希的 cost 不一致，顺便换成新的哈希。
+
+class PasswordBusyError(Exception):
+    """排队的哈希请求太多，直接拒绝这次登录/注册"""
+
+
+@lru_cache(maxsize=4)
+def _context(rounds: int) -> CryptContext:
+    # min/max 都设成 rounds：cost 调高或调低，旧哈希都会被判定为需要更新
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+
+def _init_worker(nice: int):
+    if nice:
+        os.nice(nice)
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        rounds: int = 12,     # bcrypt cost (每加 1 耗时翻倍)
+        workers: int = 2,     # 同时算哈希的进程数 (0 = 在线程池里算，不限并发)
+        max_queue: int = 64,  # 最多允许多少个请求在排队/计算
+        nice: int = 5,        # 工作进程的 nice 值
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.nice = nice
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.stats = {"hashes": 0, "verifies": 0, "rehashes": 0, "rejected": 0, "max_pending": 0, "total_time": 0.0}
+
+    def start(self):
+        if self._pool is None and self.workers > 0:
+            # forkserver: 不直接 fork 带着事件循环和写线程的 API 进程，
+            # 工作进程从预加载了本模块 (passlib/bcrypt) 的干净进程里 fork 出来
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload([__name__])
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self.nice,),
+            )
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise PasswordBusyError(f"password queue full ({self._pending} pending)")
+        self._pending += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], self._pending)
+        start = time.perf_counter()
+        try:
+            if self._pool is None:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+            elapsed = time.perf_counter() - start # 含排队时间
+            self.stats["total_time"] += elapsed
+            observe_stage("bcrypt", elapsed)
+
+    async def hash(self, password: str) -> str:
+        self.stats["hashes"] += 1
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """返回 (是否正确, 新哈希)；新哈希不为 None 时说明 cost 变了，调用方应写回数据库"""
+        self.stats["verifies"] += 1
+        ok, new_hash = await self._run(_verify_and_update, password, hashed, self.rounds)
+        if ok and new_hash:
+            self.stats["rehashes"] += 1
+        return ok, new_hash
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "pending": self._pending,
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "max_queue": self.max_queue,
+        }
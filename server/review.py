@@ -0,0 +1,59 @@
+import time
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import CharRecord
+from scheduler import Deck, next_targets
+from sync import record_to_dict
+
+
+# --- 复习队列 ---
+# 和前端 userStore.reviewList 的规则一致:
+#   nextReviewTime > 0 && nextReviewTime <= now && level < 5
+# 走 (user_id, next_review_time) 复合索引，一次查询拿到按到期时间排序的队列。
+
+MAX_LEVEL = 5
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def due_query(user_id: int, now: Optional[int] = None, limit: int = 20):
+    now = now_ms() if now is None else now
+    return (
+        select(CharRecord)
+        .where(
+            CharRecord.user_id == user_id,
+            CharRecord.next_review_time > 0,
+            CharRecord.next_review_time <= now,
+            CharRecord.level < MAX_LEVEL,
+        )
+        .order_by(CharRecord.next_review_time)
+        .limit(limit)
+    )
+
+
+async def due_queue(db: AsyncSession, user_id: int, now: Optional[int] = None, limit: int = 20) -> list[dict]:
+    return [
+        {"char": r.char, **record_to_dict(r)}
+        for r in await db.scalars(due_query(user_id, now, limit))
+    ]
+
+
+async def load_deck(db: AsyncSession, user_id: int) -> Deck:
+    # 只取调度需要的列，比加载整行 ORM 对象快得多
+    rows = await db.execute(
+        select(CharRecord.char, CharRecord.level, CharRecord.last_time, CharRecord.correct, CharRecord.wrong,
+               CharRecord.streak)
+        .where(CharRecord.user_id == user_id)
+    )
+    return Deck.from_records(rows)
+
+
+async def scheduled_queue(db: AsyncSession, user_id: int, now: Optional[int] = None, limit: int = 10) -> list[dict]:
+    """按服务端排期 (scheduler.py) 取接下来该复习的字"""
+    now = now_ms() if now is None else now
+    return next_targets(await load_deck(db, user_id), now, limit)
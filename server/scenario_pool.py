@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+
+# --- 剧情预生成池 ---
+# /story/scenario 以前每次都要现场调 LLM + 修 JSON + 重试 + 合成 3 句语音，孩子要等几十秒。
+# 这里按 (关卡, 汉字集合) 维护一个小池子：
+#   - 后台 worker 提前把常用的 key 填满 (每个 key 默认备 2 份)
+#   - 请求来了直接取一份现成的 (音频已经合成好)，然后异步补货
+#   - 池子里没有时只加急生成 1 份，最多等一小会儿；等不到就返回空，前端走本地兜底，后台继续生成
+#   - 排队的任务有上限：满了先丢预热的、再丢补货的，给加急的腾位置
+
+URGENT, REFILL, PREFILL = 0, 1, 2 # 优先级，数字小的先做
+
+Producer = Callable[[int, list], Awaitable[dict]]
+
+
+def pool_key(level: int, chars: Iterable[str]) -> tuple:
+    # 顺序无关：前端传来的字是打乱过的
+    return (int(level), tuple(sorted(set(chars))))
+
+
+class ScenarioPool:
+    def __init__(
+        self,
+        producer: Producer,
+        depth: int = 2,          # 每个 key 备几份
+        max_keys: int = 256,     # 最多记住多少个 key (LRU)
+        workers: int = 1,        # 后台生成并发 (和实时请求共用 LLM 额度，别太大)
+        miss_wait: float = 3.0,  # 未命中时最多等多久 (秒)，要小于前端 5s 超时
+        retry_delay: float = 5.0,  # 生成失败后 worker 歇一会儿，避免 Ollama 挂了还狂刷
+        max_queue: int = 64,     # 最多排队多少个生成任务
+    ):
+        self.producer = producer
+        self.depth = depth
+        self.max_keys = max_keys
+        self.workers = workers
+        self.miss_wait = miss_wait
+        self.retry_delay = retry_delay
+        self.max_queue = max_queue
+
+        self._ready: "OrderedDict[tuple, list]" = OrderedDict() # key -> [scenario, ...]
+        self._pending: dict[tuple, int] = {}   # key -> 已排队/生成中的数量，到 0 就删掉
+        self._waiters: dict[tuple, list] = {}  # key -> [Future, ...] 等着拿货的请求
+        self._queue: list = []                 # 堆: (优先级, 序号, key)
+        self._available = asyncio.Semaphore(0) # 和 _queue 的长度保持一致，worker 靠它等活
+        self._seq = 0
+        self._tasks: list[asyncio.Task] = []
+
+        self.stats = {"hits": 0, "misses": 0, "miss_served": 0, "produced": 0, "failed": 0,
+                      "dropped": 0, "produce_time_total": 0.0}
+
+    # --- 生命周期 ---
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- 对外接口 ---
+    def prefill(self, targets: Iterable[tuple]):
+        """targets: [(level, chars), ...]，启动时提前备货"""
+        for level, chars in targets:
+            self._schedule(pool_key(level, chars), PREFILL)
+
+    async def take(self, level: int, chars: list) -> Optional[dict]:
+        key = pool_key(level, chars)
+        ready = self._ready.get(key)
+        if ready:
+            self.stats["hits"] += 1
+            scenario = ready.pop(0)
+            self._ready.move_to_end(key)
+            self._schedule(key, REFILL) # 异步补货
+            return scenario
+
+        # 未命中：加急生成一份，等一小会儿 (备满 depth 份等命中后再补)
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        self._schedule(key, URGENT)
+        served = False
+        try:
+            scenario = await asyncio.wait_for(asyncio.shield(future), timeout=self.miss_wait)
+            served = True
+            self.stats["miss_served"] += 1
+            return scenario
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters and future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(key, None)
+            if not served and future.done() and not future.cancelled():
+                # 超时 (或请求被取消) 和 _put 交货撞在同一轮：结果已经写进 future，转给别人或放回池子
+                self._put(key, future.result())
+
+    # --- 内部 ---
+    def _schedule(self, key: tuple, priority: int):
+        if priority == URGENT:
+            # 已排队的可能在很后面，总是再插一个加急的；只生成一份，不替一个没人要过的 key 备满
+            self._push(key, URGENT)
+            return
+        have = len(self._ready.get(key, [])) + self._pending.get(key, 0)
+        for _ in range(self.depth - have):
+            if not self._push(key, priority):
+                break
+
+    def _push(self, key: tuple, priority: int) -> bool:
+        if len(self._queue) >= self.max_queue:
+            worst = max(self._queue) # 优先级最低的里面最新排进来的
+            if worst[0] <= priority:
+                self.stats["dropped"] += 1
+                return False # 队里的都不比它闲，丢掉新来的
+            self._queue.remove(worst)
+            heapq.heapify(self._queue)
+            self._release(worst[2])
+            self.stats["dropped"] += 1
+        else:
+            self._available.release()
+        self._seq += 1
+        heapq.heappush(self._queue, (priority, self._seq, key))
+        self._pending[key] = self._pending.get(key, 0) + 1
+        return True
+
+    def _release(self, key: tuple):
+        left = self._pending.get(key, 0) - 1
+        if left > 0:
+            self._pending[key] = left
+        else:
+            self._pending.pop(key, None)
+
+    def _put(self, key: tuple, scenario: dict):
+        # 有人在等就直接交给他，否则放进池子
+        for future in self._waiters.get(key, []):
+            if not future.done():
+                future.set_result(scenario)
+                return
+        self._ready.setdefault(key, []).append(scenario)
+        self._ready.move_to_end(key)
+        while len(self._ready) > self.max_keys:
+            self._ready.popitem(last=False)
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            _, _, key = heapq.heappop(self._queue)
+            try:
+                start = time.perf_counter()
+                scenario = await self.producer(key[0], list(key[1]))
+                self.stats["produce_time_total"] += time.perf_counter() - start
+                if scenario and scenario.get("dialogs"):
+                    self.stats["produced"] += 1
+                    self._put(key, scenario)
+                else:
+                    self.stats["failed"] += 1
+                    await asyncio.sleep(self.retry_delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Scenario pool error: {e}")
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                self._release(key)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "keys": len(self._ready),
+            "ready": sum(len(v) for v in self._ready.values()),
+            "queued": len(self._queue),
+            "pending_keys": len(self._pending),
+        }
@@ -0,0 +1,108 @@
+from typing import Iterable
+
+import numpy as np
+
+
+# --- 艾宾浩斯复习调度 (服务端) ---
+# 以前只有浏览器里有复习逻辑 (userStore.updateCharStatus / reviewList)，
+# 每台设备各算各的。这里用 NumPy 一次算完一个用户整副牌 (~2700 字)，
+# 甚至把很多用户拼成矩阵一起算，所有设备都以服务端的排期为准。
+#
+# 规则和前端保持一致:
+#   - 答对 level + 1 (最高 5)，答错 level - 2 (最低 0)
+#   - level >= 5 视为彻底掌握，不再进复习队列
+#   - 下次复习时间 = 上次作答时间 + 该 level 对应的间隔；上次答错 (streak = 0) 的马上到期
+
+MINUTE = 60 * 1000
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+MAX_LEVEL = 5
+
+# 按 level 取间隔 (毫秒)。level 0 = 刚答错，马上再练一次
+REVIEW_INTERVALS_MS = np.array([0, 30 * MINUTE, 12 * HOUR, DAY, 2 * DAY, 4 * DAY], dtype=np.int64)
+# 算"逾期程度"时的最小间隔，避免 level 0 除以 0
+MIN_INTERVAL_MS = 5 * MINUTE
+
+
+class Deck:
+    """一个用户的全部字记录，按列存成 NumPy 数组"""
+
+    def __init__(self, chars: list[str], level, last_time, correct, wrong, streak=None):
+        self.chars = chars
+        self.level = np.asarray(level, dtype=np.int64)
+        self.last_time = np.asarray(last_time, dtype=np.int64)
+        self.correct = np.asarray(correct, dtype=np.int64)
+        self.wrong = np.asarray(wrong, dtype=np.int64)
+        self.streak = None if streak is None else np.asarray(streak, dtype=np.int64)
+
+    @classmethod
+    def from_records(cls, records: Iterable) -> "Deck":
+        """records: CharRecord 行 (或同名属性的对象)"""
+        rows = [(r.char, r.level, r.last_time, r.correct, r.wrong, r.streak) for r in records]
+        if not rows:
+            return cls([], [], [], [], [], [])
+        chars, level, last_time, correct, wrong, streak = zip(*rows)
+        return cls(list(chars), level, last_time, correct, wrong, streak)
+
+    def __len__(self):
+        return len(self.chars)
+
+
+def next_review_times(level: np.ndarray, last_time: np.ndarray, streak=None) -> np.ndarray:
+    """从未作答过 (last_time <= 0) 的字返回 0，和前端 nextReviewTime 的约定一致。
+    streak 给了时，上次答错 (streak = 0) 的字间隔为 0，和前端答错后马上再练一致"""
+    interval = REVIEW_INTERVALS_MS[np.clip(level, 0, MAX_LEVEL)]
+    if streak is not None:
+        interval = np.where(streak > 0, interval, 0)
+    times = last_time + interval
+    return np.where(last_time > 0, times, 0)
+
+
+def priorities(level, last_time, correct, wrong, now: int, streak=None) -> np.ndarray:
+    """优先级分数，越大越该先复习；不到期的是 -inf。支持 1 维 (单个用户) 或 2 维 (用户 x 字)。"""
+    next_time = next_review_times(level, last_time, streak)
+    due = (next_time > 0) & (next_time <= now) & (level < MAX_LEVEL)
+
+    interval = np.maximum(REVIEW_INTERVALS_MS[np.clip(level, 0, MAX_LEVEL)], MIN_INTERVAL_MS)
+    overdue = (now - next_time) / interval               # 逾期了几个间隔
+    error_rate = (wrong + 1) / (correct + wrong + 2)     # 拉普拉斯平滑的错误率
+    score = overdue + 2.0 * error_rate + 0.1 * (MAX_LEVEL - level)
+    return np.where(due, score, -np.inf)
+
+
+def top_n(scores: np.ndarray, n: int) -> np.ndarray:
+    """每行取分数最高的 n 个下标 (按分数降序)。不足 n 个到期的位置，分数为 -inf。"""
+    if scores.shape[-1] == 0 or n <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    n = min(n, scores.shape[-1])
+    idx = np.argpartition(-scores, n - 1, axis=-1)[..., :n]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(idx, order, axis=-1)
+
+
+def next_targets(deck: Deck, now: int, n: int = 10) -> list[dict]:
+    """单个用户接下来该复习的 n 个字"""
+    if len(deck) == 0:
+        return []
+    scores = priorities(deck.level, deck.last_time, deck.correct, deck.wrong, now, deck.streak)
+    next_time = next_review_times(deck.level, deck.last_time, deck.streak)
+    result = []
+    for i in top_n(scores, n):
+        if not np.isfinite(scores[i]):
+            break
+        result.append({
+            "char": deck.chars[i],
+            "level": int(deck.level[i]),
+            "nextReviewTime": int(next_time[i]),
+            "priority": round(float(scores[i]), 4),
+        })
+    return result
+
+
+def batch_next_targets(level, last_time, correct, wrong, now: int, n: int = 10, streak=None):
+    """批量版本：输入 (用户数, 字数) 的矩阵 (字按字库顺序对齐)，返回 (下标矩阵, 是否有效)"""
+    scores = priorities(level, last_time, correct, wrong, now, streak)
+    idx = top_n(scores, n)
+    valid = np.isfinite(np.take_along_axis(scores, idx, axis=-1))
+    return idx, valid
+
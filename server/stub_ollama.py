@@ -0,0 +1,89 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# --- 本地 Ollama 替身 ---
+# 只实现 /api/generate，固定延迟后返回一段故事或剧情 JSON。
+# stream=true 时按 Ollama 的格式逐行返回 (每行一个 JSON)，总延迟平摊到每个片段上。
+# 压测和离线调试时用它代替真实的 Ollama，不需要显卡。
+
+STUB_STORY = "小猫在山上看天。天上有大大的月亮。小猫说：月亮，你好！"
+STUB_SCENARIO = {
+    "background": "bg-green-600",
+    "dialogs": [
+        {"role": "conductor", "name": "列车长", "text": "小朋友，前面的山洞上写着字！", "emotion": "shock"},
+        {"role": "conductor", "name": "列车长", "text": "认出这些字，山洞的大门就会打开。", "emotion": "normal"},
+        {"role": "conductor", "name": "列车长", "text": "太好了，我们出发吧！", "emotion": "happy"},
+    ],
+}
+
+
+def make_handler(latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if body.get("format") == "json":
+                text = json.dumps(STUB_SCENARIO, ensure_ascii=False)
+            else:
+                text = STUB_STORY
+
+            if body.get("stream"):
+                self._stream(body, text)
+                return
+
+            time.sleep(latency)
+
+            data = json.dumps({"model": body.get("model"), "response": text, "done": True}, ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, body: dict, text: str):
+            # 每次吐 2 个字，模拟 token 流
+            pieces = [text[i:i + 2] for i in range(0, len(text), 2)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for piece in pieces:
+                time.sleep(latency / len(pieces))
+                line = {"model": body.get("model"), "response": piece, "done": False}
+                self.wfile.write(json.dumps(line, ensure_ascii=False).encode() + b"\n")
+                self.wfile.flush()
+            self.wfile.write(json.dumps({"model": body.get("model"), "response": "", "done": True}).encode() + b"\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass # 压测时不刷屏
+
+    return Handler
+
+
+def start_stub(port: int = 0, latency: float = 2.0):
+    """在后台线程启动替身服务，返回 (server, url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    return server, url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Ollama stub")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, url = start_stub(args.port, args.latency)
+    print(f"Stub Ollama listening on {url} (latency {args.latency}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,261 @@
+import gzip
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import AnswerEvent, CharRecord, SyncField, SyncState, User
+
+
+# --- 增量同步 ---
+# 以前 /sync/upload 每次都把整个 serializeData() 传上来覆盖 save_data，
+# 答一道题也要重传整个越来越大的存档。这里改成：
+#   - 前端只传上次同步以来变过的字、新的答题流水、变过的小块状态
+#   - 服务端拆到 char_records / answer_events / sync_fields 三张表，每次上传 rev + 1
+#   - 下载时带上 since=客户端已有的 rev，只返回之后变过的部分
+# 每次同步的字节数只和这次玩了多少有关，和账号玩了多久无关。
+#
+# 同一个账号可能几台设备同时上传，写入全部用 INSERT ... ON CONFLICT DO UPDATE：
+#   - rev + 1 是一条 upsert ... RETURNING，不在 Python 里读了再写；这一行的锁持有到事务提交，
+#     同一个账号的上传在这里排队，rev 严格递增、不会丢
+#   - 字记录 / 状态块也是 upsert，两个请求同时插入同一个字不会撞唯一约束
+
+# 除 characters 外，serializeData() 里的其他字段，按 key 整块存
+SYNC_FIELDS = (
+    "info", "progress", "history", "trains", "currentTrainId", "achievements",
+    "settings", "unlockedParts", "equippedParts", "lastPlayDate", "dailyStreak", "checkInDates",
+)
+
+
+MAX_COUNT = 2**31 - 1 # Integer 列
+MAX_TIME = 2**53      # 毫秒时间戳 (BigInteger 列，JS Number 能精确表示的范围)
+
+
+class CharRecordIn(BaseModel):
+    """userStore.characters[char]；没传或传 null 的字段沿用旧记录。类型不对直接 400，不进数据库"""
+    status: Optional[str] = Field(None, max_length=32)
+    level: Optional[int] = Field(None, ge=0, le=MAX_COUNT)
+    nextReviewTime: Optional[int] = Field(None, ge=0, le=MAX_TIME)
+    correct: Optional[int] = Field(None, ge=0, le=MAX_COUNT)
+    wrong: Optional[int] = Field(None, ge=0, le=MAX_COUNT)
+    streak: Optional[int] = Field(None, ge=0, le=MAX_COUNT)
+    lastTime: Optional[int] = Field(None, ge=0, le=MAX_TIME)
+
+
+class AnswerEventIn(BaseModel):
+    char: str
+    correct: bool
+    time: int # 毫秒时间戳
+
+
+class SyncDelta(BaseModel):
+    base_rev: int = 0 # 客户端上次同步到的 rev
+    chars: dict[str, CharRecordIn] = {} # { "天": {level, nextReviewTime, ...} }
+    events: list[AnswerEventIn] = []
+    fields: dict[str, Any] = {}
+
+
+async def read_delta(request: Request) -> SyncDelta:
+    """请求体支持 Content-Encoding: gzip"""
+    body = await request.body()
+    try:
+        if request.headers.get("content-encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return SyncDelta(**json.loads(body))
+    except (OSError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sync payload: {e}")
+
+
+# --- 字记录 <-> 前端结构 ---
+def record_to_dict(r: CharRecord) -> dict:
+    return {
+        "status": r.status,
+        "level": r.level,
+        "nextReviewTime": r.next_review_time,
+        "correct": r.correct,
+        "wrong": r.wrong,
+        "streak": r.streak,
+        "lastTime": r.last_time,
+    }
+
+
+def record_row(data: dict, old: Optional[CharRecord] = None) -> dict:
+    """前端结构 -> char_records 的列；没传的字段沿用旧记录 (没有旧记录就用默认值)"""
+    def pick(key, column, default):
+        value = data.get(key, getattr(old, column) if old is not None else default)
+        return value if column == "status" else int(value or 0)
+
+    return {
+        "status": pick("status", "status", "new") or "new", # 数据库里的旧记录可能是 NULL
+        "level": pick("level", "level", 0),
+        "next_review_time": pick("nextReviewTime", "next_review_time", 0),
+        "correct": pick("correct", "correct", 0),
+        "wrong": pick("wrong", "wrong", 0),
+        "streak": pick("streak", "streak", 0),
+        "last_time": pick("lastTime", "last_time", 0),
+    }
+
+
+# --- 写 (同步 Session：在合并写线程或 AsyncSession.run_sync 里执行) ---
+def upsert(db: Session, model):
+    """带 on_conflict_do_update 的 insert (SQLite 3.24+ / PostgreSQL 各用自己方言的)"""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+
+def current_rev(db: Session, user_id: int) -> int:
+    return db.scalar(select(SyncState.rev).where(SyncState.user_id == user_id)) or 0
+
+
+def bump_rev(db: Session, user_id: int, updated_at: str) -> int:
+    """rev + 1 并返回新值；第一次同步时插入 rev = 1"""
+    stmt = upsert(db, SyncState).values(user_id=user_id, rev=1, updated_at=updated_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SyncState.user_id],
+        set_={"rev": SyncState.rev + 1, "updated_at": updated_at},
+    ).returning(SyncState.rev)
+    return db.execute(stmt).scalar_one()
+
+
+def apply_delta(db: Session, user: User, delta: SyncDelta, commit: bool = True, replace: bool = False) -> dict:
+    """replace=True: 老接口的整包存档，整个替换 (不比 lastTime，存档里没有的字和状态块删掉)"""
+    updated_at = datetime.utcnow().isoformat()
+    rev = bump_rev(db, user.id, updated_at)
+    conflict = delta.base_rev < rev - 1 # 期间有别的设备上传过
+
+    if replace:
+        db.execute(delete(CharRecord).where(
+            CharRecord.user_id == user.id, CharRecord.char.notin_(list(delta.chars))
+        ))
+        db.execute(delete(SyncField).where(
+            SyncField.user_id == user.id, SyncField.key.notin_(list(delta.fields))
+        ))
+
+    # 1. 字记录：按 lastTime 合并，新的覆盖旧的 (replace 时直接覆盖)
+    if delta.chars:
+        existing = {} if replace else {
+            r.char: r for r in db.query(CharRecord).filter(
+                CharRecord.user_id == user.id, CharRecord.char.in_(list(delta.chars))
+            )
+        }
+        rows = []
+        for char, record_in in delta.chars.items():
+            data = record_in.model_dump(exclude_none=True)
+            record = existing.get(char)
+            if record is not None and int(data.get("lastTime", 0)) < (record.last_time or 0):
+                continue
+            rows.append({"user_id": user.id, "char": char, "rev": rev, **record_row(data, record)})
+        if rows:
+            stmt = upsert(db, CharRecord)
+            columns = [k for k in rows[0] if k not in ("user_id", "char")]
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[CharRecord.user_id, CharRecord.char],
+                set_={k: stmt.excluded[k] for k in columns},
+                # 读完之后别的设备又写了更新的记录
+                where=None if replace else CharRecord.last_time <= stmt.excluded.last_time,
+            ), rows)
+
+    # 2. 答题流水：只增不改
+    if delta.events:
+        db.bulk_save_objects([
+            AnswerEvent(user_id=user.id, char=e.char, correct=e.correct, time=e.time, rev=rev)
+            for e in delta.events
+        ])
+
+    # 3. 其他状态：整块覆盖
+    rows = [
+        {"user_id": user.id, "key": key, "data": json.dumps(value, ensure_ascii=False), "rev": rev}
+        for key, value in delta.fields.items() if key in SYNC_FIELDS
+    ]
+    if rows:
+        stmt = upsert(db, SyncField)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[SyncField.user_id, SyncField.key],
+            set_={"data": stmt.excluded.data, "rev": stmt.excluded.rev},
+        ), rows)
+
+    user.updated_at = updated_at
+    if commit:
+        db.commit()
+    return {"status": "success", "rev": rev, "updated_at": updated_at, "conflict": conflict}
+
+
+def snapshot_delta(data, drop_invalid: bool = False) -> SyncDelta:
+    """整包存档 -> SyncDelta；格式不对抛 ValueError (pydantic 的 ValidationError 也是)。
+    drop_invalid: 丢掉格式不对的字 (迁移库里已有的老存档时用，不能因为一个坏字整个迁移失败)"""
+    if not isinstance(data, dict):
+        raise ValueError("save data must be a JSON object")
+    chars = data.get("characters") or {}
+    if drop_invalid and isinstance(chars, dict):
+        chars = {c: r for c, r in chars.items() if is_valid_record(r)}
+    return SyncDelta(chars=chars, fields={k: data[k] for k in SYNC_FIELDS if k in data})
+
+
+def is_valid_record(data) -> bool:
+    try:
+        CharRecordIn.model_validate(data)
+        return True
+    except ValidationError:
+        return False
+
+
+def import_snapshot(db: Session, user: User, delta: SyncDelta, commit: bool = True) -> dict:
+    """整包存档 (snapshot_delta 的结果) -> 一次整体替换 (所有字 + 所有字段)；增量合并只给 /sync/delta 用"""
+    delta = delta.model_copy(update={"base_rev": current_rev(db, user.id)})
+    return apply_delta(db, user, delta, commit=commit, replace=True)
+
+
+# --- 读 (AsyncSession) ---
+async def find_state(db: AsyncSession, user_id: int):
+    """只读，不存在时返回 None (读请求不要去抢写锁)。返回 (rev, updated_at) 行而不是 ORM 对象，
+    这样合并写线程刚提交的新版本号不会被会话里缓存的旧对象挡住。"""
+    result = await db.execute(select(SyncState.rev, SyncState.updated_at).where(SyncState.user_id == user_id))
+    return result.first()
+
+
+async def load_save_data(db: AsyncSession, user_id: int) -> Optional[str]:
+    """老接口的整包存档 (users.save_data 是 deferred 列，平时不加载)"""
+    return await db.scalar(select(User.save_data).where(User.id == user_id))
+
+
+async def changes_since(db: AsyncSession, user_id: int, since: int) -> dict:
+    state = await find_state(db, user_id)
+    chars = {
+        r.char: record_to_dict(r) for r in await db.scalars(
+            select(CharRecord).where(CharRecord.user_id == user_id, CharRecord.rev > since)
+        )
+    }
+    events = [
+        {"char": e.char, "correct": e.correct, "time": e.time}
+        for e in await db.scalars(
+            select(AnswerEvent).where(AnswerEvent.user_id == user_id, AnswerEvent.rev > since).order_by(AnswerEvent.id)
+        )
+    ]
+    fields = {
+        f.key: json.loads(f.data) for f in await db.scalars(
+            select(SyncField).where(SyncField.user_id == user_id, SyncField.rev > since)
+        )
+    }
+    return {
+        "rev": state.rev if state else 0,
+        "since": since,
+        "chars": chars,
+        "events": events,
+        "fields": fields,
+        "updated_at": state.updated_at if state else None,
+    }
+
+
+async def snapshot(db: AsyncSession, user_id: int) -> dict:
+    """把新表里的数据拼回前端 serializeData() 的格式 (给老接口用)"""
+    changes = await changes_since(db, user_id, 0)
+    data = dict(changes["fields"])
+    data["characters"] = changes["chars"]
+    data["version"] = "4.0"
+    return data
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import edge_tts
+
+from metrics import observe_stage
+
+
+# --- TTS 缓存层 ---
+# 之前每个路由都自己 os.path.exists(md5.mp3) 再 edge_tts.save()：
+# 两个家长同时加同一个字会合成两次、写同一个文件，可能留下半截 mp3。
+# 这里统一成一个按内容寻址的缓存：
+#   - key = md5(voice|rate|text)，换了音色或语速就是不同的文件
+#   - 同一个 key 的并发请求共享同一个合成任务
+#   - 先写临时文件再 os.replace，磁盘上永远不会出现半截文件
+#   - 目录总大小有上限，超出按 LRU 淘汰；pin 过的文件 (自定义字的音频，URL 存在用户进度里) 永不淘汰，
+#     也不计入上限，名单记在目录下的 pinned.txt，重启后还在
+#   - 命中/未命中/合成耗时 计数
+
+DEFAULT_VOICE = "zh-CN-XiaoxiaoNeural"
+DEFAULT_RATE = "+0%"
+PIN_FILE = "pinned.txt"
+
+
+# --- 合成后端 (可替换) ---
+class EdgeTTSBackend:
+    async def synthesize(self, text: str, voice: str, rate: str) -> bytes:
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        chunks = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+        if not chunks:
+            raise RuntimeError(f"edge-tts returned no audio for {text!r}")
+        return b"".join(chunks)
+
+
+class FakeTTSBackend:
+    """离线替身：固定延迟后返回一段假 mp3 数据，用于测试和压测"""
+
+    def __init__(self, latency: float = 0.0, fail_texts: Optional[set] = None):
+        self.latency = latency
+        self.fail_texts = fail_texts or set()
+        self.calls = 0
+
+    async def synthesize(self, text: str, voice: str, rate: str) -> bytes:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if text in self.fail_texts:
+            raise RuntimeError(f"fake TTS failure for {text!r}")
+        # ID3 头 + 内容摘要，保证不同文本得到不同字节
+        return b"ID3" + hashlib.md5(f"{voice}|{rate}|{text}".encode()).digest() * 64
+
+
+def make_backend(name: str, latency: float = 0.0):
+    if name == "fake":
+        return FakeTTSBackend(latency=latency)
+    return EdgeTTSBackend()
+
+
+def legacy_custom_audio(names: list) -> list:
+    """接入缓存之前 /char/create 生成的音频: {md5(字)}.mp3 + {md5(字)}_q.mp3 成对出现。
+    URL 存在用户进度里，启动时一律 pin 住 (新的文件名是 md5(voice|rate|text)，不会带 _q)"""
+    present = set(names)
+    legacy = []
+    for name in names:
+        if name.endswith("_q.mp3"):
+            legacy.append(name)
+            base = name[:-len("_q.mp3")] + ".mp3"
+            if base in present:
+                legacy.append(base)
+    return legacy
+
+
+# --- 缓存 ---
+class TTSCache:
+    def __init__(self, directory: str, backend, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.backend = backend
+        self.max_bytes = max_bytes
+
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lru: "OrderedDict[str, int]" = OrderedDict() # filename -> size
+        self._total_bytes = 0
+        self._pinned: set[str] = set()
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "inflight_joins": 0, # 搭了别人正在进行的合成
+            "errors": 0,
+            "evictions": 0,
+            "synth_count": 0,
+            "synth_time_total": 0.0,
+            "synth_time_max": 0.0,
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # 启动时清理崩溃残留的临时文件，并按修改时间恢复 LRU 顺序
+        pin_path = self.path(PIN_FILE)
+        if os.path.exists(pin_path):
+            with open(pin_path, encoding="utf-8") as f:
+                self._pinned = {line.strip() for line in f if line.strip()}
+        names = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path):
+                continue
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            if name.endswith(".mp3"):
+                names.append(name)
+        for name in legacy_custom_audio(names):
+            self.pin(name)
+        entries = []
+        for name in names:
+            if name not in self._pinned:
+                st = os.stat(self.path(name))
+                entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._lru[name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def key(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+        return hashlib.md5(f"{voice}|{rate}|{text}".encode()).hexdigest()
+
+    def filename(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+        return f"{self.key(text, voice, rate)}.mp3"
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def contains(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> bool:
+        return os.path.exists(self.path(self.filename(text, voice, rate)))
+
+    async def get(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+        """返回音频文件名 (不含目录)，不存在就合成。合成失败抛异常。"""
+        filename = self.filename(text, voice, rate)
+
+        if os.path.exists(self.path(filename)):
+            self.stats["hits"] += 1
+            self._touch(filename)
+            return filename
+
+        future = self._inflight.get(filename)
+        if future is not None:
+            self.stats["inflight_joins"] += 1
+            # shield: 某个等待者被取消时，不影响其他人共享的合成任务
+            return await asyncio.shield(future)
+
+        self.stats["misses"] += 1
+        future = asyncio.ensure_future(self._synthesize(filename, text, voice, rate))
+        self._inflight[filename] = future
+        future.add_done_callback(lambda f: self._finish(filename, f))
+        return await asyncio.shield(future)
+
+    def _finish(self, filename: str, future: asyncio.Future):
+        self._inflight.pop(filename, None)
+        if not future.cancelled():
+            future.exception() # 没人等的后台合成失败时，避免 "exception was never retrieved"
+
+    async def _synthesize(self, filename: str, text: str, voice: str, rate: str) -> str:
+        start = time.perf_counter()
+        try:
+            data = await self.backend.synthesize(text, voice, rate)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            observe_stage("tts", time.perf_counter() - start)
+        elapsed = time.perf_counter() - start
+        self.stats["synth_count"] += 1
+        self.stats["synth_time_total"] += elapsed
+        self.stats["synth_time_max"] = max(self.stats["synth_time_max"], elapsed)
+
+        self._write_atomic(filename, data)
+        self._add(filename, len(data))
+        return filename
+
+    async def get_many(
+        self,
+        texts: list[str],
+        voice: str = DEFAULT_VOICE,
+        rate: str = DEFAULT_RATE,
+        concurrency: int = 4,
+        deadline: Optional[float] = None,
+    ) -> list[Optional[str]]:
+        """并发合成多段文本，按输入顺序返回文件名。
+
+        单句失败或超过 deadline (秒) 的位置返回 None，不影响其他句子；
+        超时的合成会在后台继续完成并写入缓存，下次就能命中。
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(text: str) -> Optional[str]:
+            async with sem:
+                try:
+                    return await self.get(text, voice, rate)
+                except Exception as e:
+                    print(f"TTS Error: {e}")
+                    return None
+
+        tasks = [asyncio.create_task(one(text)) for text in texts]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel() # 只取消等待，共享的合成任务被 shield 保护，会继续跑完
+        return [task.result() if task in done else None for task in tasks]
+
+    def _write_atomic(self, filename: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def pin(self, filename: str):
+        """标记为永久保留：移出 LRU，不再被淘汰"""
+        if filename in self._pinned:
+            return
+        self._pinned.add(filename)
+        with open(self.path(PIN_FILE), "a", encoding="utf-8") as f:
+            f.write(filename + "\n")
+        if filename in self._lru:
+            self._total_bytes -= self._lru.pop(filename)
+
+    def _touch(self, filename: str):
+        if filename in self._pinned:
+            return
+        if filename in self._lru:
+            self._lru.move_to_end(filename)
+        else:
+            # 其他进程写进来的文件，补登记
+            size = os.path.getsize(self.path(filename))
+            self._lru[filename] = size
+            self._total_bytes += size
+        try:
+            os.utime(self.path(filename)) # 重启后也能恢复访问顺序
+        except OSError:
+            pass
+
+    def _add(self, filename: str, size: int):
+        if filename in self._pinned:
+            return
+        if filename in self._lru:
+            self._total_bytes -= self._lru.pop(filename)
+        self._lru[filename] = size
+        self._total_bytes += size
+        self._evict(keep=filename)
+
+    def _evict(self, keep: str):
+        while self._total_bytes > self.max_bytes and len(self._lru) > 1:
+            oldest = next(iter(self._lru))
+            if oldest == keep:
+                break
+            size = self._lru.pop(oldest)
+            self._total_bytes -= size
+            try:
+                os.remove(self.path(oldest))
+            except FileNotFoundError:
+                pass
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["inflight_joins"]
+        return {
+            **self.stats,
+            "hit_ratio": (self.stats["hits"] + self.stats["inflight_joins"]) / lookups if lookups else 0.0,
+            "files": len(self._lru),
+            "pinned": len(self._pinned),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+# --- 登录用户缓存 ---
+# 每个带 token 的请求都要 jwt.decode 再查一次 users 表 (以前还会把整个 save_data 读出来)。
+# 这里按 token 缓存一个轻量的用户信息 (不含存档)，TTL 到期或 token 过期就重新查；
+# 上传存档等会改用户信息的操作之后，按 user_id 主动失效。
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """get_current_user 返回的轻量用户信息 (不含 save_data，需要时单独查)"""
+    id: int
+    username: str
+    updated_at: Optional[str] = None
+
+
+class UserCache:
+    def __init__(self, ttl: float = 60.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, CurrentUser]] = OrderedDict() # token -> (过期时间, 用户)
+        self._tokens: dict[int, set[str]] = {} # user_id -> tokens，用于按用户失效
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires, user = entry
+        if expires <= time.monotonic():
+            self._remove(token)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(token)
+        self.stats["hits"] += 1
+        return user
+
+    def put(self, token: str, user: CurrentUser, token_exp: Optional[float] = None):
+        """token_exp: JWT 的 exp (unix 秒)，缓存不会活得比 token 还久"""
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (time.monotonic() + ttl, user)
+        self._tokens.setdefault(user.id, set()).add(token)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int):
+        for token in self._tokens.pop(user_id, ()):
+            self._entries.pop(token, None)
+        self.stats["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens.clear()
+
+    def _remove(self, token: str):
+        _, user = self._entries.pop(token)
+        tokens = self._tokens.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[user.id]
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -6,13 +6,15 @@ import chaptersData from '../data/chapters.json';
 import trainsData from '../data/trains.json';
 import charsIndex from '../data/chars_index.json';
 import { audio } from '../utils/audio';
-import { preloadAudio } from '../utils/preload';
+import { preloadClips } from '../utils/bundles';
 import { useUserStore } from './user';
 import { useRouter } from 'vue-router';
 import { effects } from '../utils/effects';
 import storyData from '../data/story.json'; 
 import { auth } from '../utils/api';
 
+const PLAN_EXCLUDE_MAX = 300; // 排除的字太多 (URL 太长) 时不用服务端预排，在本地排
+
 export const useGameStore = defineStore('game', () => {
   const userStore = useUserStore();
   const router = useRouter();
@@ -145,8 +147,33 @@ export const useGameStore = defineStore('game', () => {
     const levelIdNum = Number(levelId);
     let levelConfig = levelsData.find(l => l.levelId == levelIdNum);
     let targetCharObjs = [];
-
-    if (!levelConfig) {
+    let plannedQuestions = null;
+
+    // 先用服务端预排好的关卡 (题目、选项、字详情一次拿到)；
+    // 自动关卡和本地排的规则一样：已经学会 (level >= 4) 和家长跳过的字交给服务端排除。
+    // 优先字里有自定义字 (服务端不认识)、排除的字太多，或者排到了家长跳过的字，就还是在本地排
+    const planPriority = levelConfig ? [] : userStore.priorityList.slice(0, 5);
+    const planLevel = Math.min(Math.ceil(levelIdNum / 20), 5);
+    const planExclude = levelConfig ? [] : charsIndex
+        .filter(c => c.level === planLevel)
+        .map(c => c.char)
+        .filter(c => userStore.isSkipped(c) || userStore.characters[c]?.level >= 4);
+    const plan = planPriority.every(c => charsIndex.some(i => i.char === c)) && planExclude.length <= PLAN_EXCLUDE_MAX
+        ? await auth.getLevelPlan(levelIdNum, planPriority, planExclude)
+        : null;
+    if (plan && !plan.questions.some(q => userStore.isSkipped(plan.chars[q.target].char))) {
+        userStore.cacheCharDetails(Object.values(plan.chars));
+        const detail = id => userStore.charsDetailCache[id] || plan.chars[id];
+        levelConfig = {
+            levelId: plan.levelId,
+            chapter: plan.chapter,
+            name: plan.name,
+            description: plan.description,
+            difficulty: plan.difficulty,
+            targetChars: plan.questions.map(q => detail(q.target).char)
+        };
+        plannedQuestions = buildQuestionsFromPlan(plan.questions, detail);
+    } else if (!levelConfig) {
       console.log(`[Game] Auto-generating Level ${levelIdNum}...`);
       
       const charCount = levelIdNum <= 20 ? 3 : (levelIdNum <= 50 ? 4 : 5); 
@@ -194,7 +221,7 @@ export const useGameStore = defineStore('game', () => {
         },
         _autoGeneratedTargetObjs: targetCharObjs
       };
-    } else {
+    } else if (!plannedQuestions) {
         const ids = levelConfig.targetChars.map(char => {
             const found = charsIndex.find(c => c.char === char);
             return found ? found.id : char; 
@@ -217,7 +244,7 @@ export const useGameStore = defineStore('game', () => {
     initSkill();
 
     timeLimit.value = levelConfig.difficulty?.timeLimit || 0;
-    questions.value = buildQuestionsFromChars(targetCharObjs, levelConfig.difficulty);
+    questions.value = plannedQuestions || buildQuestionsFromChars(targetCharObjs, levelConfig.difficulty);
     
     // [Day6] 预加载下一关的 AI 剧情
     try {
@@ -255,25 +282,28 @@ export const useGameStore = defineStore('game', () => {
         if (script) currentStoryScript.value = script;
     }
 
-    triggerAudioPreload(questions.value);
+    // levels.json 里的关卡有整关的音频包
+    const hasBundle = levelsData.some(l => l.levelId == levelIdNum);
+    triggerAudioPreload(questions.value, hasBundle ? levelIdNum : null);
     
     return true;
   }
 
-  function triggerAudioPreload(questionsList) {
-      const audioUrls = new Set();
+  function triggerAudioPreload(questionsList, levelId = null) {
+      const clips = new Set();
       questionsList.forEach(q => {
           if (q.targetChar && q.targetChar.char) {
-             audioUrls.add(`/audio/chars/${q.targetChar.char}_question.mp3`);
+             clips.add(`${q.targetChar.char}_question`);
           }
           q.options.forEach(opt => {
-              if (opt.char) audioUrls.add(`/audio/chars/${opt.char}.mp3`);
+              if (opt.char) clips.add(opt.char);
           });
       });
-      preloadAudio(Array.from(audioUrls));
+      preloadClips(Array.from(clips), levelId);
   }
 
   async function fetchDetails(idsOrChars) {
+      await userStore.prefetchCharDetails(idsOrChars);
       const promises = idsOrChars.map(id => userStore.getCharDetail(id));
       const results = await Promise.all(promises);
       
@@ -330,6 +360,21 @@ export const useGameStore = defineStore('game', () => {
     return qList;
   }
 
+  // 服务端排好的题目：{ target: id, options: [id, ...] }，选项顺序已经打乱过
+  function buildQuestionsFromPlan(planQuestions, detail) {
+    return [...planQuestions].sort(() => Math.random() - 0.5).map(q => {
+      const target = detail(q.target);
+      return {
+          isWord: false,
+          targetChar: target,
+          targetChars: [target],
+          options: q.options.map(id => ({ ...detail(id), state: 'normal' })),
+          status: 'pending',
+          isReview: false
+      };
+    });
+  }
+
   function generateOptions(target, difficulty) {
     const pool = charsIndex.filter(c => c.char !== target.char);
     const maxOptions = 6;
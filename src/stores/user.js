@@ -6,6 +6,15 @@ import charsIndexRaw from '../data/chars_index.json';
 import trainPartsData from '../data/train_parts.json';
 import { auth } from '../utils/api'; 
 
+// [Day11] 增量同步时按 key 整块上传的字段 (characters 单独按字上传)
+const SYNC_FIELDS = [
+  'info', 'progress', 'history', 'trains', 'currentTrainId', 'achievements',
+  'settings', 'unlockedParts', 'equippedParts', 'lastPlayDate', 'dailyStreak', 'checkInDates'
+];
+
+// 按 level 的复习间隔 (毫秒)，和服务端 server/scheduler.py 的 REVIEW_INTERVALS_MS 保持一致
+const REVIEW_INTERVALS = [0, 30 * 60 * 1000, 12 * 3600 * 1000, 24 * 3600 * 1000, 2 * 24 * 3600 * 1000, 4 * 24 * 3600 * 1000];
+
 export const useUserStore = defineStore('user', {
   state: () => ({
     isLoaded: false,
@@ -37,6 +46,11 @@ export const useUserStore = defineStore('user', {
     // 数据管理
     charsIndex: charsIndexRaw,
     charsDetailCache: {},
+    // [Day11] 增量同步
+    syncRev: 0,          // 上次同步到的服务端版本号
+    dirtyChars: [],      // 上次同步后变过的字
+    pendingEvents: [],   // 还没上传的答题流水
+    syncedFields: {},    // 上次同步时各字段的 JSON，用来判断有没有变
   }),
 
   getters: {
@@ -111,6 +125,17 @@ export const useUserStore = defineStore('user', {
             this.checkInDates = [];
         }
         if (customConfigs) this.customConfigs = customConfigs;
+
+        const [syncRev, dirtyChars, pendingEvents, syncedFields] = await Promise.all([
+          db.get('user_sync_rev'),
+          db.get('user_dirty_chars'),
+          db.get('user_pending_events'),
+          db.get('user_synced_fields')
+        ]);
+        if (syncRev) this.syncRev = syncRev;
+        if (dirtyChars) this.dirtyChars = dirtyChars;
+        if (pendingEvents) this.pendingEvents = pendingEvents;
+        if (syncedFields) this.syncedFields = syncedFields;
         this.isLoaded = true;
         console.log('[UserStore] Data loaded from IndexedDB');
       } catch (e) {
@@ -126,6 +151,39 @@ export const useUserStore = defineStore('user', {
         this.save();
     },
 
+    // 批量预取字详情：一次请求拿到所有缺的字，之后 getCharDetail 直接命中缓存
+    // 接口不可用时什么都不做，getCharDetail 会回退到分片文件
+    async prefetchCharDetails(idsOrChars) {
+      const missing = idsOrChars.filter(key => {
+          if (!key.startsWith('h_')) {
+              if (this.customCharacters[key]) return false;
+              const found = this.charsIndex.find(c => c.char === key);
+              return found && !this.charsDetailCache[found.id];
+          }
+          return !this.charsDetailCache[key];
+      });
+      if (!missing.length) return;
+
+      try {
+          const data = await auth.fetchCharDetails(missing);
+          this.cacheCharDetails(Object.values(data.chars));
+      } catch (e) {
+          console.warn('Bulk detail fetch failed, falling back to chunks:', e.message);
+      }
+    },
+
+    // 服务端给的字详情放进缓存 (批量取字 / 预排关卡都会带)
+    cacheCharDetails(details) {
+      details.forEach(detail => {
+          // 和 getCharDetail 一样合并家长配置，缓存里的都是合并过的
+          const custom = this.customConfigs[detail.char];
+          if (custom && custom.distractors) {
+              detail.confusingChars = { ...detail.confusingChars, hard: custom.distractors };
+          }
+          this.charsDetailCache[detail.id] = detail;
+      });
+    },
+
     async getCharDetail(idOrChar) {
       let detail = null;
       let char = '';
@@ -240,8 +298,8 @@ export const useUserStore = defineStore('user', {
       if (isCorrect) {
         record.correct++; record.streak++;
         if (record.level < 5) record.level++;
-        const intervalMs = 10 * 1000; 
-        record.nextReviewTime = Date.now() + intervalMs;
+        const intervalMs = REVIEW_INTERVALS[record.level];
+        record.nextReviewTime = record.lastTime + intervalMs;
         if (record.level >= 4) record.status = 'mastered';
         else if (record.level >= 2) record.status = 'familiar';
         else record.status = 'learning';
@@ -249,8 +307,11 @@ export const useUserStore = defineStore('user', {
         record.wrong++; record.streak = 0; 
         record.level = Math.max(0, record.level - 2);
         record.status = 'learning';
-        record.nextReviewTime = Date.now(); 
+        record.nextReviewTime = record.lastTime; // 答错马上再练 (服务端按 streak = 0 同样处理)
       }
+      // [Day11] 记下变化，下次增量同步时上传
+      if (!this.dirtyChars.includes(char)) this.dirtyChars.push(char);
+      this.pendingEvents.push({ char, correct: isCorrect, time: record.lastTime });
       this.recordLearning(isCorrect ? 1 : 0);
       this.save();
     },
@@ -424,11 +485,57 @@ export const useUserStore = defineStore('user', {
         alert('存档文件损坏');
       }
     },
-    // [Day2] 上传到云端
+    // [Day11] 组装增量：变过的字 + 新答题流水 + 变过的字段
+    buildDelta() {
+      // 第一次同步 (syncRev 为 0) 时上传全部字
+      const dirty = this.syncRev === 0 ? Object.keys(this.characters) : this.dirtyChars;
+      const chars = {};
+      dirty.forEach(c => {
+        if (this.characters[c]) chars[c] = { ...this.characters[c] };
+      });
+      const fields = {};
+      const fieldJson = {};
+      SYNC_FIELDS.forEach(key => {
+        const json = JSON.stringify(this[key] ?? null);
+        if (json !== this.syncedFields[key]) {
+          fields[key] = this[key] ?? null;
+          fieldJson[key] = json;
+        }
+      });
+      return {
+        delta: { base_rev: this.syncRev, chars, events: [...this.pendingEvents], fields },
+        fieldJson
+      };
+    },
+    // [Day11] 合并服务端的增量 (按 lastTime 取新的)
+    applyRemoteChanges(res) {
+      Object.entries(res.chars || {}).forEach(([char, record]) => {
+        const local = this.characters[char];
+        if (!local || (record.lastTime || 0) >= (local.lastTime || 0)) {
+          this.characters[char] = record;
+        }
+      });
+      Object.entries(res.fields || {}).forEach(([key, value]) => {
+        if (!SYNC_FIELDS.includes(key)) return;
+        this[key] = value;
+        this.syncedFields[key] = JSON.stringify(value ?? null);
+      });
+      this.syncRev = res.rev;
+      return this.save();
+    },
+    // [Day2] 上传到云端 ([Day11] 改为增量上传)
     async syncUpload() {
       try {
-        const json = this.serializeData();
-        await auth.uploadSave(json);
+        const { delta, fieldJson } = this.buildDelta();
+        const res = await auth.uploadDelta(delta);
+        this.syncRev = res.rev;
+        // 上传期间又变过的字保留，下次再传
+        this.dirtyChars = this.dirtyChars.filter(c =>
+          !delta.chars[c] || this.characters[c]?.lastTime !== delta.chars[c].lastTime
+        );
+        this.pendingEvents = this.pendingEvents.slice(delta.events.length);
+        Object.assign(this.syncedFields, fieldJson);
+        this.save();
         alert('上传成功！');
         return true;
       } catch (e) {
@@ -436,12 +543,14 @@ export const useUserStore = defineStore('user', {
         return false;
       }
     },
-    // [Day2] 从云端下载
+    // [Day2] 从云端下载 ([Day11] 只下载 syncRev 之后的变化)
     async syncDownload() {
       try {
-        if (!confirm('确定要下载云端存档吗？这将覆盖当前进度。')) return;
-        const res = await auth.downloadSave();
-        await this.deserializeData(res.data);
+        if (!confirm('确定要下载云端存档吗？云端的变化会合并到当前进度 (同一个字以较新的记录为准)。')) return;
+        const res = await auth.downloadDelta(this.syncRev);
+        await this.applyRemoteChanges(res); // 等 IndexedDB 写完再刷新，否则刷新后读到旧数据
+        alert('存档恢复成功！');
+        window.location.reload(); // 刷新以确保状态一致
       } catch (e) {
         alert('下载失败: ' + e.message);
       }
@@ -480,26 +589,33 @@ export const useUserStore = defineStore('user', {
       this.save();
     },
 
+    // 返回 Promise，写完 IndexedDB 才 resolve (刷新页面前要 await)
     save() {
-        db.set('user_info', this.info);
-        db.set('user_progress', this.progress);
-        db.set('user_characters', this.characters);
-        db.set('user_history', this.history);
-        db.set('user_trains', this.trains);
-        db.set('user_current_train', this.currentTrainId);
-        db.set('user_achievements', this.achievements);
-        db.set('user_settings', this.settings);
-        db.set('user_parts', this.unlockedParts);
-        db.set('user_equipped_parts', this.equippedParts);
-        // [修复] 必须显式保存这三个字段
-        db.set('user_last_play_date', this.lastPlayDate);
-        db.set('user_daily_streak', this.dailyStreak);
-        db.set('user_checkin_dates', this.checkInDates);
-        db.set('user_priority_list', this.priorityList);
-        db.set('user_skipped_chars', this.skippedChars);
-        db.set('user_custom_chars', this.customCharacters);
-        db.set('user_custom_configs', this.customConfigs);
-        db.set('user_scenario_cache', this.scenarioCache);
+        return Promise.all([
+            db.set('user_info', this.info),
+            db.set('user_progress', this.progress),
+            db.set('user_characters', this.characters),
+            db.set('user_history', this.history),
+            db.set('user_trains', this.trains),
+            db.set('user_current_train', this.currentTrainId),
+            db.set('user_achievements', this.achievements),
+            db.set('user_settings', this.settings),
+            db.set('user_parts', this.unlockedParts),
+            db.set('user_equipped_parts', this.equippedParts),
+            // [修复] 必须显式保存这三个字段
+            db.set('user_last_play_date', this.lastPlayDate),
+            db.set('user_daily_streak', this.dailyStreak),
+            db.set('user_checkin_dates', this.checkInDates),
+            db.set('user_priority_list', this.priorityList),
+            db.set('user_skipped_chars', this.skippedChars),
+            db.set('user_custom_chars', this.customCharacters),
+            db.set('user_custom_configs', this.customConfigs),
+            db.set('user_scenario_cache', this.scenarioCache),
+            db.set('user_sync_rev', this.syncRev),
+            db.set('user_dirty_chars', this.dirtyChars),
+            db.set('user_pending_events', this.pendingEvents),
+            db.set('user_synced_fields', this.syncedFields)
+        ]);
     },
 
     async resetAllData() {
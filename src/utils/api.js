@@ -48,12 +48,86 @@ export const auth = {
   async downloadSave() {
     const res = await api.get('/sync/download');
     return res.data; // { data: "...", updated_at: "..." }
+  },
+  // [Day11] 增量同步：只上传变化的部分，大于 1KB 时 gzip 压缩
+  async uploadDelta(delta) {
+    const json = JSON.stringify(delta);
+    if (typeof CompressionStream !== 'undefined' && json.length > 1024) {
+      const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+      const body = await new Response(stream).arrayBuffer();
+      const res = await api.post('/sync/delta', body, {
+        headers: { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' }
+      });
+      return res.data;
+    }
+    const res = await api.post('/sync/delta', delta);
+    return res.data; // { rev, updated_at, conflict }
+  },
+
+  async downloadDelta(since) {
+    const res = await api.get('/sync/download', { params: { since } });
+    return res.data; // { rev, chars, events, fields }
+  },
+  // 一次取多个字的详情 (字或 id 混用)，只返回要的这些
+  async fetchCharDetails(keys) {
+    const res = await api.get('/dict/chars', { params: { keys: keys.join(',') } });
+    return res.data; // { version, chars: { id: detail }, missing }
+  },
+  // 服务端预排好的关卡：关卡配置 + 每道题的目标字和选项 + 字详情，一个请求开局
+  // 接口不可用时返回 null，前端自己排
+  async getLevelPlan(levelId, priority = [], exclude = []) {
+    try {
+      const params = {};
+      if (priority.length) params.priority = priority.join(',');
+      if (exclude.length) params.exclude = exclude.join(',');
+      const res = await api.get(`/level/${levelId}`, { params, timeout: 3000 });
+      return res.data;
+    } catch (e) {
+      console.warn('Level plan unavailable:', e.message);
+      return null;
+    }
   },
    // [Day7] 生成故事
   async generateStory(knownChars) {
     const res = await api.post('/story/generate', { known_chars: knownChars });
     return res.data;
   },
+  // [Day11] 流式生成故事 (SSE)
+  // 服务端逐个推送 token / sentence / done 事件，每收到一个就回调 onEvent(event, data)
+  async streamStory(knownChars, onEvent) {
+    const token = localStorage.getItem('hanzi_token');
+    const res = await fetch(`${API_URL}/story/generate/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {})
+      },
+      body: JSON.stringify({ known_chars: knownChars })
+    });
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // SSE 事件之间用空行分隔
+      let idx;
+      while ((idx = buffer.indexOf('\n\n')) >= 0) {
+        const block = buffer.slice(0, idx);
+        buffer = buffer.slice(idx + 2);
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach(line => {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        if (data) onEvent(event, JSON.parse(data));
+      }
+    }
+  },
   async generateScenario(level, chars) {
     try {
         // [Day8] 缩短超时到 3s，避免让用户等太久
@@ -1,4 +1,5 @@
 import { Howl, Howler } from 'howler';
+import { clipFormat, clipUrl } from './bundles';
 
 const soundCache = {};
 const playHistory = {};
@@ -92,11 +93,14 @@ export const audio = {
   },
 
   playQuestion(charObj) {
-    const url = `/audio/chars/${charObj.char}_question.mp3`;
+    // 音频包里有就用 blob URL (见 bundles.js)，否则请求单文件
+    const name = `${charObj.char}_question`;
+    const url = clipUrl(name) || `/audio/chars/${name}.mp3`;
     if (!this.checkDebounce(url, 500)) return;
 
     const sound = new Howl({
       src: [url],
+      format: [clipFormat(name)],
       volume: VOLUMES.voice,
       onloaderror: () => {
         this.speakTTS(`请找出 ${charObj.pinyin}，${charObj.example}的${charObj.char}`);
@@ -106,11 +110,12 @@ export const audio = {
   },
 
   playChar(char) {
-    const url = `/audio/chars/${char}.mp3`;
+    const url = clipUrl(char) || `/audio/chars/${char}.mp3`;
     if (!this.checkDebounce(url, 200)) return;
 
     const sound = new Howl({
       src: [url],
+      format: [clipFormat(char)],
       volume: VOLUMES.voice,
       onloaderror: () => {
         this.speakTTS(char);
@@ -119,14 +124,21 @@ export const audio = {
     sound.play();
   },
 
-  speakTTS(text) {
-    if (!window.speechSynthesis) return;
-    if (!this.checkDebounce('tts_' + text, 500)) return;
+  // onend: 读完 (或读不了) 时回调，用于连续播放多句
+  speakTTS(text, onend) {
+    const done = () => { if (onend) onend(); };
+    if (!window.speechSynthesis) return done();
+    if (!this.checkDebounce('tts_' + text, 500)) return done();
 
     window.speechSynthesis.cancel();
     const utterance = new SpeechSynthesisUtterance(text);
     utterance.lang = 'zh-CN'; 
     utterance.rate = 0.9;     
+    utterance.onend = done;
+    utterance.onerror = (e) => {
+      // 被别的朗读 cancel 掉时不再往下接，其他错误跳过这一句
+      if (e.error !== 'interrupted' && e.error !== 'canceled') done();
+    };
     window.speechSynthesis.speak(utterance);
   }
 };
\ No newline at end of file
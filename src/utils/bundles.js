@@ -0,0 +1,122 @@
+import charsIndex from '../data/chars_index.json';
+import { preloadAudio } from './preload';
+
+// [音频包] 一关的字音打成一个文件 (scripts/bundle_audio.py)，{name}.json 记录每条的 [偏移, 长度, 时长, MIME]
+// - level_N: levels.json 里的关卡，整包一个请求取完
+// - pool_N:  某个字级的全部字，只用一个多段 Range 请求取需要的几条
+// 取到的音频转成 blob URL，audio.js 播放时优先用；包里没有的字回退到 /audio/chars/ 单文件。
+// 包里可能是 optimize_media.py 转出来的 AAC / Opus，浏览器放不了的格式也回退单文件 (原始 MP3)。
+const BUNDLE_BASE = '/audio/bundles';
+const indexes = {};
+const clipUrls = {};
+const clipFormats = {};
+const FORMATS = { 'audio/mpeg': 'mp3', 'audio/mp4': 'm4a', 'audio/webm': 'webm' };
+const playable = {};
+const canPlay = (type) => {
+  if (!(type in playable)) playable[type] = !!new Audio().canPlayType(type);
+  return playable[type];
+};
+
+const levelOfChar = {};
+charsIndex.forEach(c => { levelOfChar[c.char] = c.level; });
+
+function loadIndex(name) {
+  if (!indexes[name]) {
+    indexes[name] = fetch(`${BUNDLE_BASE}/${name}.json`)
+      .then(res => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+  return indexes[name];
+}
+
+// 音频名: "天" (单字) / "天_question" (题目)
+export const clipUrl = (name) => clipUrls[name] || null;
+// Howler 认 blob URL 时要显式给格式
+export const clipFormat = (name) => clipFormats[name] || 'mp3';
+
+// multipart/byteranges 响应 -> [{ start, bytes }]
+function parseMultipart(buffer) {
+  const bytes = new Uint8Array(buffer);
+  // latin1 一个字节对应一个字符，下标和字节位置一致
+  const text = new TextDecoder('latin1').decode(bytes);
+  const re = /Content-Range:\s*bytes (\d+)-(\d+)\/\d+/gi;
+  const pieces = [];
+  let m;
+  while ((m = re.exec(text))) {
+    const start = Number(m[1]);
+    const length = Number(m[2]) - start + 1;
+    const bodyStart = text.indexOf('\r\n\r\n', re.lastIndex) + 4;
+    pieces.push({ start, bytes: bytes.subarray(bodyStart, bodyStart + length) });
+    re.lastIndex = bodyStart + length;
+  }
+  return pieces;
+}
+
+// 从一个包里取音频 (wanted 为空时取整包)，返回取到的音频名
+export async function loadBundleClips(name, wanted = null) {
+  const index = await loadIndex(name);
+  if (!index) return [];
+  const total = Object.keys(index.clips).length;
+  const names = (wanted || Object.keys(index.clips))
+    .filter(n => index.clips[n] && !clipUrls[n] && canPlay(index.clips[n][3] || 'audio/mpeg'));
+  if (!names.length) return [];
+
+  const url = `${BUNDLE_BASE}/${index.file}`;
+  // 要的超过一半就直接取整包
+  const whole = !wanted || names.length * 2 > total;
+  const headers = {};
+  if (!whole) {
+    const ranges = names.map(n => {
+      const [offset, length] = index.clips[n];
+      return `${offset}-${offset + length - 1}`;
+    });
+    headers.Range = `bytes=${ranges.join(',')}`;
+  }
+
+  let res;
+  try {
+    res = await fetch(url, { headers });
+  } catch (e) {
+    return [];
+  }
+  if (!res.ok) return [];
+  const buffer = await res.arrayBuffer();
+  const type = res.headers.get('content-type') || '';
+  let pieces;
+  if (res.status === 200) {
+    pieces = [{ start: 0, bytes: new Uint8Array(buffer) }];
+  } else if (type.startsWith('multipart/byteranges')) {
+    pieces = parseMultipart(buffer);
+  } else {
+    // 服务端只支持单段时只回第一段，剩下的走单文件
+    const m = /bytes (\d+)-/.exec(res.headers.get('content-range') || '');
+    pieces = [{ start: m ? Number(m[1]) : 0, bytes: new Uint8Array(buffer) }];
+  }
+
+  const loaded = [];
+  names.forEach(n => {
+    const [offset, length, , type = 'audio/mpeg'] = index.clips[n];
+    const piece = pieces.find(p => p.start <= offset && offset + length <= p.start + p.bytes.length);
+    if (!piece) return;
+    const bytes = piece.bytes.subarray(offset - piece.start, offset - piece.start + length);
+    clipUrls[n] = URL.createObjectURL(new Blob([bytes], { type }));
+    clipFormats[n] = FORMATS[type] || 'mp3';
+    loaded.push(n);
+  });
+  return loaded;
+}
+
+// 开局预加载：先取本关的包，剩下的按字级去 pool 包里取，还没有的再逐个请求单文件
+export async function preloadClips(names, levelId = null) {
+  if (levelId) await loadBundleClips(`level_${levelId}`);
+
+  const byLevel = {};
+  names.filter(n => !clipUrls[n]).forEach(n => {
+    const level = levelOfChar[n.replace(/_question$/, '')];
+    if (level) (byLevel[level] = byLevel[level] || []).push(n);
+  });
+  await Promise.all(Object.entries(byLevel).map(([level, list]) => loadBundleClips(`pool_${level}`, list)));
+
+  const rest = names.filter(n => !clipUrls[n]).map(n => `/audio/chars/${n}.mp3`);
+  if (rest.length) await preloadAudio(rest);
+}